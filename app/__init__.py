@@ -1,12 +1,34 @@
+import asyncio
+import functools
+
 from flask import Flask
 
+
+class MockFlask(Flask):
+    """Flask应用: 未安装asgiref时，WSGI模式下的 async def 视图用 asyncio.run 执行
+
+    ASGI模式（asgi.py）下 async def 视图直接在事件循环中执行，不经过这里。
+    """
+
+    def async_to_sync(self, func):
+        try:
+            from asgiref.sync import async_to_sync as asgiref_async_to_sync
+        except ImportError:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return asyncio.run(func(*args, **kwargs))
+            return wrapper
+        return asgiref_async_to_sync(func)
+
+
 def create_app():
     """应用工厂函数"""
-    app = Flask(__name__)
+    app = MockFlask(__name__)
 
-    # 初始化数据库
-    from .database import init_db
-    init_db()
+    # 按配置创建并初始化请求日志存储后端（默认为SQLite数据库）
+    from .storage import create_storage, set_storage
+    storage = set_storage(create_storage())
+    print(f"请求日志存储后端: {storage.name}")
 
     # 注册全局请求拦截器
     from .interceptors import request_interceptor
@@ -21,6 +43,23 @@ def create_app():
     loaded_modules = load_modules(app)
     print(f"成功加载功能模块: {', '.join(loaded_modules)}")
 
+    # 配置了上游地址时注册录制代理，没有模块匹配的路径转发到上游
+    from . import config
+    if config.PROXY_UPSTREAM:
+        from .proxy import bp as proxy_bp
+        app.register_blueprint(proxy_bp)
+        print(f"录制代理已启用，上游地址: {config.PROXY_UPSTREAM}")
+
+    if config.COLLECTOR_ENABLED and not config.COLLECTOR_TOKEN:
+        print("警告: 已启用收集端（MOCKS_COLLECTOR=1）但未配置 MOCKS_COLLECTOR_TOKEN，将拒绝接收所有日志")
+
+    # 所有蓝图注册完成后，按端点预编译请求日志采集策略和响应整形规则
+    from .capture import init_capture_policy
+    from .modules import REGISTERED_MODULES
+    from .shaping import init_shaping_policy
+    init_capture_policy(app, REGISTERED_MODULES)
+    init_shaping_policy(app, REGISTERED_MODULES)
+
     # 如果需要手动注册特定模块，可以使用以下方式
     # from .modules import module_loader
     # module_loader.register_module(app, 'module_name', blueprint)
@@ -0,0 +1,341 @@
+"""准入控制与负载降级
+
+在请求进入视图之前检查并发上限和令牌桶限流，超出时立即返回503而不是在worker中排队。
+同时根据负载压力（并发占用率、日志写入队列占用率）自动降级日志记录:
+
+    0 正常记录
+    1 不记录请求/响应体，只记录摘要
+    2 在1的基础上按 DEGRADE_SAMPLE_EVERY 采样记录
+    3 直接返回503
+
+并发上限在同一部署的所有worker之间共享: 每个worker在共享文件（指标快照目录下的 admission.slots）中
+占用一个槽位，记录自己正在处理的请求数和按模块名哈希分桶的请求数，接纳时在文件锁内对所有槽位求和后再递增，
+同步worker下请求在gunicorn的backlog中等待时同样受并发上限约束。模块哈希冲突只会让限制偏严。
+worker退出时由主进程（gunicorn.conf.py 的 child_exit）清空其槽位，新worker占用槽位时也会回收已退出进程的槽位。
+令牌桶限流仍在每个worker进程内独立计算。
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from . import config
+from .log_writer import log_writer
+from .metrics import registry, scope_dir
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LEVEL_NORMAL = 0
+LEVEL_NO_BODY = 1
+LEVEL_SAMPLED = 2
+LEVEL_REJECT = 3
+
+DEFAULT_KEY = '*'
+
+# 共享并发计数: 每个worker一个槽位，槽位内依次为 pid、总请求数、MODULE_BUCKETS 个模块请求数
+WORKER_SLOTS = 256
+MODULE_BUCKETS = 64
+SLOT_WORDS = 2 + MODULE_BUCKETS
+WORD = struct.Struct('<I')
+
+
+def parse_thresholds(value):
+    """解析降级阈值，格式不正确时使用默认值"""
+    try:
+        thresholds = sorted(float(v) for v in value.split(','))
+    except (AttributeError, ValueError):
+        thresholds = []
+    if len(thresholds) != LEVEL_REJECT:
+        thresholds = [0.7, 0.85, 0.97]
+    return thresholds
+
+
+class TokenBucket:
+    """令牌桶: 每秒补充rate个令牌，最多累积burst个"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(int(rate), 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """取一个令牌，没有令牌时返回False"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class SharedInflight:
+    """映射到同一部署所有worker进程的并发计数"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+        self._words = None
+        self._base = None
+
+    @staticmethod
+    def bucket(module):
+        return zlib.crc32((module or '').encode('utf-8')) % MODULE_BUCKETS
+
+    @staticmethod
+    def _flock(handle, exclusive):
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    def _open(self):
+        path = self.path or os.path.join(scope_dir(), 'admission.slots')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = WORKER_SLOTS * SLOT_WORDS * WORD.size
+        handle = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        if os.path.getsize(path) != size:
+            self._flock(handle, True)
+            try:
+                if os.path.getsize(path) != size:
+                    handle.truncate(size)
+            finally:
+                self._flock(handle, False)
+        self._map = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_WRITE)
+        self._words = memoryview(self._map).cast('I')
+        self._file = handle
+
+    def _ensure_slot(self):
+        """映射共享文件并为当前进程占用一个槽位（fork出的worker重新映射）"""
+        if self._pid == os.getpid():
+            return self._words
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._words
+            self._open()
+            words = self._words
+            pid = os.getpid()
+            self._flock(self._file, True)
+            try:
+                free = None
+                for slot in range(WORKER_SLOTS):
+                    base = slot * SLOT_WORDS
+                    owner = words[base]
+                    if owner and owner != pid and _pid_alive(owner):
+                        continue
+                    if owner:
+                        # 回收已退出进程的槽位
+                        words[base:base + SLOT_WORDS] = memoryview(bytes(SLOT_WORDS * WORD.size)).cast('I')
+                    if free is None:
+                        free = base
+                if free is None:
+                    raise RuntimeError(f'共享并发计数的 {WORKER_SLOTS} 个槽位已用完')
+                words[free] = pid
+                self._base = free
+            finally:
+                self._flock(self._file, False)
+            self._pid = pid
+        return words
+
+    def total(self):
+        words = self._ensure_slot()
+        return sum(words[1::SLOT_WORDS])
+
+    def module_total(self, module):
+        words = self._ensure_slot()
+        return sum(words[2 + self.bucket(module)::SLOT_WORDS])
+
+    def try_acquire(self, module, max_total, module_limit):
+        """在进程间互斥地检查上限并占用名额，返回拒绝原因，接纳时为None"""
+        words = self._ensure_slot()
+        bucket = 2 + self.bucket(module)
+        self._flock(self._file, True)
+        try:
+            if max_total and sum(words[1::SLOT_WORDS]) >= max_total:
+                return 'concurrency'
+            if module_limit and sum(words[bucket::SLOT_WORDS]) >= module_limit:
+                return 'module_concurrency'
+            words[self._base + 1] += 1
+            words[self._base + bucket] += 1
+        finally:
+            self._flock(self._file, False)
+        return None
+
+    def release(self, module):
+        """归还名额（只修改本进程的槽位，不需要文件锁）"""
+        words = self._ensure_slot()
+        bucket = self._base + 2 + self.bucket(module)
+        words[self._base + 1] = max(words[self._base + 1] - 1, 0)
+        words[bucket] = max(words[bucket] - 1, 0)
+
+    def clear_worker(self, pid):
+        """清空已退出worker的槽位（由主进程调用）"""
+        try:
+            self._open()
+        except OSError:
+            return
+        words = self._words
+        self._flock(self._file, True)
+        try:
+            for slot in range(WORKER_SLOTS):
+                base = slot * SLOT_WORDS
+                if words[base] == pid:
+                    words[base:base + SLOT_WORDS] = memoryview(bytes(SLOT_WORDS * WORD.size)).cast('I')
+        finally:
+            self._flock(self._file, False)
+
+
+class AdmissionController:
+    """并发上限、限流和降级级别的计算"""
+
+    def __init__(self, max_concurrency=0, module_concurrency=None, rate=0.0, burst=0,
+                 module_rates=None, thresholds=None, sample_every=10):
+        self.max_concurrency = max_concurrency
+        self.module_concurrency = module_concurrency or {}
+        self.thresholds = parse_thresholds(thresholds) if isinstance(thresholds, str) else (thresholds or [0.7, 0.85, 0.97])
+        self.sample_every = max(sample_every, 1)
+        self.global_bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.module_rates = module_rates or {}
+        self.module_buckets = {}
+        self.inflight = 0
+        self.module_inflight = {}
+        # 配置了并发上限时在所有worker之间共享计数
+        self.shared = SharedInflight() if max_concurrency or self.module_concurrency else None
+        self.level = LEVEL_NORMAL
+        self._sample_counter = 0
+        self._lock = threading.Lock()
+
+    def _module_limit(self, module):
+        return self.module_concurrency.get(module, self.module_concurrency.get(DEFAULT_KEY, 0))
+
+    def _module_bucket(self, module):
+        bucket = self.module_buckets.get(module)
+        if bucket is None:
+            rate = self.module_rates.get(module, self.module_rates.get(DEFAULT_KEY, 0))
+            if rate <= 0:
+                return None
+            with self._lock:
+                bucket = self.module_buckets.setdefault(module, TokenBucket(rate))
+        return bucket
+
+    def pressure(self):
+        """当前负载压力（0-1以上）: 并发占用率与日志队列占用率中的较大值"""
+        values = [log_writer.depth() / log_writer.max_queue if log_writer.max_queue else 0.0]
+        if self.max_concurrency:
+            values.append(self.total_inflight() / self.max_concurrency)
+        return max(values)
+
+    def total_inflight(self):
+        """所有worker正在处理的请求数（未配置并发上限时为本worker）"""
+        return self.shared.total() if self.shared is not None else self.inflight
+
+    def compute_level(self):
+        pressure = self.pressure()
+        level = LEVEL_NORMAL
+        for index, threshold in enumerate(self.thresholds):
+            if pressure >= threshold:
+                level = index + 1
+        self.level = level
+        return level
+
+    def admit(self, module):
+        """尝试接纳一个请求
+
+        Returns:
+            tuple: (拒绝原因，接纳时为None, 降级级别)
+        """
+        module = module or ''
+        level = self.compute_level()
+        if level >= LEVEL_REJECT:
+            return self._reject('overload'), level
+
+        with self._lock:
+            if self.shared is not None:
+                reason = self.shared.try_acquire(module, self.max_concurrency, self._module_limit(module))
+            else:
+                reason = None
+            if reason is None:
+                self.inflight += 1
+                self.module_inflight[module] = self.module_inflight.get(module, 0) + 1
+        if reason:
+            return self._reject(reason), level
+
+        # 限流检查放在并发检查之后，被拒绝时归还并发名额
+        if self.global_bucket is not None and not self.global_bucket.take():
+            reason = 'rate'
+        else:
+            bucket = self._module_bucket(module)
+            if bucket is not None and not bucket.take():
+                reason = 'module_rate'
+        if reason:
+            self.release(module)
+            return self._reject(reason), level
+
+        registry.inc('mocks_admission_total', {'decision': 'admitted'})
+        return None, level
+
+    def _reject(self, reason):
+        registry.inc('mocks_admission_total', {'decision': f'rejected_{reason}'})
+        return reason
+
+    def release(self, module):
+        """请求结束时归还并发名额"""
+        module = module or ''
+        with self._lock:
+            if self.shared is not None:
+                self.shared.release(module)
+            self.inflight = max(self.inflight - 1, 0)
+            count = self.module_inflight.get(module, 0) - 1
+            if count > 0:
+                self.module_inflight[module] = count
+            else:
+                self.module_inflight.pop(module, None)
+
+    def sample(self):
+        """采样降级时判断本次请求是否记录日志"""
+        with self._lock:
+            self._sample_counter += 1
+            return self._sample_counter % self.sample_every == 0
+
+    def stats(self):
+        return {
+            'inflight': self.inflight,
+            'total_inflight': self.total_inflight(),
+            'module_inflight': dict(self.module_inflight),
+            'level': self.level,
+            'pressure': round(self.pressure(), 4)
+        }
+
+
+# 全局准入控制器（并发计数在worker之间共享，限流和降级级别每个worker进程独立）
+admission = AdmissionController(
+    max_concurrency=config.MAX_CONCURRENCY,
+    module_concurrency=config.MODULE_CONCURRENCY,
+    rate=config.RATE_LIMIT,
+    burst=config.RATE_BURST,
+    module_rates=config.MODULE_RATE_LIMIT,
+    thresholds=config.DEGRADE_THRESHOLDS,
+    sample_every=config.DEGRADE_SAMPLE_EVERY
+)
+
+registry.register_gauge('mocks_inflight_requests', lambda: admission.inflight)
+registry.register_gauge('mocks_degrade_level', lambda: admission.level)
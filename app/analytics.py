@@ -0,0 +1,251 @@
+"""延迟与吞吐量分析
+
+基于 request_rollups 分钟统计表计算延迟分位数、请求速率和错误率，
+查询成本只与时间窗口内的分钟数和分组数相关，与请求日志总量无关。
+不使用SQLite的存储后端通过 analytics_from_rows 扫描日志行得到相同结构的结果。
+"""
+import bisect
+import time
+
+from .database import (ERROR_STATUS_CODE, ROLLUP_BUCKET_COLUMNS, ROW_INDEX,
+                       get_db_connection, release_db_connection)
+from .metrics import LATENCY_BUCKETS_MS
+
+# 支持的分组维度: 参数名 -> 统计表列名
+GROUP_COLUMNS = {
+    'module': 'module',
+    'route': 'route',
+    'url': 'route',
+    'status_code': 'status_code'
+}
+
+# 默认时间窗口（秒）
+DEFAULT_WINDOW = 3600
+
+
+def histogram_percentile(counts, pct, max_value=None):
+    """根据延迟桶计数估算分位数，桶内按线性插值
+
+    Args:
+        counts: 与 LATENCY_BUCKETS_MS 对应的非累计桶计数（最后一个为 +Inf 桶）
+        pct: 分位数（0-100）
+        max_value: 观测到的最大值，用于估算 +Inf 桶
+    """
+    total = sum(counts)
+    if total == 0:
+        return None
+    target = pct / 100.0 * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if count and cumulative + count >= target:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0.0
+            if index < len(LATENCY_BUCKETS_MS):
+                upper = LATENCY_BUCKETS_MS[index]
+            else:
+                upper = max(max_value or lower, lower)
+            if max_value is not None:
+                upper = min(upper, max_value)
+            fraction = (target - cumulative) / count
+            return round(lower + (upper - lower) * fraction, 3)
+        cumulative += count
+    return max_value
+
+
+def _summarize(count, errors, total_time, max_time, buckets, seconds):
+    return {
+        'count': count,
+        'rate_per_sec': round(count / seconds, 4) if seconds > 0 else None,
+        'error_count': errors,
+        'error_rate': round(errors / count, 4) if count else None,
+        'avg_ms': round(total_time / count, 3) if count else None,
+        'p50_ms': histogram_percentile(buckets, 50, max_time),
+        'p90_ms': histogram_percentile(buckets, 90, max_time),
+        'p99_ms': histogram_percentile(buckets, 99, max_time),
+        'max_ms': round(max_time, 3) if count else None
+    }
+
+
+def resolve_window(start_time, end_time, group_by, interval):
+    """规范化时间窗口、序列粒度和分组列
+
+    Returns:
+        tuple: (start_time, end_time, interval, group_columns)
+    """
+    end_time = float(end_time) if end_time else time.time()
+    start_time = float(start_time) if start_time else end_time - DEFAULT_WINDOW
+    interval = max(int(interval or 60) // 60 * 60, 60)
+    group_columns = []
+    for name in group_by or []:
+        column = GROUP_COLUMNS.get(name)
+        if column is None:
+            raise ValueError(f"不支持的分组维度: {name}")
+        if column not in group_columns:
+            group_columns.append(column)
+    return start_time, end_time, interval, group_columns
+
+
+def get_latency_analytics(start_time=None, end_time=None, group_by=None, modules=None,
+                          status_code=None, interval=60):
+    """按时间窗口统计延迟分位数、请求速率和错误率
+
+    Args:
+        start_time: 窗口开始时间戳（默认为结束时间前 DEFAULT_WINDOW 秒）
+        end_time: 窗口结束时间戳（默认为当前时间）
+        group_by: 分组维度列表，取值见 GROUP_COLUMNS
+        modules: 模块筛选列表
+        status_code: 响应码筛选
+        interval: 时间序列的聚合粒度（秒，按分钟取整）
+
+    Returns:
+        dict: 包含总体统计、分组统计和时间序列
+    """
+    start_time, end_time, interval, group_columns = resolve_window(start_time, end_time, group_by, interval)
+    conditions = ' WHERE minute >= ? AND minute <= ?'
+    params = [int(start_time // 60 * 60), int(end_time)]
+    if modules:
+        conditions += f" AND module IN ({', '.join(['?'] * len(modules))})"
+        params.extend(modules)
+    if status_code:
+        conditions += ' AND status_code = ?'
+        params.append(status_code)
+
+    bucket_sums = ', '.join(f'SUM({c})' for c in ROLLUP_BUCKET_COLUMNS)
+    aggregates = f'SUM(count), SUM(error_count), SUM(total_time), MAX(max_time), {bucket_sums}'
+    seconds = end_time - start_time
+
+    conn = None
+    pool = None
+    try:
+        conn, pool = get_db_connection()
+        cursor = conn.cursor()
+
+        groups = []
+        if group_columns:
+            select_groups = ', '.join(group_columns)
+            cursor.execute(f'SELECT {select_groups}, {aggregates} FROM request_rollups{conditions} '
+                           f'GROUP BY {select_groups} ORDER BY SUM(count) DESC', params)
+            for row in cursor.fetchall():
+                keys = row[:len(group_columns)]
+                count, errors, total_time, max_time = row[len(group_columns):len(group_columns) + 4]
+                buckets = list(row[len(group_columns) + 4:])
+                item = dict(zip(group_columns, keys))
+                item.update(_summarize(count, errors, total_time, max_time, buckets, seconds))
+                groups.append(item)
+
+        cursor.execute(f'SELECT {aggregates} FROM request_rollups{conditions}', params)
+        row = cursor.fetchone()
+        overall = _summarize(row[0] or 0, row[1] or 0, row[2] or 0.0, row[3] or 0.0,
+                             [v or 0 for v in row[4:]], seconds)
+
+        cursor.execute(f'SELECT minute / {interval} * {interval} AS slot, {aggregates} FROM request_rollups'
+                       f'{conditions} GROUP BY slot ORDER BY slot', params)
+        series = []
+        for row in cursor.fetchall():
+            count, errors, total_time, max_time = row[1:5]
+            buckets = list(row[5:])
+            series.append({
+                'time': row[0],
+                'count': count,
+                'error_count': errors,
+                'p50_ms': histogram_percentile(buckets, 50, max_time),
+                'p99_ms': histogram_percentile(buckets, 99, max_time)
+            })
+
+        cursor.close()
+        return {
+            'start_time': start_time,
+            'end_time': end_time,
+            'interval': interval,
+            'overall': overall,
+            'groups': groups,
+            'series': series
+        }
+    finally:
+        release_db_connection(conn, pool)
+
+
+def _new_group():
+    return [0, 0, 0.0, 0.0] + [0] * len(ROLLUP_BUCKET_COLUMNS)
+
+
+def _add_to_group(group, status_code, process_time, bucket):
+    group[0] += 1
+    if status_code >= ERROR_STATUS_CODE:
+        group[1] += 1
+    group[2] += process_time
+    if process_time > group[3]:
+        group[3] = process_time
+    group[4 + bucket] += 1
+
+
+def analytics_from_rows(rows, start_time=None, end_time=None, group_by=None, modules=None,
+                        status_code=None, interval=60):
+    """扫描日志行（ROW_COLUMNS顺序的元组）计算与 get_latency_analytics 相同结构的统计
+
+    按分钟取整和分组的规则与 update_rollups 一致，供没有分钟统计表的存储后端使用。
+    """
+    start_time, end_time, interval, group_columns = resolve_window(start_time, end_time, group_by, interval)
+    first_minute = int(start_time // 60 * 60)
+    module_set = set(modules) if modules else None
+    seconds = end_time - start_time
+
+    overall = _new_group()
+    groups = {}
+    slots = {}
+    for row in rows:
+        process_time = row[ROW_INDEX['process_time']]
+        if process_time is None:
+            continue
+        try:
+            minute = int(float(row[ROW_INDEX['timestamp']]) // 60 * 60)
+        except (TypeError, ValueError):
+            continue
+        if minute < first_minute or minute > end_time:
+            continue
+        values = {
+            'module': row[ROW_INDEX['module']] or '',
+            'route': row[ROW_INDEX['route']] or row[ROW_INDEX['url']] or '',
+            'status_code': row[ROW_INDEX['status_code']] or 0
+        }
+        if module_set is not None and values['module'] not in module_set:
+            continue
+        if status_code and values['status_code'] != status_code:
+            continue
+
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, process_time)
+        _add_to_group(overall, values['status_code'], process_time, bucket)
+        slot = minute // interval * interval
+        if slot not in slots:
+            slots[slot] = _new_group()
+        _add_to_group(slots[slot], values['status_code'], process_time, bucket)
+        if group_columns:
+            key = tuple(values[column] for column in group_columns)
+            if key not in groups:
+                groups[key] = _new_group()
+            _add_to_group(groups[key], values['status_code'], process_time, bucket)
+
+    group_items = []
+    for key, group in sorted(groups.items(), key=lambda item: -item[1][0]):
+        item = dict(zip(group_columns, key))
+        item.update(_summarize(group[0], group[1], group[2], group[3], group[4:], seconds))
+        group_items.append(item)
+
+    series = []
+    for slot in sorted(slots):
+        group = slots[slot]
+        series.append({
+            'time': slot,
+            'count': group[0],
+            'error_count': group[1],
+            'p50_ms': histogram_percentile(group[4:], 50, group[3]),
+            'p99_ms': histogram_percentile(group[4:], 99, group[3])
+        })
+
+    return {
+        'start_time': start_time,
+        'end_time': end_time,
+        'interval': interval,
+        'overall': _summarize(overall[0], overall[1], overall[2], overall[3], overall[4:], seconds),
+        'groups': group_items,
+        'series': series
+    }
@@ -0,0 +1,212 @@
+"""ASGI服务模式
+
+AsgiApp 把Flask应用包装为ASGI应用（入口见项目根目录的 asgi.py），由 uvicorn 等ASGI服务器运行:
+
+- 视图为 async def 的路由在事件循环中原生执行（请求上下文、拦截器和错误处理与WSGI模式相同），
+  await asyncio.sleep 等待期间不占用线程，长轮询和慢响应mock可以在单个进程中保持大量并发连接
+- 其他路由整体放到线程池中执行（与WSGI模式行为一致），不阻塞事件循环
+- 响应体在事件循环中发送: 响应整形（app/shaping.py）的延迟和限速使用 asyncio.sleep，
+  流式响应和文件响应在线程池中逐块读取
+- 请求体先读入内存，超过 SPOOL_MAX_BYTES 时转存临时文件，再交给Flask按WSGI方式解析
+"""
+import asyncio
+import inspect
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, request_started
+from werkzeug.exceptions import HTTPException
+
+from . import config
+from .shaping import ShapedBody
+
+# 请求体超过该字节数时转存临时文件
+SPOOL_MAX_BYTES = 1024 * 1024
+
+_END = object()
+
+
+def build_environ(scope, body):
+    """根据ASGI的HTTP scope构造WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI要求路径为按latin-1解码的原始字节
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # 请求体已完整读取，没有 Content-Length（chunked请求）时也可以读到结尾
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    """读取完整请求体，较大的请求体转存到临时文件"""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.write(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    body.seek(0)
+    return body
+
+
+class AsgiApp:
+    """Flask应用的ASGI包装，async def 视图原生执行，其他视图在线程池中执行"""
+
+    def __init__(self, app, threads=None):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=threads or config.ASGI_THREADS,
+                                           thread_name_prefix='asgi-sync')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"不支持的ASGI连接类型: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _async_view(self, environ):
+        """请求命中的视图为 async def 时返回该视图"""
+        try:
+            rule, _ = self.app.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            return None
+        if environ['REQUEST_METHOD'] == 'OPTIONS' and getattr(rule, 'provide_automatic_options', False):
+            return None
+        view = self.app.view_functions.get(rule.endpoint)
+        return view if inspect.iscoroutinefunction(view) else None
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        try:
+            view = self._async_view(environ)
+            if view is not None:
+                response = await self._dispatch_async(environ, view)
+            else:
+                response = await loop.run_in_executor(self.executor, self._dispatch_sync, environ)
+            await self._send_response(response, environ, send, loop)
+        finally:
+            body.close()
+
+    def _dispatch_sync(self, environ):
+        """在线程池中按WSGI模式完整处理请求，返回响应对象（响应体由事件循环发送）"""
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                response = app.full_dispatch_request()
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            return response
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _dispatch_async(self, environ, view):
+        """在事件循环中处理 async def 视图，流程与 Flask.full_dispatch_request 相同"""
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(app, _async_wrapper=app.ensure_sync)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            return response
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _iter_chunks(self, body, loop):
+        """逐块产出WSGI响应体: 列表直接产出，生成器和文件在线程池中逐块读取"""
+        if isinstance(body, (list, tuple)):
+            for chunk in body:
+                yield chunk
+            return
+        iterator = iter(body)
+        while True:
+            chunk = await loop.run_in_executor(self.executor, next, iterator, _END)
+            if chunk is _END:
+                return
+            yield chunk
+
+    async def _send_response(self, response, environ, send, loop):
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                   for name, value in response.get_wsgi_headers(environ).items()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        try:
+            if environ['REQUEST_METHOD'] != 'HEAD' and response.status_code not in (204, 304):
+                body = response.response
+                if isinstance(body, ShapedBody):
+                    # 响应整形的延迟和限速使用 asyncio.sleep
+                    chunks = body.apace(self._iter_chunks(body.iterable, loop))
+                else:
+                    chunks = self._iter_chunks(body, loop)
+                async for chunk in chunks:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            # 触发 call_on_close 注册的回调（如流式响应的日志提交）
+            response.close()
@@ -1,6 +1,20 @@
-from flask import Blueprint, request, jsonify, render_template_string, send_from_directory
-from ..database import get_all_requests, get_request_by_id, get_requests_count, get_all_modules
+from flask import Blueprint, Response, request, jsonify, render_template_string, send_from_directory
+from .. import config
+from ..admission import admission
+from ..analytics import GROUP_COLUMNS, DEFAULT_WINDOW
+from ..breaker import log_sink
+from ..exporters import EXPORT_FORMATS, export_records, gzip_chunks
+from ..federation import federation, list_page
+from ..ids import decode_id
+from ..log_writer import log_writer
+from ..metrics import registry, render_all_workers
+from ..profiling import phase_stats
+from ..recordings import MODULE_NAME_PATTERN, compile_module
+from ..shipper import decode_batch, log_shipper
+from ..snapshot import dashboard_snapshot
+from ..storage import get_storage
 import os
+import time
 
 bp = Blueprint('base', __name__)
 
@@ -263,6 +277,25 @@ PAGE_TEMPLATE = '''
         .hidden {
             display: none;
         }
+        /* 延迟分析面板 */
+        .analytics-panel {
+            padding: 15px;
+        }
+        .analytics-toolbar {
+            display: flex;
+            gap: 10px;
+            align-items: center;
+            margin-bottom: 10px;
+        }
+        .analytics-summary span {
+            margin-right: 20px;
+        }
+        .analytics-chart {
+            width: 100%;
+            height: 260px;
+            border: 1px solid #eee;
+            margin: 10px 0;
+        }
         .detail-layout {
             display: flex;
             gap: 20px;
@@ -405,6 +438,7 @@ PAGE_TEMPLATE = '''
     <div class="container">
         <div class="header">
             <h1>请求日志列表</h1>
+            <button id="analytics-btn" class="layui-btn layui-btn-sm layui-btn-normal">延迟分析</button>
         </div>
         
         <div class="layout-container">
@@ -413,6 +447,13 @@ PAGE_TEMPLATE = '''
                 <div class="fixed-header-container">
                     <div class="stats">
                         <span>总计: <span id="total-count">0</span> 条记录</span>
+                        <span id="freshness" class="layui-font-gray"></span>
+                        {% if federation_enabled %}
+                        <span>
+                            <input type="checkbox" id="federated"/>
+                            <label for="federated">全部节点</label>
+                        </span>
+                        {% endif %}
                         <span style="float: right;">
                             <input type="checkbox" id="auto-refresh" checked/>
                             <label for="auto-refresh">自动刷新</label>
@@ -501,6 +542,9 @@ PAGE_TEMPLATE = '''
         var hasMore = true;
         var contentContainer = document.querySelector('.content-container');
         var latestLogId = null;
+        // 联合查询按 (id, 节点) 翻页的游标（上一页最后一条记录的request_id和节点）
+        var nextCursor = null;
+        var nextNode = null;
         var autoRefreshInterval = null;
         var isAutoRefresh = false;
         var currentFilters = {};
@@ -587,6 +631,14 @@ PAGE_TEMPLATE = '''
                         autoRefreshInterval = setInterval(checkNewData, 5000);
                     }
                     
+                    // 切换为查询全部节点时重新加载模块和日志
+                    if (document.getElementById('federated')) {
+                        document.getElementById('federated').addEventListener('change', function() {
+                            loadModules();
+                            refreshNewData();
+                        });
+                    }
+                    
                     // 自动刷新功能
                     document.getElementById('auto-refresh').addEventListener('change', function() {
                         isAutoRefresh = this.checked;
@@ -666,6 +718,9 @@ PAGE_TEMPLATE = '''
                 var params = new URLSearchParams();
                 params.append('page', 1);
                 params.append('size', 1);
+                if (isFederated()) {
+                    params.append('federated', 1);
+                }
                 
                 // 添加当前筛选条件
                 if (currentFilters.start_time) {
@@ -714,9 +769,15 @@ PAGE_TEMPLATE = '''
                 loadLogs();
             }
             
+            // 是否查询全部节点（配置了 MOCKS_PEERS 时显示该选项）
+            function isFederated() {
+                var checkbox = document.getElementById('federated');
+                return checkbox !== null && checkbox.checked;
+            }
+            
             // 加载模块列表
             function loadModules() {
-                fetch('/.api/modules')
+                fetch('/.api/modules' + (isFederated() ? '?federated=1' : ''))
                     .then(response => response.json())
                     .then(data => {
                         if (data.errCode === 0) {
@@ -785,6 +846,16 @@ PAGE_TEMPLATE = '''
                 var params = new URLSearchParams();
                 params.append('page', page);
                 params.append('size', pageSize);
+                if (isFederated()) {
+                    // 多个节点的结果按id翻页
+                    params.append('federated', 1);
+                    if (page > 1 && nextCursor) {
+                        params.append('before', nextCursor);
+                        if (nextNode) {
+                            params.append('before_node', nextNode);
+                        }
+                    }
+                }
                 
                 // 添加筛选条件
                 if (currentFilters.start_time) {
@@ -811,6 +882,19 @@ PAGE_TEMPLATE = '''
                         total = data.data.total;
                         document.getElementById('total-count').textContent = total;
                         
+                        // 读取快照时提示数据的新鲜度
+                        var freshness = data.data.freshness;
+                        document.getElementById('freshness').textContent = freshness && freshness.source === 'snapshot'
+                            ? `(快照 ${Math.round(freshness.age_seconds)} 秒前，另含 ${freshness.tail_records} 条实时记录)` : '';
+                        // 联合查询时提示未响应的节点
+                        if (data.data.peers) {
+                            var failed = data.data.peers.filter(peer => !peer.ok);
+                            document.getElementById('freshness').textContent = failed.length > 0
+                                ? `(${failed.length}/${data.data.peers.length} 个节点未响应: ${failed.map(peer => peer.peer).join(', ')})` : '';
+                        }
+                        nextCursor = data.data.next;
+                        nextNode = data.data.next_node || null;
+                        
                         // 更新最新日志ID
                         if (data.data.logs.length > 0 && page === 1) {
                             latestLogId = data.data.logs[0].request_id;
@@ -902,7 +986,7 @@ PAGE_TEMPLATE = '''
             
             // 显示请求详情
             function showRequestDetail(requestId) {
-                fetch('/.api/requests/' + requestId)
+                fetch('/.api/requests/' + requestId + (isFederated() ? '?federated=1' : ''))
                 .then(response => response.json())
                 .then(data => {
                     if (data.errCode === 0) {
@@ -916,6 +1000,7 @@ PAGE_TEMPLATE = '''
                                         <div><strong>请求PATH:</strong> ${log.url}</div>
                                         <div><strong>请求时间:</strong> ${formatISOTime(log.timestamp)}</div>
                                         <div><strong>客户端IP:</strong> ${log.client_ip || '未知'}</div>
+                                        ${log.node ? `<div><strong>节点:</strong> ${log.node}</div>` : ''}
                                     </div>
                                     
                                     <div class="detail-section">
@@ -928,6 +1013,10 @@ PAGE_TEMPLATE = '''
                                         <div class="detail-content">${JSON.stringify(log.request_form, null, 2)}</div>
                                         <div><strong>JSON数据:</strong></div>
                                         <div class="detail-content">${JSON.stringify(log.request_json, null, 2)}</div>
+                                        ${log.request_body ? `<div><strong>上传内容:</strong></div>
+                                        <div class="detail-content">${JSON.stringify(log.request_body, null, 2)}</div>` : ''}
+                                        ${log.matched_rule ? `<div><strong>命中规则:</strong></div>
+                                        <div class="detail-content">${JSON.stringify(log.matched_rule, null, 2)}</div>` : ''}
                                     </div>
                                 </div>
                                 <div class="detail-right">
@@ -963,6 +1052,144 @@ PAGE_TEMPLATE = '''
                     `;
                 });
             }
+        // 延迟分析面板
+        document.getElementById('analytics-btn').addEventListener('click', function() {
+            layui.layer.open({
+                type: 1,
+                title: '延迟分析',
+                area: ['900px', '620px'],
+                content: `
+                    <div class="analytics-panel">
+                        <div class="analytics-toolbar">
+                            <span>时间窗口:</span>
+                            <select id="analytics-window" lay-ignore>
+                                <option value="900">最近15分钟</option>
+                                <option value="3600" selected>最近1小时</option>
+                                <option value="21600">最近6小时</option>
+                                <option value="86400">最近24小时</option>
+                                <option value="604800">最近7天</option>
+                            </select>
+                            <span>分组:</span>
+                            <select id="analytics-group" lay-ignore>
+                                <option value="module">模块</option>
+                                <option value="route">接口</option>
+                                <option value="status_code">响应码</option>
+                            </select>
+                        </div>
+                        <div class="analytics-summary" id="analytics-summary"></div>
+                        <canvas class="analytics-chart" id="analytics-chart"></canvas>
+                        <table class="layui-table" lay-size="sm">
+                            <thead><tr><th id="analytics-group-name">模块</th><th>请求数</th><th>请求/秒</th><th>错误率</th><th>P50(ms)</th><th>P90(ms)</th><th>P99(ms)</th></tr></thead>
+                            <tbody id="analytics-rows"></tbody>
+                        </table>
+                    </div>
+                `,
+                success: function() {
+                    document.getElementById('analytics-window').addEventListener('change', loadAnalytics);
+                    document.getElementById('analytics-group').addEventListener('change', loadAnalytics);
+                    loadAnalytics();
+                }
+            });
+        });
+        
+        // 加载统计数据
+        function loadAnalytics() {
+            var windowSeconds = parseInt(document.getElementById('analytics-window').value);
+            var groupSelect = document.getElementById('analytics-group');
+            var group = groupSelect.value;
+            // 时间序列大约分成60个点
+            var interval = Math.max(60, Math.floor(windowSeconds / 60 / 60) * 60);
+            fetch(`/.api/analytics?window=${windowSeconds}&group_by=${group}&interval=${interval}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.errCode !== 0) {
+                        layui.layer.msg('获取统计数据失败: ' + data.errMsg);
+                        return;
+                    }
+                    var overall = data.data.overall;
+                    var fmt = v => v === null || v === undefined ? '-' : v;
+                    document.getElementById('analytics-summary').innerHTML = `
+                        <span>请求数: <b>${overall.count}</b></span>
+                        <span>请求/秒: <b>${fmt(overall.rate_per_sec)}</b></span>
+                        <span>错误率: <b>${overall.error_rate === null ? '-' : (overall.error_rate * 100).toFixed(2) + '%'}</b></span>
+                        <span>P50: <b>${fmt(overall.p50_ms)}</b> ms</span>
+                        <span>P90: <b>${fmt(overall.p90_ms)}</b> ms</span>
+                        <span>P99: <b>${fmt(overall.p99_ms)}</b> ms</span>
+                    `;
+                    document.getElementById('analytics-group-name').textContent = groupSelect.options[groupSelect.selectedIndex].text;
+                    var column = group === 'status_code' ? 'status_code' : (group === 'module' ? 'module' : 'route');
+                    document.getElementById('analytics-rows').innerHTML = data.data.groups.map(item => `
+                        <tr>
+                            <td>${item[column] === '' ? '-' : item[column]}</td>
+                            <td>${item.count}</td>
+                            <td>${fmt(item.rate_per_sec)}</td>
+                            <td>${item.error_rate === null ? '-' : (item.error_rate * 100).toFixed(2) + '%'}</td>
+                            <td>${fmt(item.p50_ms)}</td>
+                            <td>${fmt(item.p90_ms)}</td>
+                            <td>${fmt(item.p99_ms)}</td>
+                        </tr>
+                    `).join('');
+                    drawAnalyticsChart(data.data);
+                })
+                .catch(error => {
+                    layui.layer.msg('获取统计数据失败: ' + error.message);
+                });
+        }
+        
+        // 绘制时间直方图：柱状为请求数，折线为P99延迟
+        function drawAnalyticsChart(data) {
+            var canvas = document.getElementById('analytics-chart');
+            var width = canvas.width = canvas.clientWidth;
+            var height = canvas.height = canvas.clientHeight;
+            var ctx = canvas.getContext('2d');
+            ctx.clearRect(0, 0, width, height);
+            
+            var padding = {left: 40, right: 50, top: 15, bottom: 25};
+            var plotWidth = width - padding.left - padding.right;
+            var plotHeight = height - padding.top - padding.bottom;
+            var slots = Math.max(1, Math.ceil((data.end_time - data.start_time) / data.interval));
+            var firstSlot = Math.floor(data.start_time / data.interval) * data.interval;
+            var barWidth = plotWidth / slots;
+            var maxCount = Math.max(1, ...data.series.map(p => p.count));
+            var maxP99 = Math.max(1, ...data.series.map(p => p.p99_ms || 0));
+            
+            // 坐标轴标签
+            ctx.fillStyle = '#999';
+            ctx.font = '11px sans-serif';
+            ctx.fillText(maxCount, 5, padding.top + 8);
+            ctx.fillText('0', 5, height - padding.bottom);
+            ctx.fillText(maxP99.toFixed(1) + 'ms', width - padding.right + 4, padding.top + 8);
+            ctx.fillText(formatISOTime(data.start_time), padding.left, height - 8);
+            var endLabel = formatISOTime(data.end_time);
+            ctx.fillText(endLabel, width - padding.right - ctx.measureText(endLabel).width, height - 8);
+            
+            // 请求数柱状图，错误请求以红色叠加
+            data.series.forEach(point => {
+                var x = padding.left + (point.time - firstSlot) / data.interval * barWidth;
+                var h = point.count / maxCount * plotHeight;
+                ctx.fillStyle = '#1E9FFF';
+                ctx.fillRect(x, height - padding.bottom - h, Math.max(barWidth - 1, 1), h);
+                var eh = point.error_count / maxCount * plotHeight;
+                ctx.fillStyle = '#FF5722';
+                ctx.fillRect(x, height - padding.bottom - eh, Math.max(barWidth - 1, 1), eh);
+            });
+            
+            // P99折线
+            ctx.strokeStyle = '#FFB800';
+            ctx.lineWidth = 2;
+            ctx.beginPath();
+            data.series.forEach((point, index) => {
+                var x = padding.left + (point.time - firstSlot) / data.interval * barWidth + barWidth / 2;
+                var y = height - padding.bottom - (point.p99_ms || 0) / maxP99 * plotHeight;
+                if (index === 0) {
+                    ctx.moveTo(x, y);
+                } else {
+                    ctx.lineTo(x, y);
+                }
+            });
+            ctx.stroke();
+        }
+        
         // 一键复制功能
         function addCopyFunctionality() {
             var contentDivs = document.querySelectorAll('.detail-content');
@@ -1037,7 +1264,10 @@ LOGS_API_TEMPLATE = '''
         "page": {{ page }},
         "size": {{ size }},
         "total": {{ total }},
-        "total_pages": {{ total_pages }}
+        "total_pages": {{ total_pages }},
+        "next": {{ next | tojson }},
+        "freshness": {{ freshness | tojson }},
+        "collector": {{ collector | tojson }}
     }
 }
 '''
@@ -1050,6 +1280,32 @@ REQUEST_DETAIL_TEMPLATE = '''
 }
 '''
 
+def parse_log_filters():
+    """从查询参数中解析日志筛选条件
+
+    Returns:
+        tuple: (start_time, end_time, modules, status_code)
+    """
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    
+    # 获取所有module参数（可能有多个）
+    modules = request.args.getlist('module')
+    # 如果没有模块参数或者只有一个空模块参数，则设置为None
+    if not modules or (len(modules) == 1 and not modules[0]):
+        modules = None
+    
+    status_code = request.args.get('status_code')
+    
+    # 如果status_code存在且不为空，则转换为整数
+    if status_code:
+        try:
+            status_code = int(status_code)
+        except ValueError:
+            status_code = None
+    
+    return start_time, end_time, modules, status_code
+
 @bp.route('/favicon.ico')
 def favicon():
     """favicon图标接口"""
@@ -1061,39 +1317,47 @@ def favicon():
 def index():
     """返回页面"""
     try:
-        return render_template_string(PAGE_TEMPLATE)
+        return render_template_string(PAGE_TEMPLATE, federation_enabled=federation.enabled)
     except Exception as e:
         return f"<h1>错误</h1><p>加载页面失败: {str(e)}</p>", 500
 
 @bp.route('/.api/requests', methods=['GET'])
 def request_logs():
-    """获取请求日志列表API"""
+    """获取请求日志列表API
+
+    Query Parameters:
+        page/size: 页码和每页条数（可选，默认为1和10）
+        before: 上一页最后一条记录的request_id，指定时按id翻页并忽略page（可选）
+        before_node: 上一页最后一条记录的节点，id相同的记录按节点名称继续翻页（可选，联合查询使用）
+        federated: 为1时同时查询 MOCKS_PEERS 中的所有节点并合并结果（可选，见 app/federation.py）
+        start_time/end_time/module/status_code: 筛选条件
+    """
     try:
         # 解析请求参数
         page = int(request.args.get('page', 1))
         size = int(request.args.get('size', 10))
+        before = request.args.get('before')
+        before_node = request.args.get('before_node')
+        if before and decode_id(before) is None:
+            return jsonify({
+                "errCode": 400,
+                "errMsg": "before必须是新格式的请求ID",
+                "data": None
+            }), 400
         
         # 获取筛选条件
-        start_time = request.args.get('start_time')
-        end_time = request.args.get('end_time')
+        start_time, end_time, modules, status_code = parse_log_filters()
         
-        # 获取所有module参数（可能有多个）
-        modules = request.args.getlist('module')
-        # 如果没有模块参数或者只有一个空模块参数，则设置为None
-        if not modules or (len(modules) == 1 and not modules[0]):
-            modules = None
-        
-        status_code = request.args.get('status_code')
-        
-        # 如果status_code存在且不为空，则转换为整数
-        if status_code:
-            try:
-                status_code = int(status_code)
-            except ValueError:
-                status_code = None
+        if request.args.get('federated') == '1' and federation.enabled:
+            return jsonify({
+                "errCode": 0,
+                "errMsg": "Success",
+                "data": federation.list_requests(size, before, start_time, end_time, modules, status_code,
+                                                 before_node)
+            })
         
         # 获取符合条件的请求日志总数
-        total = get_requests_count(
+        total = get_storage().count(
             start_time=start_time,
             end_time=end_time,
             modules=modules,
@@ -1104,14 +1368,18 @@ def request_logs():
         total_pages = (total + size - 1) // size  # 向上取整
         
         # 根据筛选条件和分页参数获取请求日志
-        paginated_logs = get_all_requests(
-            pagesize=size,
-            current=page,
-            start_time=start_time,
-            end_time=end_time,
-            modules=modules,
-            status_code=status_code
-        )
+        if before:
+            paginated_logs = list_page(get_storage(), decode_id(before), before_node, size, start_time, end_time,
+                                       modules, status_code)
+        else:
+            paginated_logs = get_storage().list(
+                pagesize=size,
+                current=page,
+                start_time=start_time,
+                end_time=end_time,
+                modules=modules,
+                status_code=status_code
+            )
         
         # 返回JSON格式数据
         return render_template_string(LOGS_API_TEMPLATE,
@@ -1119,7 +1387,10 @@ def request_logs():
                                     page=page,
                                     size=size,
                                     total=total,
-                                    total_pages=total_pages)
+                                    total_pages=total_pages,
+                                    next=paginated_logs[-1]['request_id'] if paginated_logs and len(paginated_logs) >= size else None,
+                                    freshness=get_storage().freshness(),
+                                    collector=config.COLLECTOR_ENABLED)
     except Exception as e:
         return jsonify({
             "errCode": 500,
@@ -1127,12 +1398,89 @@ def request_logs():
             "data": None
         }), 500
 
+@bp.route('/.api/requests', methods=['DELETE'])
+def delete_request_logs():
+    """删除时间范围内的请求日志API
+
+    Query Parameters:
+        start_time/end_time: 时间范围，至少指定一个
+    """
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    if not start_time and not end_time:
+        return jsonify({
+            "errCode": 400,
+            "errMsg": "请至少指定start_time或end_time",
+            "data": None
+        }), 400
+    
+    try:
+        # 先写完队列中的日志，避免范围内的日志在删除后才落盘
+        log_writer.flush()
+        deleted = get_storage().delete_range(start_time=start_time, end_time=end_time)
+        return jsonify({
+            "errCode": 0,
+            "errMsg": "success",
+            "data": {"deleted": deleted}
+        })
+    except Exception as e:
+        return jsonify({
+            "errCode": 500,
+            "errMsg": "删除请求日志失败: " + str(e),
+            "data": None
+        }), 500
+
+@bp.route('/.api/requests/export', methods=['GET'])
+def export_request_logs():
+    """流式导出请求日志API
+
+    Query Parameters:
+        format: 导出格式 ndjson/csv/har（可选，默认为ndjson）
+        gzip: 为1时以gzip压缩输出（可选）
+        start_time/end_time/module/status_code: 与日志列表相同的筛选条件
+    """
+    fmt = request.args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            "errCode": 400,
+            "errMsg": f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}",
+            "data": None
+        }), 400
+    
+    use_gzip = request.args.get('gzip', '0').lower() in ('1', 'true', 'yes')
+    start_time, end_time, modules, status_code = parse_log_filters()
+    
+    # 在生成器外部完成参数解析，流式输出期间不再依赖请求上下文
+    records = get_storage().iter(
+        start_time=start_time,
+        end_time=end_time,
+        modules=modules,
+        status_code=status_code
+    )
+    body = export_records(records, fmt)
+    
+    _, mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"requests-{time.strftime('%Y%m%d%H%M%S')}.{extension}"
+    if use_gzip:
+        body = gzip_chunks(body)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    # 不设置Content-Length，由WSGI服务器使用分块传输
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename={filename}',
+        'X-Accel-Buffering': 'no'
+    })
+
 @bp.route('/.api/modules', methods=['GET'])
 def get_modules():
     """获取所有可用的模块列表"""
     try:
-        # 调用数据库函数获取所有模块
-        modules = get_all_modules()
+        # 从存储后端获取所有模块（federated=1 时合并所有节点的模块）
+        if request.args.get('federated') == '1' and federation.enabled:
+            modules = federation.modules()
+        else:
+            modules = get_storage().modules()
         
         # 返回JSON格式数据
         return jsonify({
@@ -1147,12 +1495,205 @@ def get_modules():
             "data": None
         }), 500
 
+@bp.route('/.api/analytics', methods=['GET'])
+def get_analytics():
+    """延迟分位数、请求速率和错误率统计API（基于分钟统计表）
+
+    Query Parameters:
+        window: 时间窗口秒数，未指定start_time时生效（可选，默认为3600）
+        group_by: 分组维度 module/route/url/status_code，可逗号分隔或多次指定（可选）
+        interval: 时间序列粒度秒数（可选，默认为60）
+        start_time/end_time/module/status_code: 与日志列表相同的筛选条件
+    """
+    try:
+        start_time, end_time, modules, status_code = parse_log_filters()
+        if not start_time:
+            window = int(request.args.get('window', DEFAULT_WINDOW))
+            start_time = (float(end_time) if end_time else time.time()) - window
+        
+        group_by = []
+        for value in request.args.getlist('group_by'):
+            group_by.extend(item.strip() for item in value.split(',') if item.strip())
+        
+        data = get_storage().analytics(
+            start_time=start_time,
+            end_time=end_time,
+            group_by=group_by,
+            modules=modules,
+            status_code=status_code,
+            interval=int(request.args.get('interval', 60))
+        )
+        return jsonify({
+            "errCode": 0,
+            "errMsg": "success",
+            "data": data
+        })
+    except ValueError as e:
+        return jsonify({
+            "errCode": 400,
+            "errMsg": f"参数错误: {e}，可选分组: {', '.join(GROUP_COLUMNS)}",
+            "data": None
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "errCode": 500,
+            "errMsg": "获取统计数据失败: " + str(e),
+            "data": None
+        }), 500
+
+@bp.route('/.api/timings', methods=['GET'])
+def get_timings():
+    """获取当前worker进程内按模块/端点聚合的请求阶段耗时
+
+    Query Parameters:
+        reset: 为1时返回后清空统计（可选）
+    """
+    data = {
+        'phases': phase_stats.snapshot(),
+        'writer': log_writer.stats(),
+        'breaker': log_sink.stats(),
+        'admission': admission.stats(),
+        'snapshot': dashboard_snapshot.stats(),
+        'shipper': log_shipper.stats()
+    }
+    if request.args.get('reset') == '1':
+        phase_stats.reset()
+    
+    return jsonify({
+        "errCode": 0,
+        "errMsg": "success",
+        "data": data
+    })
+
+@bp.route('/.api/ingest', methods=['POST'])
+def ingest_logs():
+    """收集端接收其他节点分批发送的请求日志API（需要设置 MOCKS_COLLECTOR=1，见 app/shipper.py）
+
+    Request Body:
+        NDJSON，每行是一条按 ROW_COLUMNS 顺序排列的日志行数组，可使用 Content-Encoding: gzip 压缩；
+        X-Mocks-Node 请求头为发送节点的名称
+    """
+    if not config.COLLECTOR_ENABLED:
+        return jsonify({
+            "errCode": 404,
+            "errMsg": "当前节点未启用收集端（MOCKS_COLLECTOR=1）",
+            "data": None
+        }), 404
+    if not config.COLLECTOR_TOKEN:
+        # 没有令牌时任何能访问到收集端的人都可以写入日志
+        return jsonify({
+            "errCode": 403,
+            "errMsg": "收集端未配置 MOCKS_COLLECTOR_TOKEN，拒绝接收日志",
+            "data": None
+        }), 403
+    if request.headers.get('Authorization') != f'Bearer {config.COLLECTOR_TOKEN}':
+        return jsonify({
+            "errCode": 401,
+            "errMsg": "收集端令牌不正确",
+            "data": None
+        }), 401
+    
+    try:
+        rows = decode_batch(request.get_data(), request.headers.get('Content-Encoding'),
+                            request.headers.get('X-Mocks-Node'))
+    except ValueError as e:
+        return jsonify({
+            "errCode": 400,
+            "errMsg": "日志数据格式错误: " + str(e),
+            "data": None
+        }), 400
+    
+    inserted = get_storage().ingest_batch(rows) if rows else 0
+    if inserted is None:
+        # 发送端会在Retry-After之后重发同一批
+        response = jsonify({
+            "errCode": 503,
+            "errMsg": "写入日志失败，请稍后重试",
+            "data": None
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    registry.inc('mocks_ingest_records_total', {'outcome': 'inserted'}, inserted)
+    if len(rows) > inserted:
+        registry.inc('mocks_ingest_records_total', {'outcome': 'duplicate'}, len(rows) - inserted)
+    return jsonify({
+        "errCode": 0,
+        "errMsg": "success",
+        "data": {"received": len(rows), "inserted": inserted}
+    })
+
+@bp.route('/.api/recordings/compile', methods=['POST'])
+def compile_recordings():
+    """将录制代理记录的请求编译为回放模块API
+
+    Request Body:
+        module: 生成的模块名称（必填，小写字母、数字和下划线）
+        source: 录制来源的模块名称（可选，默认为proxy，必须是合法的模块名称）
+        start_time/end_time: 录制的时间范围（可选）
+        overwrite: 为true时覆盖之前生成的同名回放模块（可选）
+
+    该接口会在 app/modules 下写入代码，需要配置 MOCKS_RECORDINGS_TOKEN 并携带 Authorization: Bearer <令牌>
+    """
+    if not config.RECORDINGS_TOKEN:
+        return jsonify({
+            "errCode": 403,
+            "errMsg": "未配置 MOCKS_RECORDINGS_TOKEN，不能编译录制模块",
+            "data": None
+        }), 403
+    if request.headers.get('Authorization') != f'Bearer {config.RECORDINGS_TOKEN}':
+        return jsonify({
+            "errCode": 401,
+            "errMsg": "令牌不正确",
+            "data": None
+        }), 401
+    
+    params = request.get_json(silent=True) or {}
+    source = params.get('source') or 'proxy'
+    try:
+        if not isinstance(source, str) or not MODULE_NAME_PATTERN.match(source):
+            raise ValueError(f"录制来源必须是模块名称: {source}")
+        records = get_storage().iter(
+            start_time=params.get('start_time'),
+            end_time=params.get('end_time'),
+            modules=[source]
+        )
+        result = compile_module(params.get('module'), records, source, bool(params.get('overwrite')))
+    except ValueError as e:
+        return jsonify({
+            "errCode": 400,
+            "errMsg": str(e),
+            "data": None
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "errCode": 500,
+            "errMsg": "编译录制模块失败: " + str(e),
+            "data": None
+        }), 500
+
+    return jsonify({
+        "errCode": 0,
+        "errMsg": "编译完成，重启应用后加载新模块",
+        "data": result
+    })
+
+@bp.route('/.api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的运行指标（合并所有worker进程）"""
+    try:
+        return Response(render_all_workers(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        return f"# 获取指标失败: {e}\n", 500, {'Content-Type': 'text/plain; charset=utf-8'}
+
 @bp.route('/.api/requests/<request_id>', methods=['GET'])
 def request_detail(request_id):
     """获取单个请求的详细信息"""
     try:
-        # 获取指定请求日志
-        log = get_request_by_id(request_id)
+        # 获取指定请求日志，本节点没有时按需到其他节点查找
+        log = get_storage().get(request_id)
+        if log is None and request.args.get('federated') == '1' and federation.enabled:
+            log, _ = federation.find_request(request_id)
         
         if log is None:
             return jsonify({
@@ -0,0 +1,316 @@
+"""日志持久化熔断器与溢出文件
+
+数据库被锁、提交变慢或写入失败时，熔断器打开，日志改为追加到本地溢出文件，
+请求线程和后台写入器都不再等待数据库。冷却时间过后放行一次试探写入，
+成功后关闭熔断器，由后台线程把溢出文件中的日志分批回放到存储后端。
+"""
+import json
+import os
+import threading
+import time
+
+from . import config
+from .database import ROW_COLUMNS
+from .ids import encode_id
+from .metrics import registry
+from .storage import get_storage
+from .storage.base import ID_INDEX, encode_row
+
+SPILL_PREFIX = 'spill-'
+SPILL_SUFFIX = '.ndjson'
+REPLAYING_SUFFIX = '.replaying'
+
+# 其他进程的溢出文件超过该秒数未修改才会被当前进程接管回放
+SPILL_IDLE_SECONDS = 2.0
+# 回放线程两次检查之间的间隔（秒）
+REPLAY_INTERVAL = 1.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """连续失败（或提交过慢）达到阈值后打开，冷却后放行一次试探"""
+
+    def __init__(self, failure_threshold=3, cooldown=5.0, slow_ms=500.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_ms = slow_ms
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否允许本次写入数据库；半开状态只放行一个试探"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def ready(self):
+        """是否可以尝试写入（已关闭或冷却时间已过），不改变状态"""
+        return self.state == CLOSED or (
+            self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown)
+
+    def record(self, ok, elapsed_ms):
+        """记录一次写入结果，失败或超过 slow_ms 都计为失败"""
+        with self._lock:
+            self._probing = False
+            if ok and elapsed_ms <= self.slow_ms:
+                self.failures = 0
+                self.state = CLOSED
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                    print(f"日志写入熔断: 连续{self.failures}次失败或变慢，{self.cooldown}秒内改写溢出文件")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures, 'trips': self.trips}
+
+
+class SpillStore:
+    """溢出文件: 每个进程追加到自己的NDJSON文件，回放时先改名认领"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 待回放字节数的内存计数，每个进程第一次使用时从磁盘统计一次
+        self._bytes = 0
+        self._bytes_pid = None
+
+    def _own_path(self):
+        return os.path.join(self.directory, f'{SPILL_PREFIX}{os.getpid()}{SPILL_SUFFIX}')
+
+    def pending_bytes(self):
+        """所有待回放的溢出文件大小（追加时累加、回放删除文件时扣减的计数，不扫描目录）"""
+        if self._bytes_pid != os.getpid():
+            with self._lock:
+                self._load_bytes()
+        return self._bytes
+
+    def _load_bytes(self):
+        """从磁盘统计待回放的字节数（调用方持有锁）"""
+        if self._bytes_pid == os.getpid():
+            return
+        total = 0
+        for path in self._paths():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                continue
+        self._bytes = total
+        self._bytes_pid = os.getpid()
+
+    def _paths(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names)
+                if name.startswith(SPILL_PREFIX) and (name.endswith(SPILL_SUFFIX) or name.endswith(REPLAYING_SUFFIX))]
+
+    def append(self, rows):
+        """追加日志行，超出总大小上限时返回False"""
+        data = ''.join(encode_row(row) + '\n' for row in rows).encode('utf-8')
+        with self._lock:
+            self._load_bytes()
+            if self._bytes + len(data) > self.max_bytes:
+                return False
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._own_path(), 'ab') as f:
+                f.write(data)
+            self._bytes += len(data)
+        return True
+
+    def claim(self):
+        """认领一个待回放的溢出文件
+
+        当前进程自己的文件直接改名认领；其他进程的文件空闲一段时间后才接管（进程可能已经退出）。
+        改名是原子的，同一个文件只会被一个进程认领。
+
+        Returns:
+            tuple: (认领后的路径, 日志行, 是否为中断后重新认领的回放文件)；没有待回放文件时路径为None
+        """
+        own = self._own_path()
+        for path in self._paths():
+            resumed = path.endswith(REPLAYING_SUFFIX)
+            if resumed:
+                # 回放进程中途退出留下的文件，长时间无人处理时接管
+                if not self._idle(path, 60):
+                    continue
+                claimed = f'{path[:-len(REPLAYING_SUFFIX)]}-{os.getpid()}{REPLAYING_SUFFIX}'
+            else:
+                if path != own and not self._idle(path, SPILL_IDLE_SECONDS):
+                    continue
+                claimed = f'{path[:-len(SPILL_SUFFIX)]}-{os.getpid()}{REPLAYING_SUFFIX}'
+            try:
+                with self._lock:
+                    os.rename(path, claimed)
+            except OSError:
+                continue
+            rows = []
+            try:
+                with open(claimed, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            row = tuple(json.loads(line))
+                            # 旧版本写入的溢出文件缺少新增的列
+                            rows.append(row + (None,) * (len(ROW_COLUMNS) - len(row)))
+                        except ValueError:
+                            continue
+            except OSError:
+                continue
+            return claimed, rows, resumed
+        return None, [], False
+
+    @staticmethod
+    def _idle(path, seconds):
+        try:
+            return time.time() - os.path.getmtime(path) >= seconds
+        except OSError:
+            return False
+
+    def finish(self, claimed, remaining):
+        """回放结束: 未写入的行写回溢出文件，删除认领的文件"""
+        if remaining:
+            self.append(remaining)
+        try:
+            size = os.path.getsize(claimed)
+            os.remove(claimed)
+        except OSError:
+            return
+        with self._lock:
+            self._load_bytes()
+            # 其他进程写入的文件可能不在本进程的计数中
+            self._bytes = max(self._bytes - size, 0)
+
+
+class ResilientLogSink:
+    """带熔断和溢出文件的日志持久化入口，后台写入器和同步写入共用"""
+
+    def __init__(self, breaker, spill, batch_size=200):
+        self.breaker = breaker
+        self.spill = spill
+        self.batch_size = batch_size
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self._pid = None
+        self._checked_pid = None
+        self._lock = threading.Lock()
+
+    def write(self, rows):
+        """写入日志行，数据库不可用时转存溢出文件
+
+        Returns:
+            tuple: (结果 written/spilled/dropped, 数据库写入耗时纳秒；未写数据库时为None)
+        """
+        if self._checked_pid != os.getpid():
+            # 进程启动后第一次写入时检查上次运行遗留的溢出文件
+            self._checked_pid = os.getpid()
+            if self.spill.pending_bytes():
+                self._ensure_replayer()
+        if self.breaker.allow():
+            start_ns = time.perf_counter_ns()
+            ok = get_storage().write_batch(rows)
+            elapsed_ns = time.perf_counter_ns() - start_ns
+            self.breaker.record(ok, elapsed_ns / 1e6)
+            if ok:
+                return 'written', elapsed_ns
+            return self._spill(rows), elapsed_ns
+        return self._spill(rows), None
+
+    def _spill(self, rows):
+        try:
+            ok = self.spill.append(rows)
+        except OSError as e:
+            print(f"写入溢出文件时出错: {e}")
+            ok = False
+        if not ok:
+            self.dropped += len(rows)
+            registry.inc('mocks_log_records_total', {'outcome': 'dropped'}, len(rows))
+            return 'dropped'
+        self.spilled += len(rows)
+        registry.inc('mocks_log_records_total', {'outcome': 'spilled'}, len(rows))
+        self._ensure_replayer()
+        return 'spilled'
+
+    def _ensure_replayer(self):
+        """在当前进程中启动回放线程（fork出的worker会各自启动）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._replay_loop, name='log-spill-replayer', daemon=True)
+        thread.start()
+
+    def _replay_loop(self):
+        while True:
+            time.sleep(REPLAY_INTERVAL)
+            try:
+                self.replay_pending()
+            except Exception as e:
+                print(f"回放溢出日志时出错: {e}")
+
+    def replay_pending(self):
+        """熔断器关闭时把溢出文件分批回放到存储后端，返回回放条数"""
+        replayed = 0
+        while self.breaker.ready():
+            claimed, rows, resumed = self.spill.claim()
+            if claimed is None:
+                break
+            if resumed:
+                # 上次回放中断时部分日志可能已经写入，跳过已存在的记录
+                rows = [row for row in rows if row[ID_INDEX] is None
+                        or get_storage().get(encode_id(row[ID_INDEX])) is None]
+            index = 0
+            while index < len(rows) and self.breaker.allow():
+                batch = rows[index:index + self.batch_size]
+                start_ns = time.perf_counter_ns()
+                ok = get_storage().write_batch(batch)
+                self.breaker.record(ok, (time.perf_counter_ns() - start_ns) / 1e6)
+                if not ok:
+                    break
+                index += len(batch)
+                replayed += len(batch)
+                self.replayed += len(batch)
+                registry.inc('mocks_log_records_total', {'outcome': 'replayed'}, len(batch))
+            self.spill.finish(claimed, rows[index:])
+        return replayed
+
+    def stats(self):
+        stats = self.breaker.stats()
+        stats.update({
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+            'spill_bytes': self.spill.pending_bytes()
+        })
+        return stats
+
+
+# 全局日志持久化入口
+log_sink = ResilientLogSink(
+    CircuitBreaker(config.LOG_BREAKER_FAILURES, config.LOG_BREAKER_COOLDOWN, config.LOG_SLOW_COMMIT_MS),
+    SpillStore(config.SPILL_DIR, config.SPILL_MAX_BYTES),
+    batch_size=config.LOG_BATCH_SIZE
+)
+
+registry.register_gauge('mocks_log_breaker_open', lambda: 0 if log_sink.breaker.state == CLOSED else 1)
+registry.register_gauge('mocks_log_spill_bytes', log_sink.spill.pending_bytes)
@@ -0,0 +1,313 @@
+"""请求日志采集策略
+
+决定每个请求是否记录日志、以及记录到什么程度:
+
+    skip    不记录日志（仍经过准入控制并计入运行指标）
+    summary 只记录摘要（方法、路径、请求头、响应码、耗时等），不读取请求/响应体
+    full    完整记录请求/响应体
+
+策略来源（按优先级从高到低，同一来源内按顺序第一条匹配的规则生效）:
+
+1. 内置规则: base 蓝图（日志页面和管理接口）不记录
+2. 环境变量 MOCKS_CAPTURE_RULES（JSON数组），例如
+   [{"path": "/example/health", "capture": "skip"},
+    {"module": "example", "status": "5xx", "capture": "full"}]
+3. 各模块 MODULE_CONFIG 中的 capture 项: 字符串（模块默认级别）或 {"default": ..., "rules": [...]}
+4. 默认级别 MOCKS_CAPTURE_DEFAULT（默认为 full）
+
+规则可用的条件: module、path（支持 * 通配）、path_regex、methods、status（如 "2xx"、"404"、"500-599" 或列表）、
+headers（{"X-Debug": "1"} 表示请求头等于该值，值为 "*" 表示存在即可）。
+
+策略在应用启动时按端点预编译: 对每个端点只保留可能匹配的规则，
+没有运行时条件的端点直接得到固定结果，每个请求只需要一次字典查找。
+"""
+import fnmatch
+import importlib
+import json
+import re
+import threading
+
+from . import config
+
+SKIP = 0
+SUMMARY = 1
+FULL = 2
+
+LEVELS = {'skip': SKIP, 'summary': SUMMARY, 'full': FULL}
+
+# 内置规则: 不记录 base 蓝图下的请求
+BUILTIN_RULES = [{'module': 'base', 'capture': 'skip'}]
+
+
+def parse_level(value, default=FULL):
+    """将 skip/summary/full 转换为级别常量"""
+    if value is None:
+        return default
+    level = LEVELS.get(str(value).strip().lower())
+    if level is None:
+        raise ValueError(f"不支持的采集级别: {value}，可选: {', '.join(LEVELS)}")
+    return level
+
+
+def compile_status(spec):
+    """将响应码条件编译为判断函数，如 "2xx"、"404"、"500-599" 或它们的列表"""
+    if spec is None:
+        return None
+    items = spec if isinstance(spec, (list, tuple)) else [spec]
+    ranges = []
+    for item in items:
+        text = str(item).strip().lower()
+        if text.endswith('xx') and len(text) == 3 and text[0].isdigit():
+            low = int(text[0]) * 100
+            ranges.append((low, low + 99))
+        elif '-' in text:
+            low, high = text.split('-', 1)
+            ranges.append((int(low), int(high)))
+        else:
+            ranges.append((int(text), int(text)))
+    return lambda status: any(low <= status <= high for low, high in ranges)
+
+
+class RequestRule:
+    """按模块、路径、方法和请求头匹配请求的规则（采集策略和响应整形共用）"""
+
+    __slots__ = ('module', 'path', 'path_regex', 'methods', 'headers', 'source')
+
+    def __init__(self, spec, source='config', module=None):
+        self.source = source
+        self.module = spec.get('module', module)
+        path = spec.get('path')
+        self.path = path
+        pattern = spec.get('path_regex')
+        if pattern is None and path is not None:
+            pattern = fnmatch.translate(path)
+        self.path_regex = re.compile(pattern) if pattern is not None else None
+        methods = spec.get('methods') or spec.get('method')
+        if isinstance(methods, str):
+            methods = [methods]
+        self.methods = frozenset(m.upper() for m in methods) if methods else None
+        headers = spec.get('headers') or {}
+        self.headers = [(name, None if value == '*' else str(value)) for name, value in headers.items()]
+
+    def static_match(self, blueprint, rule_path, methods):
+        """根据端点的静态信息判断规则是否可能匹配
+
+        Returns:
+            True（一定匹配请求侧条件）/ False（不可能匹配）/ None（需要运行时判断）
+        """
+        if self.module is not None and self.module != blueprint:
+            return False
+        if self.methods is not None and methods is not None and not (self.methods & methods):
+            return False
+        runtime = bool(self.headers)
+        if self.methods is not None and (methods is None or not methods <= self.methods):
+            runtime = True
+        if self.path_regex is not None:
+            if rule_path is None or '<' in rule_path:
+                runtime = True
+            elif not self.path_regex.match(rule_path):
+                return False
+        return None if runtime else True
+
+    def request_match(self, method, path, headers):
+        """运行时判断请求侧条件（模块已在编译时判断）"""
+        if self.methods is not None and method not in self.methods:
+            return False
+        if self.path_regex is not None and not self.path_regex.match(path):
+            return False
+        for name, value in self.headers:
+            actual = headers.get(name)
+            if actual is None or (value is not None and actual != value):
+                return False
+        return True
+
+
+class CaptureRule(RequestRule):
+    """编译后的单条采集规则"""
+
+    __slots__ = ('status', 'level')
+
+    def __init__(self, spec, source='config', module=None):
+        super().__init__(spec, source, module)
+        self.status = compile_status(spec.get('status'))
+        self.level = parse_level(spec.get('capture'))
+
+
+class CaptureDecision:
+    """一个请求的采集决定
+
+    level 为请求侧条件决定的级别；pending 为排在其之前、还需要按响应码判断的规则，
+    响应时第一条响应码匹配的规则覆盖 level。
+    """
+
+    __slots__ = ('level', 'pending')
+
+    def __init__(self, level, pending=()):
+        self.level = level
+        self.pending = pending
+
+    @property
+    def skip(self):
+        """请求侧就能确定不记录"""
+        return self.level == SKIP and not self.pending
+
+    def resolve(self, status_code):
+        for rule in self.pending:
+            if rule.status(status_code):
+                return rule.level
+        return self.level
+
+
+class EndpointPlan:
+    """端点的预编译结果: 固定的决定，或需要运行时判断的候选规则"""
+
+    __slots__ = ('decision', 'rules', 'default')
+
+    def __init__(self, decision=None, rules=(), default=FULL):
+        self.decision = decision
+        self.rules = rules
+        self.default = default
+
+
+def decide(rules, default, method, path, headers):
+    """按顺序对候选规则求值"""
+    pending = []
+    for rule in rules:
+        if not rule.request_match(method, path, headers):
+            continue
+        if rule.status is not None:
+            pending.append(rule)
+            continue
+        return CaptureDecision(rule.level, tuple(pending))
+    return CaptureDecision(default, tuple(pending))
+
+
+class CapturePolicy:
+    """采集策略，启动时调用 compile(app) 按端点预编译"""
+
+    def __init__(self, default=FULL):
+        self.default = default
+        self.rules = []
+        self.module_defaults = {}
+        self.overrides = {}
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def load(self, env_rules=None, module_configs=None):
+        """加载规则
+
+        Args:
+            env_rules: 全局规则列表（来自 MOCKS_CAPTURE_RULES）
+            module_configs: 蓝图名称 -> 模块 MODULE_CONFIG 中的 capture 项
+        """
+        rules = [CaptureRule(spec, 'builtin') for spec in BUILTIN_RULES]
+        rules.extend(CaptureRule(spec, 'env') for spec in env_rules or [])
+        module_defaults = {}
+        for blueprint, capture in (module_configs or {}).items():
+            if isinstance(capture, dict):
+                rules.extend(CaptureRule(spec, blueprint, module=blueprint) for spec in capture.get('rules', []))
+                if capture.get('default') is not None:
+                    module_defaults[blueprint] = parse_level(capture['default'])
+            elif capture is not None:
+                module_defaults[blueprint] = parse_level(capture)
+        with self._lock:
+            self.rules = rules
+            self.module_defaults = module_defaults
+            self._plans = {}
+
+    def set_module_capture(self, blueprint, capture):
+        """临时覆盖某个模块的采集级别（capture为None时取消覆盖），用于基准测试等场景"""
+        with self._lock:
+            if capture is None:
+                self.overrides.pop(blueprint, None)
+            else:
+                self.overrides[blueprint] = parse_level(capture)
+            self._plans = {}
+
+    def compile(self, app):
+        """为应用中的所有端点预编译采集计划"""
+        plans = {}
+        for url_rule in app.url_map.iter_rules():
+            blueprint = url_rule.endpoint.rpartition('.')[0] or None
+            plans[url_rule.endpoint] = self._plan(blueprint, url_rule.rule, url_rule.methods)
+        with self._lock:
+            self._plans = plans
+        return plans
+
+    def _plan(self, blueprint, rule_path, methods):
+        if blueprint in self.overrides:
+            return EndpointPlan(CaptureDecision(self.overrides[blueprint]))
+        methods = frozenset(methods) - {'HEAD', 'OPTIONS'} if methods else None
+        default = self.module_defaults.get(blueprint, self.default)
+        candidates = []
+        static = True
+        for rule in self.rules:
+            matched = rule.static_match(blueprint, rule_path, methods or None)
+            if matched is False:
+                continue
+            candidates.append(rule)
+            if matched is None:
+                static = False
+            elif rule.status is None:
+                # 之后的规则不会再生效
+                break
+        if static:
+            # 所有候选规则的请求侧条件都在编译时确定，结果固定
+            pending = tuple(rule for rule in candidates if rule.status is not None)
+            level = candidates[-1].level if candidates and candidates[-1].status is None else default
+            return EndpointPlan(CaptureDecision(level, pending))
+        return EndpointPlan(rules=tuple(candidates), default=default)
+
+    def decide(self, request):
+        """为当前请求做出采集决定"""
+        endpoint = request.endpoint
+        plan = self._plans.get(endpoint)
+        if plan is None:
+            # 未预编译的端点（如404）按路径实时求值，有端点时缓存计划
+            blueprint = request.blueprint
+            rule_path = request.url_rule.rule if request.url_rule else None
+            methods = request.url_rule.methods if request.url_rule else None
+            plan = self._plan(blueprint, rule_path, methods)
+            if endpoint is not None:
+                self._plans[endpoint] = plan
+        if plan.decision is not None:
+            return plan.decision
+        return decide(plan.rules, plan.default, request.method, request.path, request.headers)
+
+
+def load_env_rules(text=None, name='MOCKS_CAPTURE_RULES'):
+    """读取环境变量中JSON数组格式的全局规则"""
+    text = config.CAPTURE_RULES if text is None else text
+    if not text:
+        return []
+    try:
+        rules = json.loads(text)
+    except ValueError as e:
+        print(f"解析 {name} 时出错: {e}")
+        return []
+    return rules if isinstance(rules, list) else []
+
+
+def load_module_configs(registered_modules, key='capture'):
+    """收集各模块 MODULE_CONFIG 中的指定配置项，按蓝图名称返回"""
+    configs = {}
+    for module_name, blueprint in registered_modules.items():
+        try:
+            module = importlib.import_module(f'app.modules.{module_name}')
+        except ImportError:
+            continue
+        module_config = getattr(module, 'MODULE_CONFIG', None) or {}
+        if key in module_config:
+            configs[blueprint.name] = module_config[key]
+    return configs
+
+
+def init_capture_policy(app, registered_modules):
+    """加载并编译采集策略（在所有蓝图注册之后调用）"""
+    capture_policy.load(load_env_rules(), load_module_configs(registered_modules))
+    capture_policy.compile(app)
+    return capture_policy
+
+
+# 全局采集策略
+capture_policy = CapturePolicy(parse_level(config.CAPTURE_DEFAULT))
@@ -0,0 +1,12 @@
+"""命令行工具（export.py、replay.py）共用的参数解析"""
+import time
+
+
+def parse_time(value):
+    """解析时间参数，支持时间戳或 'YYYY-mm-dd HH:MM:SS' 格式"""
+    if value is None:
+        return None
+    try:
+        return str(float(value))
+    except ValueError:
+        return str(time.mktime(time.strptime(value, '%Y-%m-%d %H:%M:%S')))
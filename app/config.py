@@ -0,0 +1,161 @@
+"""应用配置
+
+所有配置项都有默认值，并可以通过同名的 MOCKS_ 前缀环境变量覆盖，
+例如在 docker-compose.yml 的 environment 中设置 MOCKS_LOG_ASYNC=0。
+"""
+import os
+import socket
+import tempfile
+
+
+def env_bool(name, default):
+    """读取布尔型环境变量"""
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    """读取整型环境变量"""
+    value = os.environ.get(name)
+    try:
+        return int(value) if value not in (None, '') else default
+    except ValueError:
+        return default
+
+
+def env_float(name, default):
+    """读取浮点型环境变量"""
+    value = os.environ.get(name)
+    try:
+        return float(value) if value not in (None, '') else default
+    except ValueError:
+        return default
+
+
+def env_map(name, cast=int):
+    """读取 "键=值,键=值" 形式的环境变量为字典，格式不正确的项被忽略"""
+    result = {}
+    for item in (os.environ.get(name) or '').split(','):
+        key, sep, value = item.partition('=')
+        if not sep or not key.strip():
+            continue
+        try:
+            result[key.strip()] = cast(value.strip())
+        except ValueError:
+            continue
+    return result
+
+
+def env_str(name, default):
+    """读取字符串型环境变量"""
+    value = os.environ.get(name)
+    return value if value not in (None, '') else default
+
+
+# 请求日志是否由后台线程批量写入（关闭后在请求线程中同步写入）
+LOG_ASYNC = env_bool('MOCKS_LOG_ASYNC', True)
+# 后台写入队列的最大长度，队列满时丢弃新日志而不是阻塞请求
+LOG_QUEUE_SIZE = env_int('MOCKS_LOG_QUEUE_SIZE', 10000)
+# 每批写入的最大日志条数
+LOG_BATCH_SIZE = env_int('MOCKS_LOG_BATCH_SIZE', 200)
+
+# 请求日志存储后端: sqlite（默认）/ memory（进程内环形缓冲，用于压测）/ shm（worker间共享内存环形缓冲）/ segment（只追加的分段文件）
+STORAGE_BACKEND = env_str('MOCKS_STORAGE', 'sqlite').strip().lower()
+# memory 后端最多保留的日志条数，超出后丢弃最旧的记录
+MEMORY_STORAGE_CAPACITY = env_int('MOCKS_MEMORY_CAPACITY', 100000)
+# segment 后端的分段文件目录和单个分段的最大字节数
+SEGMENT_DIR = env_str('MOCKS_SEGMENT_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'segments'))
+SEGMENT_MAX_BYTES = env_int('MOCKS_SEGMENT_MAX_BYTES', 64 * 1024 * 1024)
+# segment 后端每隔多少条记录写一条稀疏索引
+SEGMENT_INDEX_INTERVAL = env_int('MOCKS_SEGMENT_INDEX_INTERVAL', 64)
+# segment 后端的保留策略（0表示不限制）: 最新记录早于该秒数的分段、以及超出总字节数的最旧分段整体删除
+SEGMENT_RETENTION_SECONDS = env_int('MOCKS_SEGMENT_RETENTION_SECONDS', 0)
+SEGMENT_MAX_TOTAL_BYTES = env_int('MOCKS_SEGMENT_MAX_TOTAL_BYTES', 0)
+# shm 后端的共享内存文件、槽位数和每个槽位的字节数（超出槽位的大字段会被截断）
+SHM_PATH = env_str('MOCKS_SHM_PATH', os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'mocks-ring'))
+SHM_CAPACITY = env_int('MOCKS_SHM_CAPACITY', 5000)
+SHM_SLOT_BYTES = env_int('MOCKS_SHM_SLOT_BYTES', 4096)
+
+# SQLite 使用 WAL 日志模式，查询不会阻塞日志写入
+DB_WAL = env_bool('MOCKS_DB_WAL', True)
+# 写入日志时等待数据库锁的最长时间（毫秒），超时视为写入失败
+LOG_BUSY_TIMEOUT_MS = env_int('MOCKS_LOG_BUSY_TIMEOUT_MS', 100)
+# 单批提交超过该耗时（毫秒）视为数据库变慢
+LOG_SLOW_COMMIT_MS = env_float('MOCKS_LOG_SLOW_COMMIT_MS', 500.0)
+# 连续失败或变慢多少次后熔断，熔断后等待多少秒再尝试写入数据库
+LOG_BREAKER_FAILURES = env_int('MOCKS_LOG_BREAKER_FAILURES', 3)
+LOG_BREAKER_COOLDOWN = env_float('MOCKS_LOG_BREAKER_COOLDOWN', 5.0)
+# 熔断期间日志暂存的溢出文件目录，以及溢出文件的总大小上限（超出后丢弃）
+SPILL_DIR = env_str('MOCKS_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'mocks-spill'))
+SPILL_MAX_BYTES = env_int('MOCKS_SPILL_MAX_BYTES', 256 * 1024 * 1024)
+
+# 准入控制（每个worker进程独立计算，0表示不限制）
+# 全局与按模块的并发请求上限，按模块配置形如 "example=20,*=50"（* 为其他模块的默认值）
+MAX_CONCURRENCY = env_int('MOCKS_MAX_CONCURRENCY', 0)
+MODULE_CONCURRENCY = env_map('MOCKS_MODULE_CONCURRENCY')
+# 令牌桶限流: 每秒请求数与突发容量，按模块配置格式同上
+RATE_LIMIT = env_float('MOCKS_RATE_LIMIT', 0.0)
+RATE_BURST = env_int('MOCKS_RATE_BURST', 0)
+MODULE_RATE_LIMIT = env_map('MOCKS_MODULE_RATE_LIMIT', float)
+# 自动降级阈值（负载压力0-1）: 依次为 不记录请求/响应体、按比例采样日志、直接返回503
+DEGRADE_THRESHOLDS = env_str('MOCKS_DEGRADE_THRESHOLDS', '0.7,0.85,0.97')
+# 采样降级时每多少个请求记录一条日志
+DEGRADE_SAMPLE_EVERY = env_int('MOCKS_DEGRADE_SAMPLE_EVERY', 10)
+
+# 请求日志采集策略（见 app/capture.py）: 默认级别 skip / summary / full，以及JSON格式的全局规则
+CAPTURE_DEFAULT = env_str('MOCKS_CAPTURE_DEFAULT', 'full')
+CAPTURE_RULES = env_str('MOCKS_CAPTURE_RULES', '')
+
+# 按流式元数据记录的请求体类型（逗号分隔，支持 * 通配），以及最多检查（解析、计算摘要）的字节数
+UPLOAD_STREAM_TYPES = [t.strip() for t in env_str('MOCKS_UPLOAD_STREAM_TYPES', 'multipart/*,application/octet-stream').split(',') if t.strip()]
+UPLOAD_CAPTURE_BYTES = env_int('MOCKS_UPLOAD_CAPTURE_BYTES', 16 * 1024 * 1024)
+# 流式响应完整记录响应体的字节数上限，超出时只记录大小和SHA-256
+STREAM_CAPTURE_BYTES = env_int('MOCKS_STREAM_CAPTURE_BYTES', 64 * 1024)
+
+# 响应延迟与带宽整形规则（JSON数组，见 app/shaping.py）
+SHAPING_RULES = env_str('MOCKS_SHAPING_RULES', '')
+# 允许在gunicorn同步worker中启用响应整形（默认拒绝启动，见 app/shaping.py）
+SHAPING_ALLOW_BLOCKING = env_bool('MOCKS_SHAPING_ALLOW_BLOCKING', False)
+
+# ASGI模式（asgi.py）下执行同步视图的线程数
+ASGI_THREADS = env_int('MOCKS_ASGI_THREADS', 32)
+
+# 录制代理（见 app/proxy.py）: 没有模块匹配的路径转发到该上游地址，为空时不启用
+PROXY_UPSTREAM = env_str('MOCKS_PROXY_UPSTREAM', '')
+# 每个worker进程保持的上游 keep-alive 空闲连接数，以及上游请求超时（秒）
+PROXY_POOL_SIZE = env_int('MOCKS_PROXY_POOL_SIZE', 16)
+PROXY_TIMEOUT = env_float('MOCKS_PROXY_TIMEOUT', 30.0)
+# 调用 /.api/recordings/compile（在 app/modules 下生成代码）需要携带的令牌，为空时该接口不可用
+RECORDINGS_TOKEN = env_str('MOCKS_RECORDINGS_TOKEN', '')
+
+# 模块共享状态存储的SQLite数据库（见 app/state.py），与请求日志数据库分开
+STATE_DB_PATH = env_str('MOCKS_STATE_DB_PATH', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'state.db'))
+
+# 日志列表、总数和模块列表查询读取的只读快照（见 app/snapshot.py）: 刷新间隔秒数，为0时直接查询 requests.db
+SNAPSHOT_INTERVAL = env_float('MOCKS_SNAPSHOT_INTERVAL', 0.0)
+# 快照文件路径（默认为日志数据库旁的 .snapshot 文件），以及每个worker在内存中保留的最近日志条数
+SNAPSHOT_PATH = env_str('MOCKS_SNAPSHOT_PATH', '')
+SNAPSHOT_TAIL_SIZE = env_int('MOCKS_SNAPSHOT_TAIL_SIZE', 2000)
+
+# 集中收集（见 app/shipper.py）: 本节点名称写入每条日志的 node 列，默认为主机名
+NODE_NAME = env_str('MOCKS_NODE_NAME', socket.gethostname())
+# 收集端地址（如 http://collector:5000），不为空时把采集到的日志分批压缩发送过去
+COLLECTOR_URL = env_str('MOCKS_COLLECTOR_URL', '')
+# 每批最多条数、凑批最长等待秒数、等待发送的最大条数（超出后丢弃新日志）以及请求超时秒数
+SHIP_BATCH_SIZE = env_int('MOCKS_SHIP_BATCH_SIZE', 500)
+SHIP_FLUSH_INTERVAL = env_float('MOCKS_SHIP_FLUSH_INTERVAL', 1.0)
+SHIP_QUEUE_SIZE = env_int('MOCKS_SHIP_QUEUE_SIZE', 50000)
+SHIP_TIMEOUT = env_float('MOCKS_SHIP_TIMEOUT', 10.0)
+# 一批日志重发的最长秒数，超过后放弃该批
+SHIP_RETRY_TIMEOUT = env_float('MOCKS_SHIP_RETRY_TIMEOUT', 300.0)
+# 作为收集端接收其他节点的日志（POST /.api/ingest），以及发送方需要携带的令牌（收集端必须配置，为空时拒绝接收）
+COLLECTOR_ENABLED = env_bool('MOCKS_COLLECTOR', False)
+COLLECTOR_TOKEN = env_str('MOCKS_COLLECTOR_TOKEN', '')
+
+# 多节点联合查询（见 app/federation.py）: 其他节点的地址（逗号分隔，如 http://mock-a:5000,http://mock-b:5000）
+PEERS = [url.strip() for url in env_str('MOCKS_PEERS', '').split(',') if url.strip()]
+# 等待每个节点响应的最长秒数，超时的节点本次不参与合并；节点模块列表的缓存秒数
+PEER_TIMEOUT = env_float('MOCKS_PEER_TIMEOUT', 2.0)
+PEER_MODULES_TTL = env_float('MOCKS_PEER_MODULES_TTL', 60.0)
@@ -1,11 +1,18 @@
+import bisect
 import sqlite3
 import json
 import os
 import time
 from datetime import datetime
+from . import config
+from .ids import decode_id, encode_id, is_legacy_id
+from .metrics import LATENCY_BUCKETS_MS
 
-# 数据库文件路径
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../requests.db')
+# 数据库文件路径，可通过环境变量 MOCKS_DB_PATH 覆盖
+DB_PATH = os.environ.get('MOCKS_DB_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '../requests.db')
+DB_WAL = config.DB_WAL
+# sqlite3.connect 默认的锁等待时间（毫秒）
+DEFAULT_BUSY_TIMEOUT_MS = 5000
 
 def init_db():
     """初始化数据库，创建表"""
@@ -13,13 +20,22 @@ def init_db():
     try:
         # 使用连接池获取连接
         conn, pool = get_db_connection()
+        if DB_WAL:
+            # WAL模式下读写互不阻塞，需在事务外设置，对数据库文件持久生效
+            conn.execute('PRAGMA journal_mode = WAL')
         cursor = conn.cursor()
+        # 多个worker同时启动时串行执行建表和回填
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'request_logs'")
+        table_exists = cursor.fetchone() is not None
         
         # 创建请求日志表
+        # 新记录使用按时间排序的整型ID作为主键（见 app/ids.py），request_id列只保存旧版本的UUID
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS request_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                request_id TEXT UNIQUE,
+                request_id TEXT,
                 method TEXT,
                 url TEXT,
                 client_ip TEXT,
@@ -36,6 +52,25 @@ def init_db():
             )
         ''')
         
+        if not table_exists:
+            # 部分唯一索引只包含旧格式ID，新记录写入时不需要维护该索引
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_request_logs_request_id
+                ON request_logs (request_id) WHERE request_id IS NOT NULL
+            ''')
+        
+        # 为旧版本创建的表补齐新增列
+        ensure_columns(cursor, 'request_logs', EXTRA_COLUMNS)
+        ensure_columns(cursor, 'request_logs', INGEST_COLUMNS)
+        # 收集端按 (节点, 原始id) 去重；部分索引只包含收到的日志，本节点写入的日志不需要维护该索引
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_request_logs_node_origin
+            ON request_logs (node, origin_id) WHERE origin_id IS NOT NULL
+        ''')
+        
+        # 创建按分钟聚合的统计表，首次创建时从已有日志回填
+        init_rollups(cursor)
+        
         conn.commit()
         # 关闭cursor
         cursor.close()
@@ -47,48 +82,298 @@ def init_db():
         # 释放连接回连接池
         release_db_connection(conn, pool)
 
-def save_request_log(log_data):
-    """保存请求日志到数据库"""
+# 请求日志表的数据列，顺序与serialize_log返回的行一致
+LOG_COLUMNS = [
+    'id', 'request_id', 'method', 'url', 'client_ip', 'request_headers', 'request_args',
+    'request_form', 'request_json', 'status_code', 'response_headers',
+    'response_data', 'process_time', 'timestamp', 'module'
+]
+
+# 阶段耗时列（毫秒），由拦截器记录: 列名 -> 阶段名
+TIMING_COLUMNS = {
+    'before_time': 'before',
+    'view_time': 'view',
+    'capture_time': 'capture',
+    'serialize_time': 'serialize'
+}
+
+# 后续版本新增的列及其类型，init_db时为旧数据库补齐
+EXTRA_COLUMNS = {'route': 'TEXT'}
+EXTRA_COLUMNS.update({name: 'REAL' for name in TIMING_COLUMNS})
+# 上传请求体的元数据（字段名、文件名、大小、摘要），见 app/uploads.py
+EXTRA_COLUMNS['request_body'] = 'TEXT'
+# 条件响应规则的命中信息（规则集、规则名、索引字段、校验条数），见 app/matching.py
+EXTRA_COLUMNS['matched_rule'] = 'TEXT'
+# 产生该日志的节点名称（MOCKS_NODE_NAME），收集端据此区分各节点的日志，见 app/shipper.py
+EXTRA_COLUMNS['node'] = 'TEXT'
+
+# serialize_log返回的行对应的列（旧格式的字符串ID写入request_id列，id由数据库自增分配）
+ROW_COLUMNS = LOG_COLUMNS + ['route'] + list(TIMING_COLUMNS) + ['request_body', 'matched_rule', 'node']
+ROW_INDEX = {name: index for index, name in enumerate(ROW_COLUMNS)}
+
+INSERT_LOG_SQL = 'INSERT INTO request_logs ({}) VALUES ({})'.format(
+    ', '.join(ROW_COLUMNS),
+    ', '.join(['?'] * len(ROW_COLUMNS))
+)
+
+# 只有收集端使用的列: 日志在产生节点上的id（不同节点的id冲突时，收集端为后到的日志分配相邻的新id）
+INGEST_COLUMNS = {'origin_id': 'INTEGER'}
+
+INGEST_LOG_SQL = '''INSERT INTO request_logs ({}, origin_id) VALUES ({}, ?)
+    ON CONFLICT (node, origin_id) WHERE origin_id IS NOT NULL DO NOTHING'''.format(
+    ', '.join(ROW_COLUMNS),
+    ', '.join(['?'] * len(ROW_COLUMNS))
+)
+
+# 为id冲突的日志寻找空闲id时最多尝试的次数
+INGEST_MAX_ID_PROBES = 1024
+
+def ensure_columns(cursor, table, columns):
+    """为已存在的表补齐缺失的列"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+def serialize_log(log_data):
+    """将拦截器产出的日志数据序列化为数据库行
+
+    如果log_data中带有timings字典，序列化本身的耗时会记录到其中的serialize阶段。
+
+    Returns:
+        tuple: 与INSERT_LOG_SQL列顺序一致的参数
+    """
+    start_ns = time.perf_counter_ns()
+    request_id = log_data['request_id']
+    row = (
+        request_id if isinstance(request_id, int) else None,
+        None if isinstance(request_id, int) else request_id,
+        log_data['method'],
+        log_data['url'],
+        log_data.get('client_ip', None),
+        json.dumps(log_data['request_headers'], ensure_ascii=False),
+        json.dumps(log_data['request_args'], ensure_ascii=False),
+        json.dumps(log_data['request_form'], ensure_ascii=False),
+        json.dumps(log_data['request_json'], ensure_ascii=False) if log_data['request_json'] else None,
+        log_data['status_code'],
+        json.dumps(log_data['response_headers'], ensure_ascii=False),
+        json.dumps(log_data['response_data'], ensure_ascii=False) if log_data['response_data'] else None,
+        log_data['process_time'],
+        log_data['timestamp'],
+        log_data.get('module', None),
+        log_data.get('route', None)
+    )
+    
+    request_body = log_data.get('request_body')
+    matched_rule = log_data.get('matched_rule')
+    extra = (
+        json.dumps(request_body, ensure_ascii=False) if request_body else None,
+        json.dumps(matched_rule, ensure_ascii=False) if matched_rule else None,
+        config.NODE_NAME
+    )
+
+    timings = log_data.get('timings')
+    if timings is None:
+        return row + (None,) * len(TIMING_COLUMNS) + extra
+    timings['serialize'] = time.perf_counter_ns() - start_ns
+    return row + tuple(
+        round(timings[phase] / 1e6, 3) if timings.get(phase) is not None else None
+        for phase in TIMING_COLUMNS.values()
+    ) + extra
+
+def save_log_rows(rows, busy_timeout_ms=None):
+    """在一个事务中批量写入已序列化的日志行
+
+    Args:
+        rows: serialize_log 返回的行
+        busy_timeout_ms: 等待数据库锁的最长时间，未指定时使用连接的默认值
+
+    Returns:
+        bool: 写入成功返回True
+    """
     conn = None
+    pool = None
     try:
         # 使用连接池获取连接
         conn, pool = get_db_connection()
+        if busy_timeout_ms is not None:
+            conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO request_logs (
-                request_id, method, url, client_ip, request_headers, request_args, 
-                request_form, request_json, status_code, response_headers, 
-                response_data, process_time, timestamp, module
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            log_data['request_id'],
-            log_data['method'],
-            log_data['url'],
-            log_data.get('client_ip', None),
-            json.dumps(log_data['request_headers'], ensure_ascii=False),
-            json.dumps(log_data['request_args'], ensure_ascii=False),
-            json.dumps(log_data['request_form'], ensure_ascii=False),
-            json.dumps(log_data['request_json'], ensure_ascii=False) if log_data['request_json'] else None,
-            log_data['status_code'],
-            json.dumps(log_data['response_headers'], ensure_ascii=False),
-            json.dumps(log_data['response_data'], ensure_ascii=False) if log_data['response_data'] else None,
-            log_data['process_time'],
-            log_data['timestamp'],
-            log_data.get('module', None)
-        ))
-        
+        cursor.executemany(INSERT_LOG_SQL, rows)
+        # 在同一事务中增量更新分钟统计
+        update_rollups(cursor, rows)
         conn.commit()
         # 关闭cursor
         cursor.close()
+        return True
     except Exception as e:
         print(f"保存请求日志时出错: {e}")
         if conn:
             conn.rollback()
+        return False
     finally:
+        if conn and busy_timeout_ms is not None:
+            # 连接回到连接池后供查询使用，恢复默认的锁等待时间
+            try:
+                conn.execute(f'PRAGMA busy_timeout = {DEFAULT_BUSY_TIMEOUT_MS}')
+            except Exception:
+                pass
         # 释放连接回连接池
         release_db_connection(conn, pool)
 
+def ingest_log_rows(rows, busy_timeout_ms=None):
+    """批量写入从其他节点收到的日志行，跳过 (节点, 原始id) 已存在的行
+
+    发送方在超时后会重发同一批日志，按 (节点, 原始id) 的唯一索引去重，重发不会产生重复记录和重复统计。
+    不同节点的id相同（节点ID配置冲突）时两条日志都会保留，后写入的一条使用相邻的空闲id。
+
+    Returns:
+        list: 新写入的日志行（id为收集端实际使用的id），失败时返回None
+    """
+    conn = None
+    pool = None
+    try:
+        conn, pool = get_db_connection()
+        if busy_timeout_ms is not None:
+            conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        inserted = []
+        for row in rows:
+            origin_id = row[0]
+            for probe in range(INGEST_MAX_ID_PROBES):
+                try:
+                    cursor.execute(INGEST_LOG_SQL, tuple(row) + (origin_id,))
+                except sqlite3.IntegrityError:
+                    # 主键已被其他节点的日志占用
+                    row = (origin_id + probe + 1,) + tuple(row[1:])
+                    continue
+                if cursor.rowcount:
+                    inserted.append(row)
+                break
+            else:
+                raise RuntimeError(f"没有可用的id: {origin_id}")
+        update_rollups(cursor, inserted)
+        conn.commit()
+        cursor.close()
+        return inserted
+    except Exception as e:
+        print(f"写入收集的请求日志时出错: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn and busy_timeout_ms is not None:
+            try:
+                conn.execute(f'PRAGMA busy_timeout = {DEFAULT_BUSY_TIMEOUT_MS}')
+            except Exception:
+                pass
+        release_db_connection(conn, pool)
+
+# 分钟统计表的延迟桶列，与运行指标使用相同的桶边界（最后一列为 +Inf 桶）
+ROLLUP_BUCKET_COLUMNS = [f'b{i}' for i in range(len(LATENCY_BUCKETS_MS) + 1)]
+
+# 视为错误的最小响应码
+ERROR_STATUS_CODE = 400
+
+ROLLUP_UPSERT_SQL = '''
+    INSERT INTO request_rollups (minute, module, route, status_code, count, error_count, total_time, max_time, {columns})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, {placeholders})
+    ON CONFLICT (minute, module, route, status_code) DO UPDATE SET
+        count = count + excluded.count,
+        error_count = error_count + excluded.error_count,
+        total_time = total_time + excluded.total_time,
+        max_time = MAX(max_time, excluded.max_time),
+        {updates}
+'''.format(
+    columns=', '.join(ROLLUP_BUCKET_COLUMNS),
+    placeholders=', '.join(['?'] * len(ROLLUP_BUCKET_COLUMNS)),
+    updates=', '.join(f'{c} = {c} + excluded.{c}' for c in ROLLUP_BUCKET_COLUMNS)
+)
+
+def init_rollups(cursor):
+    """创建分钟统计表；表是新建的时候用一条聚合SQL从已有日志回填"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'request_rollups'")
+    exists = cursor.fetchone() is not None
+    
+    bucket_defs = ', '.join(f'{c} INTEGER NOT NULL DEFAULT 0' for c in ROLLUP_BUCKET_COLUMNS)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS request_rollups (
+            minute INTEGER NOT NULL,
+            module TEXT NOT NULL,
+            route TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            total_time REAL NOT NULL DEFAULT 0,
+            max_time REAL NOT NULL DEFAULT 0,
+            {bucket_defs},
+            PRIMARY KEY (minute, module, route, status_code)
+        ) WITHOUT ROWID
+    ''')
+    if exists:
+        return
+    
+    # 计算每条日志所在延迟桶的序号，与 bisect_left(LATENCY_BUCKETS_MS, process_time) 一致
+    bucket_index = 'CASE ' + ' '.join(
+        f'WHEN process_time <= {bound} THEN {i}' for i, bound in enumerate(LATENCY_BUCKETS_MS)
+    ) + f' ELSE {len(LATENCY_BUCKETS_MS)} END'
+    bucket_sums = ', '.join(
+        f'SUM(CASE WHEN {bucket_index} = {i} THEN 1 ELSE 0 END)' for i in range(len(ROLLUP_BUCKET_COLUMNS))
+    )
+    cursor.execute(f'''
+        INSERT INTO request_rollups (minute, module, route, status_code, count, error_count, total_time, max_time, {', '.join(ROLLUP_BUCKET_COLUMNS)})
+        SELECT CAST(CAST(timestamp AS REAL) / 60 AS INTEGER) * 60,
+               COALESCE(module, ''), COALESCE(route, url, ''), COALESCE(status_code, 0),
+               COUNT(*), SUM(CASE WHEN status_code >= {ERROR_STATUS_CODE} THEN 1 ELSE 0 END),
+               SUM(COALESCE(process_time, 0)), MAX(COALESCE(process_time, 0)),
+               {bucket_sums}
+        FROM request_logs
+        WHERE process_time IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ''')
+
+def update_rollups(cursor, rows):
+    """将一批日志行聚合后增量写入分钟统计表"""
+    url_index = ROW_INDEX['url']
+    route_index = ROW_INDEX['route']
+    status_index = ROW_INDEX['status_code']
+    time_index = ROW_INDEX['process_time']
+    timestamp_index = ROW_INDEX['timestamp']
+    module_index = ROW_INDEX['module']
+    bucket_count = len(ROLLUP_BUCKET_COLUMNS)
+    
+    groups = {}
+    for row in rows:
+        process_time = row[time_index]
+        if process_time is None:
+            continue
+        try:
+            minute = int(float(row[timestamp_index]) // 60 * 60)
+        except (TypeError, ValueError):
+            continue
+        status_code = row[status_index] or 0
+        key = (minute, row[module_index] or '', row[route_index] or row[url_index] or '', status_code)
+        
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0, 0.0, 0.0] + [0] * bucket_count
+        group[0] += 1
+        if status_code >= ERROR_STATUS_CODE:
+            group[1] += 1
+        group[2] += process_time
+        if process_time > group[3]:
+            group[3] = process_time
+        group[4 + bisect.bisect_left(LATENCY_BUCKETS_MS, process_time)] += 1
+    
+    if groups:
+        cursor.executemany(ROLLUP_UPSERT_SQL, [key + tuple(values) for key, values in groups.items()])
+
+def save_request_log(log_data):
+    """保存请求日志到数据库"""
+    return save_log_rows([serialize_log(log_data)])
+
 # 创建数据库连接池
 import sqlite3
 import threading
@@ -150,41 +435,57 @@ def release_db_connection(conn, pool):
         except Exception:
             pass
 
-def get_requests_count(start_time=None, end_time=None, modules=None, status_code=None):
-    """获取符合条件的请求日志总数"""
-    conn = None
+def build_filter_conditions(start_time=None, end_time=None, modules=None, status_code=None):
+    """根据筛选条件构建WHERE子句片段
+
+    Returns:
+        tuple: (以 AND 开头的条件字符串, 参数列表)
+    """
+    query = ''
+    params = []
+    
+    # 添加时间范围筛选
+    if start_time:
+        query += ' AND timestamp >= ?'
+        params.append(start_time)
+    if end_time:
+        query += ' AND timestamp <= ?'
+        params.append(end_time)
+    
+    # 添加模块筛选
+    if modules:
+        if isinstance(modules, list):
+            # 处理多个模块参数
+            if len(modules) > 0:
+                placeholders = ', '.join(['?' for _ in modules])
+                query += f' AND module IN ({placeholders})'
+                params.extend(modules)
+        elif modules:  # 兼容单个模块参数
+            query += ' AND module LIKE ?'
+            params.append(f'%{modules}%')
+    
+    # 添加响应码筛选
+    if status_code:
+        query += ' AND status_code = ?'
+        params.append(status_code)
+    
+    return query, params
+
+def get_requests_count(start_time=None, end_time=None, modules=None, status_code=None, conn=None):
+    """获取符合条件的请求日志总数
+
+    conn 不为空时在该连接（如只读快照，见 app/snapshot.py）上查询，不占用连接池
+    """
+    pool = None
+    own_conn = conn is None
     try:
-        conn, pool = get_db_connection()
+        if own_conn:
+            conn, pool = get_db_connection()
         cursor = conn.cursor()
         
         # 构建查询语句和参数
-        query = 'SELECT COUNT(*) FROM request_logs WHERE 1=1'
-        params = []
-        
-        # 添加时间范围筛选
-        if start_time:
-            query += ' AND timestamp >= ?'
-            params.append(start_time)
-        if end_time:
-            query += ' AND timestamp <= ?'
-            params.append(end_time)
-        
-        # 添加模块筛选
-        if modules:
-            if isinstance(modules, list):
-                # 处理多个模块参数
-                if len(modules) > 0:
-                    placeholders = ', '.join(['?' for _ in modules])
-                    query += f' AND module IN ({placeholders})'
-                    params.extend(modules)
-            elif modules:  # 兼容单个模块参数
-                query += ' AND module LIKE ?'
-                params.append(f'%{modules}%')
-        
-        # 添加响应码筛选
-        if status_code:
-            query += ' AND status_code = ?'
-            params.append(status_code)
+        conditions, params = build_filter_conditions(start_time, end_time, modules, status_code)
+        query = 'SELECT COUNT(*) FROM request_logs WHERE 1=1' + conditions
         
         cursor.execute(query, params)
         count = cursor.fetchone()[0]
@@ -197,51 +498,38 @@ def get_requests_count(start_time=None, end_time=None, modules=None, status_code
         return 0
     finally:
         # 释放连接
-        release_db_connection(conn, pool)
+        if own_conn:
+            release_db_connection(conn, pool)
         
 
-def get_all_requests(pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
-    """获取请求日志，可以根据条件筛选"""
-    conn = None
+def get_all_requests(pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None,
+                     conn=None, offset=None, before_id=None):
+    """获取请求日志，可以根据条件筛选
+
+    conn 不为空时在该连接上查询；offset 不为空时代替按页码计算的偏移量；
+    before_id 不为空时只查询id小于它的记录（按id翻页，见 LogStorage.list_before）
+    """
+    pool = None
+    own_conn = conn is None
     try:
-        conn, pool = get_db_connection()
+        if own_conn:
+            conn, pool = get_db_connection()
         cursor = conn.cursor()
         
         # 构建查询语句和参数
-        query = 'SELECT * FROM request_logs WHERE 1=1'
-        params = []
-        
-        # 添加时间范围筛选
-        if start_time:
-            query += ' AND timestamp >= ?'
-            params.append(start_time)
-        if end_time:
-            query += ' AND timestamp <= ?'
-            params.append(end_time)
-        
-        # 添加模块筛选
-        if modules:
-            if isinstance(modules, list):
-                # 处理多个模块参数
-                if len(modules) > 0:
-                    placeholders = ', '.join(['?' for _ in modules])
-                    query += f' AND module IN ({placeholders})'
-                    params.extend(modules)
-            elif modules:  # 兼容单个模块参数
-                query += ' AND module LIKE ?'
-                params.append(f'%{modules}%')
-        
-        # 添加响应码筛选
-        if status_code:
-            query += ' AND status_code = ?'
-            params.append(status_code)
+        conditions, params = build_filter_conditions(start_time, end_time, modules, status_code)
+        query = 'SELECT * FROM request_logs WHERE 1=1' + conditions
+        if before_id is not None:
+            query += ' AND id < ?'
+            params.append(before_id)
         
         # 添加排序
         query += ' ORDER BY id DESC'
         
         # 添加分页
         if pagesize and current:
-            offset = (current - 1) * pagesize
+            if offset is None:
+                offset = (current - 1) * pagesize
             query += ' LIMIT ? OFFSET ?'
             params.extend([pagesize, offset])
         
@@ -254,20 +542,8 @@ def get_all_requests(pagesize=None, current=None, start_time=None, end_time=None
         # 将结果转换为字典列表
         results = []
         for row in rows:
-            row_dict = dict(zip(column_names, row))
-            # 对于列表查询，我们可以保持JSON字符串形式，减少解析开销
-            # 只在详情页需要时才解析完整的JSON数据
-            
-            # 只解析必要的字段
-            try:
-                # 这些字段在列表展示中可能会用到
-                row_dict['request_headers'] = json.loads(row_dict['request_headers']) if row_dict['request_headers'] else {}
-                row_dict['response_headers'] = json.loads(row_dict['response_headers']) if row_dict['response_headers'] else {}
-            except Exception as e:
-                print(f"解析 JSON 数据时出错: {e}")
-            
-            # 其他字段保持原样，减少不必要的解析
-            results.append(row_dict)
+            # 对于列表查询只解析必要的字段，其他字段保持JSON字符串形式
+            results.append(parse_list_row(dict(zip(column_names, row))))
         
         # 关闭cursor
         cursor.close()
@@ -277,9 +553,47 @@ def get_all_requests(pagesize=None, current=None, start_time=None, end_time=None
         return []
     finally:
         # 释放连接
-        release_db_connection(conn, pool)
+        if own_conn:
+            release_db_connection(conn, pool)
         
 
+def normalize_request_id(row_dict):
+    """为新格式记录填充对外展示的request_id（整型主键的Base32编码）"""
+    if not row_dict.get('request_id') and row_dict.get('id') is not None:
+        row_dict['request_id'] = encode_id(row_dict['id'])
+    return row_dict
+
+def parse_list_row(row_dict):
+    """解析列表展示需要的JSON字段（原地修改并返回）
+
+    对于列表查询，我们可以保持JSON字符串形式，减少解析开销，
+    只在详情页需要时才解析完整的JSON数据
+    """
+    normalize_request_id(row_dict)
+    try:
+        # 这些字段在列表展示中可能会用到
+        row_dict['request_headers'] = json.loads(row_dict['request_headers']) if row_dict['request_headers'] else {}
+        row_dict['response_headers'] = json.loads(row_dict['response_headers']) if row_dict['response_headers'] else {}
+    except Exception as e:
+        print(f"解析 JSON 数据时出错: {e}")
+    return row_dict
+
+def parse_log_row(row_dict):
+    """完整解析日志行中的所有JSON字段（原地修改并返回）"""
+    normalize_request_id(row_dict)
+    try:
+        row_dict['request_headers'] = json.loads(row_dict['request_headers']) if row_dict['request_headers'] else {}
+        row_dict['request_args'] = json.loads(row_dict['request_args']) if row_dict['request_args'] else {}
+        row_dict['request_form'] = json.loads(row_dict['request_form']) if row_dict['request_form'] else {}
+        row_dict['request_json'] = json.loads(row_dict['request_json']) if row_dict['request_json'] else None
+        row_dict['request_body'] = json.loads(row_dict['request_body']) if row_dict.get('request_body') else None
+        row_dict['matched_rule'] = json.loads(row_dict['matched_rule']) if row_dict.get('matched_rule') else None
+        row_dict['response_headers'] = json.loads(row_dict['response_headers']) if row_dict['response_headers'] else {}
+        row_dict['response_data'] = json.loads(row_dict['response_data']) if row_dict['response_data'] else None
+    except Exception as e:
+        print(f"解析 JSON 数据时出错: {e}")
+    return row_dict
+
 def get_request_by_id(request_id):
     """根据请求ID获取特定请求日志"""
     conn = None
@@ -287,8 +601,15 @@ def get_request_by_id(request_id):
         conn, pool = get_db_connection()
         cursor = conn.cursor()
         
-        # 执行查询
-        cursor.execute('SELECT * FROM request_logs WHERE request_id = ?', (request_id,))
+        # 执行查询：旧版本的UUID按request_id列查找，新格式ID按主键查找
+        if is_legacy_id(request_id):
+            cursor.execute('SELECT * FROM request_logs WHERE request_id = ?', (request_id,))
+        else:
+            row_id = decode_id(request_id)
+            if row_id is None:
+                cursor.close()
+                return None
+            cursor.execute('SELECT * FROM request_logs WHERE id = ?', (row_id,))
         row = cursor.fetchone()
         
         # 如果没有找到记录，直接返回None
@@ -301,16 +622,7 @@ def get_request_by_id(request_id):
         row_dict = dict(zip(column_names, row))
         
         # 解析所有JSON字段
-        try:
-            # 对于详情页，我们需要完整解析所有字段
-            row_dict['request_headers'] = json.loads(row_dict['request_headers']) if row_dict['request_headers'] else {}
-            row_dict['request_args'] = json.loads(row_dict['request_args']) if row_dict['request_args'] else {}
-            row_dict['request_form'] = json.loads(row_dict['request_form']) if row_dict['request_form'] else {}
-            row_dict['request_json'] = json.loads(row_dict['request_json']) if row_dict['request_json'] else None
-            row_dict['response_headers'] = json.loads(row_dict['response_headers']) if row_dict['response_headers'] else {}
-            row_dict['response_data'] = json.loads(row_dict['response_data']) if row_dict['response_data'] else None
-        except Exception as e:
-            print(f"解析 JSON 数据时出错: {e}")
+        parse_log_row(row_dict)
         
         # 关闭cursor
         cursor.close()
@@ -323,11 +635,13 @@ def get_request_by_id(request_id):
         release_db_connection(conn, pool)
         
 
-def get_all_modules():
-    """获取所有可用的模块列表"""
-    conn = None
+def get_all_modules(conn=None):
+    """获取所有可用的模块列表（conn 不为空时在该连接上查询）"""
+    pool = None
+    own_conn = conn is None
     try:
-        conn, pool = get_db_connection()
+        if own_conn:
+            conn, pool = get_db_connection()
         cursor = conn.cursor()
         
         # 查询所有不重复的模块名称，排除NULL值
@@ -345,4 +659,79 @@ def get_all_modules():
         return []
     finally:
         # 释放连接
-        release_db_connection(conn, pool)
\ No newline at end of file
+        if own_conn:
+            release_db_connection(conn, pool)
+
+def iter_requests(start_time=None, end_time=None, modules=None, status_code=None, batch_size=500):
+    """按id升序流式遍历符合条件的请求日志
+
+    使用基于id的键集分页（每批一次短查询）代替一次性fetchall，
+    内存占用只与batch_size相关；每批之间释放连接，不会长时间持有读锁阻塞日志写入。
+
+    Yields:
+        dict: 已完整解析JSON字段的日志记录
+    """
+    conditions, filter_params = build_filter_conditions(start_time, end_time, modules, status_code)
+    query = 'SELECT * FROM request_logs WHERE id > ?' + conditions + ' ORDER BY id ASC LIMIT ?'
+    last_id = 0
+    
+    while True:
+        conn = None
+        pool = None
+        try:
+            conn, pool = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute(query, [last_id] + filter_params + [batch_size])
+            rows = cursor.fetchall()
+            column_names = [description[0] for description in cursor.description]
+            cursor.close()
+        except Exception as e:
+            print(f"遍历请求日志时出错: {e}")
+            return
+        finally:
+            release_db_connection(conn, pool)
+        
+        for row in rows:
+            yield parse_log_row(dict(zip(column_names, row)))
+        
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+def delete_requests(start_time=None, end_time=None):
+    """删除时间范围内的请求日志，以及完全落在范围内的分钟统计
+
+    Returns:
+        int: 删除的日志条数
+    """
+    conn = None
+    pool = None
+    try:
+        conn, pool = get_db_connection()
+        cursor = conn.cursor()
+        
+        conditions, params = build_filter_conditions(start_time, end_time)
+        cursor.execute('DELETE FROM request_logs WHERE 1=1' + conditions, params)
+        deleted = cursor.rowcount
+        
+        # 只删除整分钟都在范围内的统计，部分覆盖的分钟保留
+        rollup_query = 'DELETE FROM request_rollups WHERE 1=1'
+        rollup_params = []
+        if start_time:
+            rollup_query += ' AND minute >= ?'
+            rollup_params.append(float(start_time))
+        if end_time:
+            rollup_query += ' AND minute + 60 <= ?'
+            rollup_params.append(float(end_time))
+        cursor.execute(rollup_query, rollup_params)
+        
+        conn.commit()
+        cursor.close()
+        return deleted
+    except Exception as e:
+        print(f"删除请求日志时出错: {e}")
+        if conn:
+            conn.rollback()
+        return 0
+    finally:
+        release_db_connection(conn, pool)
@@ -0,0 +1,209 @@
+"""请求日志导出模块
+
+将请求日志按 NDJSON、CSV 或 HAR 格式流式导出。
+所有导出函数都是生成器，逐条消费日志记录并产出文本片段，
+配合 gzip_chunks 可以在恒定内存下生成压缩数据流。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+# CSV导出的列顺序
+CSV_COLUMNS = [
+    'id', 'request_id', 'method', 'url', 'client_ip', 'request_headers',
+    'request_args', 'request_form', 'request_json', 'status_code',
+    'response_headers', 'response_data', 'process_time', 'timestamp', 'module',
+    'request_body', 'matched_rule', 'node'
+]
+
+# 每次向调用方产出数据前累积的记录条数，减少小块写入的开销
+FLUSH_EVERY = 100
+
+
+def export_ndjson(records):
+    """以 NDJSON 格式导出，每行一条 JSON 记录"""
+    buffer = []
+    for record in records:
+        buffer.append(json.dumps(record, ensure_ascii=False))
+        if len(buffer) >= FLUSH_EVERY:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def export_csv(records):
+    """以 CSV 格式导出，嵌套字段序列化为 JSON 字符串"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+
+    count = 0
+    for record in records:
+        row = []
+        for column in CSV_COLUMNS:
+            value = record.get(column)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False)
+            row.append('' if value is None else value)
+        writer.writerow(row)
+        count += 1
+
+        if count % FLUSH_EVERY == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+
+    remaining = output.getvalue()
+    if remaining:
+        yield remaining
+
+
+def _har_headers(headers):
+    """将字典形式的头信息转换为 HAR 的 name/value 列表"""
+    return [{'name': name, 'value': str(value)} for name, value in (headers or {}).items()]
+
+
+def _har_body_text(data):
+    """将记录中的请求/响应体转换为 HAR 文本"""
+    if data is None:
+        return ''
+    if isinstance(data, str):
+        return data
+    return json.dumps(data, ensure_ascii=False)
+
+
+def to_har_entry(record):
+    """将单条日志记录转换为 HAR entry"""
+    request_headers = record.get('request_headers') or {}
+    response_headers = record.get('response_headers') or {}
+    request_args = record.get('request_args') or {}
+
+    # 日志中只保存了path，使用Host头还原完整URL
+    host = request_headers.get('Host', 'localhost')
+    url = f"http://{host}{record.get('url') or ''}"
+    if request_args:
+        url += '?' + urlencode(request_args)
+
+    try:
+        started = datetime.fromtimestamp(float(record.get('timestamp')), tz=timezone.utc)
+    except (TypeError, ValueError):
+        started = datetime.now(timezone.utc)
+
+    status_code = record.get('status_code') or 0
+    try:
+        status_text = HTTPStatus(status_code).phrase
+    except ValueError:
+        status_text = ''
+
+    request_entry = {
+        'method': record.get('method'),
+        'url': url,
+        'httpVersion': 'HTTP/1.1',
+        'cookies': [],
+        'headers': _har_headers(request_headers),
+        'queryString': [{'name': k, 'value': str(v)} for k, v in request_args.items()],
+        'headersSize': -1,
+        'bodySize': -1
+    }
+    if record.get('request_json') is not None:
+        request_entry['postData'] = {
+            'mimeType': 'application/json',
+            'text': _har_body_text(record.get('request_json'))
+        }
+    elif record.get('request_form'):
+        request_entry['postData'] = {
+            'mimeType': request_headers.get('Content-Type', 'application/x-www-form-urlencoded'),
+            'params': [{'name': k, 'value': str(v)} for k, v in record['request_form'].items()]
+        }
+    elif record.get('request_body'):
+        # 上传请求只记录了元数据: 普通字段保留值，文件只有文件名和类型
+        body = record['request_body']
+        request_entry['postData'] = {
+            'mimeType': body.get('content_type') or '',
+            'params': [{'name': k, 'value': str(v)} for k, v in (body.get('fields') or {}).items()] + [
+                {'name': f.get('field'), 'fileName': f.get('filename'), 'contentType': f.get('content_type')}
+                for f in body.get('files') or []
+            ],
+            'comment': json.dumps({k: v for k, v in body.items() if k in ('size', 'sha256', 'complete')})
+        }
+        request_entry['bodySize'] = body.get('size', -1)
+
+    content_text = _har_body_text(record.get('response_data'))
+    process_time = record.get('process_time') or 0
+
+    return {
+        'startedDateTime': started.isoformat(),
+        'time': process_time,
+        'request': request_entry,
+        'response': {
+            'status': status_code,
+            'statusText': status_text,
+            'httpVersion': 'HTTP/1.1',
+            'cookies': [],
+            'headers': _har_headers(response_headers),
+            'content': {
+                'size': len(content_text.encode('utf-8')),
+                'mimeType': response_headers.get('Content-Type', ''),
+                'text': content_text
+            },
+            'redirectURL': response_headers.get('Location', ''),
+            'headersSize': -1,
+            'bodySize': -1
+        },
+        'cache': {},
+        'timings': {'send': 0, 'wait': process_time, 'receive': 0},
+        '_requestId': record.get('request_id'),
+        '_module': record.get('module'),
+        '_matchedRule': record.get('matched_rule'),
+        '_node': record.get('node')
+    }
+
+
+def export_har(records):
+    """以 HAR 1.2 格式导出，entries 数组逐条流式写出"""
+    yield '{"log": {"version": "1.2", "creator": {"name": "mocks", "version": "1.0.0"}, "entries": ['
+    first = True
+    buffer = []
+    for record in records:
+        entry = json.dumps(to_har_entry(record), ensure_ascii=False)
+        buffer.append(entry if first else ',' + entry)
+        first = False
+        if len(buffer) >= FLUSH_EVERY:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+    yield ']}}\n'
+
+
+# 导出格式注册表: 格式名 -> (导出函数, MIME类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'har': (export_har, 'application/json', 'har')
+}
+
+
+def export_records(records, fmt):
+    """按指定格式导出日志记录，返回产出 UTF-8 字节的生成器"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    exporter = EXPORT_FORMATS[fmt][0]
+    for chunk in exporter(records):
+        yield chunk.encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """将字节块流式压缩为 gzip 格式"""
+    # wbits=31 表示输出带 gzip 头和尾的数据
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,250 @@
+"""多节点联合查询
+
+集中收集（见 app/shipper.py）之外的另一种方式: 数据留在各节点，查询时由当前节点分发。
+配置 MOCKS_PEERS 后，/.api/requests、/.api/modules 和 /.api/requests/<id> 带 federated=1 参数时
+同时查询本节点和所有节点，合并后返回:
+
+- 日志列表按 (id, 节点) 翻页（before/before_node 参数为上一页最后一条记录的request_id和节点）。
+  id的高位是毫秒时间戳，按id倒序即按时间倒序，id相同时按节点名称倒序；每个节点返回排在游标之后的前size条，
+  合并后取前size条，下一页从最后一条继续，翻页期间写入的新日志不会造成重复或遗漏。
+  游标带上节点，不同节点的相同id（未配置 MOCKS_NODE_ID 或旧版本的id）不会在翻页时被跳过。
+  同一节点的同一id（如收集端保存的其他节点日志）只保留一条，不同节点的id即使相同也都保留。
+- 总数为各节点总数之和，但不计入收集端（MOCKS_COLLECTOR=1）的总数: 收集端的日志是其他节点日志的副本，
+  计入会重复统计；只有收集端响应时使用收集端的总数。收集端自身产生的日志和未配置为peer的节点发给收集端的日志
+  不计入，总数可能小于实际条数。
+- 模块列表按节点缓存 MOCKS_PEER_MODULES_TTL 秒，节点不可用时使用上次的结果。
+- 详情先查本节点，未找到时同时询问所有节点，返回第一个找到的结果。
+- 所有节点并发请求（每个节点一个 keep-alive 连接池），最多等待 MOCKS_PEER_TIMEOUT 秒，
+  超时或出错的节点本次不参与合并，结果中的 peers 列出每个节点的状态和耗时。
+
+发给其他节点的请求不带 federated 参数，节点之间互相配置为peer也不会循环分发。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote, urlencode
+
+from . import config
+from .ids import compose_id, decode_id, is_legacy_id
+from .metrics import registry
+from .proxy import UpstreamPool
+from .storage import get_storage
+
+LOCAL = 'local'
+
+
+class Peer:
+    """一个远程节点"""
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip('/')
+        self.pool = UpstreamPool(self.url, 4, timeout)
+        # 模块列表缓存: (过期时间, 模块列表)
+        self.modules_cache = None
+
+    def get(self, path, params=None):
+        """请求节点的API，返回 data 字段；节点返回404时返回None"""
+        if params:
+            path += '?' + urlencode(params, doseq=True)
+        status, _, data = self.pool.request('GET', path, [('Accept', 'application/json')])
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            raise RuntimeError(f'HTTP {status}: 响应不是JSON')
+        if status == 404 and payload.get('errCode') == 404:
+            return None
+        if status >= 400 or payload.get('errCode') != 0:
+            raise RuntimeError(payload.get('errMsg') or f'HTTP {status}')
+        return payload.get('data')
+
+
+def _sort_key(record):
+    """合并排序键: id（毫秒时间戳在高位），旧格式记录的自增id与时间无关，按时间戳换算"""
+    if not is_legacy_id(record.get('request_id') or '') and isinstance(record.get('id'), int):
+        return record['id']
+    try:
+        return compose_id(int(float(record.get('timestamp')) * 1000), 0, 0, 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _node_key(record):
+    """合并排序键: (id, 节点)"""
+    return _sort_key(record), record.get('node') or ''
+
+
+def list_page(storage, before_id, before_node, size, start_time=None, end_time=None, modules=None, status_code=None):
+    """本节点按 (id, 节点) 倒序排在游标之后的最多size条记录，没有节点名称的记录使用本节点名称
+
+    before_node 为空时只返回id小于before_id的记录；不为空时还包括id等于before_id、节点名称小于before_node的记录。
+    """
+    if before_id is None or not before_node:
+        logs = storage.list_before(before_id, size, start_time, end_time, modules, status_code)
+        for record in logs:
+            record['node'] = record.get('node') or config.NODE_NAME
+        return sorted(logs, key=_node_key, reverse=True)
+    fetch = size
+    while True:
+        # 多取出id等于游标的记录，过滤掉排在游标之前的节点后不够size条时继续多取
+        logs = storage.list_before(before_id + 1, fetch, start_time, end_time, modules, status_code)
+        for record in logs:
+            record['node'] = record.get('node') or config.NODE_NAME
+        kept = [record for record in logs if record.get('id') != before_id or record['node'] < before_node]
+        if len(kept) >= size or len(logs) < fetch:
+            return sorted(kept, key=_node_key, reverse=True)[:size]
+        fetch += size - len(kept)
+
+
+class Federation:
+    """把查询分发到本节点和所有peer并合并结果"""
+
+    def __init__(self, peers=None, timeout=None, modules_ttl=None):
+        self.timeout = config.PEER_TIMEOUT if timeout is None else timeout
+        self.modules_ttl = config.PEER_MODULES_TTL if modules_ttl is None else modules_ttl
+        self.peers = [Peer(url, self.timeout) for url in (config.PEERS if peers is None else peers)]
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return bool(self.peers)
+
+    def _ensure_executor(self):
+        """当前进程的线程池（fork出的worker不能使用父进程的线程）"""
+        if self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._pid != os.getpid():
+                # 超时的请求仍占用线程直到套接字超时，预留足够的线程避免后续查询排队
+                self._executor = ThreadPoolExecutor(max_workers=4 * (len(self.peers) + 1),
+                                                    thread_name_prefix='federation')
+                self._pid = os.getpid()
+        return self._executor
+
+    def gather(self, calls):
+        """并发执行 {节点名: 函数}，最多等待 timeout 秒
+
+        Returns:
+            tuple: ({节点名: 返回值}，每个节点状态的列表)
+        """
+        executor = self._ensure_executor()
+
+        def timed(fn):
+            start = time.perf_counter()
+            return fn(), (time.perf_counter() - start) * 1000
+
+        futures = {executor.submit(timed, fn): name for name, fn in calls.items()}
+        done, _ = wait(futures, timeout=self.timeout)
+        results = {}
+        statuses = []
+        for future, name in futures.items():
+            status = {'peer': name, 'ok': False, 'elapsed_ms': None, 'error': None}
+            if future not in done:
+                future.cancel()
+                status['error'] = f'超过 {self.timeout} 秒未响应'
+                outcome = 'timeout'
+            elif future.exception() is not None:
+                status['error'] = str(future.exception())
+                outcome = 'error'
+            else:
+                results[name], elapsed_ms = future.result()
+                status.update(ok=True, elapsed_ms=round(elapsed_ms, 3))
+                outcome = 'ok'
+            if name != LOCAL:
+                registry.inc('mocks_peer_requests_total', {'outcome': outcome})
+                if outcome == 'ok':
+                    registry.observe('mocks_peer_request_ms', None, status['elapsed_ms'])
+            statuses.append(status)
+        return results, statuses
+
+    def list_requests(self, size, before=None, start_time=None, end_time=None, modules=None, status_code=None,
+                      before_node=None):
+        """各节点排在游标 (before, before_node) 之后的前size条日志，合并后按 (id, 节点) 倒序取前size条"""
+        storage = get_storage()
+        before_id = decode_id(before) if before else None
+        params = {'size': size, 'start_time': start_time, 'end_time': end_time,
+                  'module': modules, 'status_code': status_code, 'before': before, 'before_node': before_node}
+        params = {key: value for key, value in params.items() if value}
+
+        def local():
+            return {
+                'logs': list_page(storage, before_id, before_node, size, start_time, end_time, modules, status_code),
+                'total': storage.count(start_time, end_time, modules, status_code),
+                'collector': config.COLLECTOR_ENABLED
+            }
+
+        calls = {LOCAL: local}
+        for peer in self.peers:
+            calls[peer.url] = lambda peer=peer: peer.get('/.api/requests', params)
+        results, statuses = self.gather(calls)
+
+        merged = {}
+        totals = []
+        collector_totals = []
+        for name, data in results.items():
+            (collector_totals if data.get('collector') else totals).append(data.get('total') or 0)
+            for record in data.get('logs') or []:
+                if not record.get('node'):
+                    record['node'] = config.NODE_NAME if name == LOCAL else name
+                # 按 (节点, id) 去重: 收集端保存的副本与产生节点的记录合并，不同节点的相同id都保留
+                merged.setdefault((record['node'], record.get('request_id')), record)
+        total = sum(totals) if totals else max(collector_totals, default=0)
+        logs = sorted(merged.values(), key=_node_key, reverse=True)[:size]
+        return {
+            'logs': logs,
+            'size': size,
+            'total': total,
+            'next': logs[-1]['request_id'] if len(logs) >= size else None,
+            'next_node': logs[-1]['node'] if len(logs) >= size else None,
+            'partial': any(not status['ok'] for status in statuses),
+            'peers': statuses
+        }
+
+    def _peer_modules(self, peer):
+        cached = peer.modules_cache
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            modules = peer.get('/.api/modules') or []
+        except Exception:
+            if cached is not None:
+                # 节点不可用时使用上次的结果
+                return cached[1]
+            raise
+        peer.modules_cache = (time.monotonic() + self.modules_ttl, modules)
+        return modules
+
+    def modules(self):
+        """所有节点模块列表的并集"""
+        calls = {LOCAL: get_storage().modules}
+        for peer in self.peers:
+            calls[peer.url] = lambda peer=peer: self._peer_modules(peer)
+        results, _ = self.gather(calls)
+        seen = dict.fromkeys(results.get(LOCAL) or [])
+        for peer in self.peers:
+            modules = results.get(peer.url)
+            if modules is None and peer.modules_cache is not None:
+                # 本次超时的节点使用上次的结果
+                modules = peer.modules_cache[1]
+            seen.update(dict.fromkeys(modules or []))
+        return list(seen)
+
+    def find_request(self, request_id):
+        """在所有节点中查找请求详情，返回 (记录, 节点名)，都未找到时返回 (None, None)"""
+        calls = {peer.url: lambda peer=peer: peer.get('/.api/requests/' + quote(request_id, safe=''))
+                 for peer in self.peers}
+        results, _ = self.gather(calls)
+        for peer in self.peers:
+            record = results.get(peer.url)
+            if record is not None:
+                if not record.get('node'):
+                    record['node'] = peer.url
+                return record, peer.url
+        return None, None
+
+
+# 全局联合查询（未配置 MOCKS_PEERS 时不启用）
+federation = Federation()
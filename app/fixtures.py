@@ -0,0 +1,88 @@
+"""基于文件的mock响应
+
+模块可以把响应内容放在模块目录下的 fixtures/ 中，在视图里返回 fixture_response(文件名)。
+文件通过 send_file 发送: 由WSGI服务器的 wsgi.file_wrapper（gunicorn中为sendfile）直接从磁盘写入连接，
+不读入Python内存；同时支持 ETag、If-None-Match/If-Modified-Since 和 Range 请求。
+
+请求日志只记录文件的引用（路径、大小、SHA-256和实际发送的范围），不复制响应体。
+文件的SHA-256同时用作强ETag，按 (修改时间, 大小) 缓存，文件不变时只计算一次。
+"""
+import hashlib
+import os
+import threading
+
+from flask import abort, current_app, g, request, send_file
+from werkzeug.security import safe_join
+
+# 模块目录下存放响应文件的子目录
+FIXTURES_DIRNAME = 'fixtures'
+# 计算SHA-256时每次读取的字节数
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+def fixtures_dir(blueprint_name=None):
+    """模块的响应文件目录，默认为当前请求所属蓝图的目录下的 fixtures/"""
+    blueprint = current_app.blueprints.get(blueprint_name or request.blueprint)
+    root = blueprint.root_path if blueprint is not None else current_app.root_path
+    return os.path.join(root, FIXTURES_DIRNAME)
+
+
+def file_digest(path, stat=None):
+    """文件的SHA-256，按 (修改时间, 大小) 缓存"""
+    stat = stat or os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _hash_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    with _hash_lock:
+        _hash_cache[path] = (key, digest)
+    return digest
+
+
+def fixture_response(filename, module=None, mimetype=None, as_attachment=False, download_name=None,
+                     max_age=None):
+    """返回模块 fixtures/ 目录下的文件作为响应
+
+    Args:
+        filename: 相对于 fixtures/ 的文件路径（不允许跳出该目录）
+        module: 蓝图名称，默认为当前请求所属的蓝图
+        mimetype: 响应类型，默认按文件扩展名推断
+        as_attachment: 是否以附件形式下载
+        download_name: 下载时的文件名
+        max_age: 缓存时间（秒）
+
+    Returns:
+        Response: 支持条件请求和Range的文件响应，文件不存在时返回404
+    """
+    directory = fixtures_dir(module)
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+    digest = file_digest(path, stat)
+    # 日志中记录文件引用而不是响应体
+    g.fixture = {
+        'path': os.path.relpath(path, current_app.root_path),
+        'size': stat.st_size,
+        'sha256': digest
+    }
+    return send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+                     conditional=True, etag=digest, max_age=max_age)
+
+
+def fixture_reference(response):
+    """日志中代替响应体记录的文件引用"""
+    reference = dict(g.fixture)
+    reference['sent'] = response.content_length if response.status_code != 304 else 0
+    content_range = response.headers.get('Content-Range')
+    if content_range:
+        reference['range'] = content_range
+    return reference
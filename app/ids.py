@@ -0,0 +1,175 @@
+"""按时间排序的紧凑请求ID
+
+ID为63位整数（snowflake风格），直接作为 request_logs 的整型主键写入，
+新ID总是追加在B树末尾，避免随机UUID索引造成的页分裂:
+
+    | 41位 毫秒时间戳（自 ID_EPOCH 起） | 5位 节点ID | 5位 worker槽位 | 12位 序号 |
+
+- 节点ID通过环境变量 MOCKS_NODE_ID 配置（0-31，超出范围时启动报错），不同节点需配置不同的值
+- worker槽位在同一节点的进程之间通过文件锁分配，保证存活的worker互不重复
+- 对外展示时编码为13位 Crockford Base32 字符串，字典序与时间顺序一致
+"""
+import os
+import tempfile
+import threading
+import time
+
+from . import config
+
+# 自定义纪元（2024-01-01 00:00:00 UTC，毫秒），41位时间戳可使用约69年
+ID_EPOCH = 1704067200000
+
+NODE_BITS = 5
+WORKER_BITS = 5
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def parse_node_id(value):
+    """解析 MOCKS_NODE_ID，不是整数或超出范围时报错（截断后会与其他节点的ID冲突）"""
+    if value in (None, ''):
+        return 0
+    try:
+        node_id = int(value)
+    except ValueError:
+        raise ValueError(f"MOCKS_NODE_ID 必须是 0-{MAX_NODE} 之间的整数: {value}")
+    if not 0 <= node_id <= MAX_NODE:
+        raise ValueError(f"MOCKS_NODE_ID 必须是 0-{MAX_NODE} 之间的整数: {value}")
+    return node_id
+
+
+NODE_ID = parse_node_id(os.environ.get('MOCKS_NODE_ID'))
+# 是否显式配置了节点ID（向收集端发送日志的节点必须配置，见 app/shipper.py）
+NODE_ID_CONFIGURED = os.environ.get('MOCKS_NODE_ID') not in (None, '')
+
+# worker槽位锁文件目录
+SLOT_DIR = config.env_str('MOCKS_ID_SLOT_DIR', os.path.join(tempfile.gettempdir(), 'mocks-id-slots'))
+
+# Crockford Base32 字母表（不含 I L O U）
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+DECODE_MAP = {c: i for i, c in enumerate(ALPHABET)}
+DECODE_MAP.update({c.lower(): i for i, c in enumerate(ALPHABET)})
+ENCODED_LENGTH = 13
+
+
+def compose_id(timestamp_ms, node_id, worker_id, sequence):
+    """按位组合ID"""
+    return (((timestamp_ms - ID_EPOCH) << (NODE_BITS + WORKER_BITS + SEQUENCE_BITS))
+            | (node_id << (WORKER_BITS + SEQUENCE_BITS))
+            | (worker_id << SEQUENCE_BITS)
+            | sequence)
+
+
+def id_timestamp(value):
+    """从ID中取出生成时间（秒）"""
+    return ((value >> (NODE_BITS + WORKER_BITS + SEQUENCE_BITS)) + ID_EPOCH) / 1000.0
+
+
+def encode_id(value):
+    """将整型ID编码为定长Crockford Base32字符串"""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def decode_id(text):
+    """解析Base32编码或十进制的ID，格式不合法时返回None"""
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    if len(text) != ENCODED_LENGTH:
+        return None
+    value = 0
+    for c in text:
+        digit = DECODE_MAP.get(c)
+        if digit is None:
+            return None
+        value = (value << 5) | digit
+    return value
+
+
+def is_legacy_id(text):
+    """判断是否为旧版本的UUID格式请求ID"""
+    return len(text) == 36 and text.count('-') == 4
+
+
+def _acquire_worker_slot():
+    """在本节点上为当前进程分配一个空闲的worker槽位
+
+    每个槽位对应一个锁文件，进程存活期间一直持有排他锁，进程退出时由系统自动释放。
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return os.getpid() & MAX_WORKER, None
+
+    try:
+        os.makedirs(SLOT_DIR, exist_ok=True)
+    except OSError:
+        return os.getpid() & MAX_WORKER, None
+
+    start = os.getpid() & MAX_WORKER
+    for offset in range(MAX_WORKER + 1):
+        slot = (start + offset) & MAX_WORKER
+        path = os.path.join(SLOT_DIR, f'node-{NODE_ID}-slot-{slot}.lock')
+        try:
+            handle = open(path, 'a')
+        except OSError:
+            continue
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return slot, handle
+        except OSError:
+            handle.close()
+    # 槽位用尽时退化为按pid取模
+    print("警告: 请求ID的worker槽位已用尽，可能产生重复ID")
+    return os.getpid() & MAX_WORKER, None
+
+
+class IdGenerator:
+    """线程安全的ID生成器，fork后的子进程会重新分配worker槽位"""
+
+    def __init__(self, node_id=NODE_ID):
+        self.node_id = node_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._worker_id = 0
+        self._slot_handle = None
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next_id(self):
+        """生成下一个ID"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._worker_id, self._slot_handle = _acquire_worker_slot()
+                self._pid = os.getpid()
+                self._last_ms = 0
+                self._sequence = 0
+
+            now_ms = int(time.time() * 1000)
+            # 时钟回拨时沿用上一次的时间戳，保证ID单调递增
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 同一毫秒内序号用尽，借用下一毫秒
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return compose_id(now_ms, self.node_id, self._worker_id, self._sequence)
+
+
+# 全局ID生成器
+id_generator = IdGenerator()
+
+
+def new_request_id():
+    """生成新的请求ID（整数）"""
+    return id_generator.next_id()
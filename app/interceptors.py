@@ -1,45 +1,127 @@
+import asyncio
 import time
 import json
-import uuid
-from flask import request, g
-from .database import save_request_log
+from flask import request, g, jsonify
+from . import config
+from .admission import LEVEL_NO_BODY, LEVEL_SAMPLED, admission
+from .breaker import log_sink
+from .capture import FULL, SKIP, SUMMARY, capture_policy
+from .database import serialize_log
+from .fixtures import fixture_reference
+from .ids import new_request_id
+from .log_writer import log_writer
+from .metrics import record_request, registry
+from .profiling import phase_stats
+from .shaping import shaping_policy
+from .shipper import log_shipper
+from .storage import get_storage
+from .streaming import StreamCapture
+from .uploads import body_summary, install_tee, is_streaming_body
 
-# 存储请求开始时间
-request_start_times = {}
+# 不经过准入控制和运行指标的蓝图
+BASE_BLUEPRINT = 'base'
 
-# 定义不需要记录日志的蓝图名称
-EXCLUDED_BLUEPRINTS = [
-    'base'  # 排除base蓝图下的所有路由
-]
+
+def response_length(response):
+    """响应体字节数，文件和流式响应只读取 Content-Length 而不展开响应体"""
+    if response.direct_passthrough or response.is_streamed:
+        return response.content_length
+    return response.calculate_content_length()
 
 
 def log_request_info():
     """记录请求信息"""
-    # 生成请求ID并记录开始时间
-    request_id = str(uuid.uuid4())
-    request_start_times[request_id] = time.time()
-    
+    # 生成按时间排序的请求ID并记录开始时间，保存在 g 上随请求结束自动释放
+    request_id = new_request_id()
+    g.request_id = request_id
+    g.request_start_time = time.time()
+    g.request_start_ns = time.perf_counter_ns()
+    g.timings = {}
+
     return request_id
 
 
 def log_response_info(request_id, response):
     """记录响应信息"""
-    # 计算处理时间（以毫秒为单位，保留6位小数）
-    start_time = request_start_times.pop(request_id, None)
-    process_time = round((time.time() - start_time) * 1000, 3) if start_time else None
-    # 记录响应信息
-    try:
-        response_data = json.loads(response.get_data(as_text=True))
-    except (ValueError, TypeError):
-        response_data = response.get_data(as_text=True)
+    after_ns = time.perf_counter_ns()
+    start_ns = g.get('request_start_ns')
+    start_time = g.get('request_start_time')
+    timings = g.get('timings')
+    if timings is None:
+        timings = {}
 
-    # 安全获取JSON数据，避免解析错误
-    try:
-        request_json = request.get_json(silent=True)
-    except Exception as e:
-        print(f"解析JSON数据时出错: {e}")
+    # 计算处理时间（以毫秒为单位，保留3位小数）
+    process_time = round((after_ns - start_ns) / 1e6, 3) if start_ns else None
+    before_done_ns = g.get('before_done_ns')
+    if before_done_ns:
+        timings['view'] = after_ns - before_done_ns
+
+    module = request.blueprint
+    endpoint = request.endpoint
+    stream = None
+    capture = g.capture.resolve(response.status_code)
+    if capture == SKIP:
+        # 命中了不记录的规则（请求侧或按响应码），只更新运行指标
+        record_request(module, endpoint, response.status_code, process_time,
+                       request.content_length, response_length(response))
+        return response
+
+    level = g.get('degrade_level', 0)
+    if level >= LEVEL_SAMPLED and not admission.sample():
+        # 采样降级: 未被采样的请求只更新运行指标，不记录日志
+        registry.inc('mocks_degraded_total', {'mode': 'sampled_out'})
+        record_request(module, endpoint, response.status_code, process_time,
+                       request.content_length, response_length(response))
+        return response
+
+    if level >= LEVEL_NO_BODY or capture == SUMMARY:
+        # 降级或采集策略为摘要时不读取和解析请求/响应体
+        if level >= LEVEL_NO_BODY:
+            registry.inc('mocks_degraded_total', {'mode': 'no_body'})
+        response_data = None
         request_json = None
-    
+        request_form = {}
+        request_body = None
+    else:
+        # 记录响应信息
+        if 'fixture' in g:
+            # 文件响应只记录文件引用（路径、大小、摘要和发送范围）
+            response_data = fixture_reference(response)
+        elif response.direct_passthrough:
+            # 其他文件响应不读取响应体，避免把整个文件读入内存
+            response_data = None
+        elif response.is_streamed:
+            # 流式响应在发送时统计大小和摘要，发送完成后再记录
+            stream = StreamCapture(response.response)
+            response.response = stream
+            response_data = None
+        else:
+            try:
+                text = response.get_data(as_text=True)
+            except UnicodeDecodeError:
+                # 二进制响应体（如录制代理转发的图片）不能按文本记录
+                text = None
+            try:
+                response_data = json.loads(text) if text is not None else None
+            except (ValueError, TypeError):
+                response_data = text
+
+        upload = g.get('upload')
+        if upload is not None or is_streaming_body(request.mimetype):
+            # 上传请求只记录流式采集的元数据，不触发 request.form 的完整解析
+            request_json = None
+            request_form = {}
+            request_body = upload.finish() if upload is not None else body_summary(request)
+        else:
+            # 安全获取JSON数据，避免解析错误
+            try:
+                request_json = request.get_json(silent=True)
+            except Exception as e:
+                print(f"解析JSON数据时出错: {e}")
+                request_json = None
+            request_form = dict(request.form)
+            request_body = None
+
     # 准备存储到数据库的数据
     log_data = {
         'request_id': request_id,
@@ -48,67 +130,144 @@ def log_response_info(request_id, response):
         'client_ip': request.remote_addr,  # 获取客户端IP地址
         'request_headers': dict(request.headers),
         'request_args': dict(request.args),
-        'request_form': dict(request.form),
+        'request_form': request_form,
         'request_json': request_json,
+        'request_body': request_body,
         'status_code': response.status_code,
         'response_headers': dict(response.headers),
         'response_data': response_data,
         'process_time': process_time,
         'timestamp': start_time if start_time else time.time(),
-        'module': request.blueprint  # 使用蓝图名称作为module
+        'module': request.blueprint,  # 使用蓝图名称作为module
+        'route': request.url_rule.rule if request.url_rule else None,  # 路由模板，用于聚合统计
+        'matched_rule': g.get('matched_rule'),  # 条件响应规则的命中信息（app/matching.py）
+        'timings': timings
     }
-    
-    # 保存到数据库
+    timings['capture'] = time.perf_counter_ns() - after_ns
+
+    if stream is not None:
+        def finish_stream():
+            # 在WSGI服务器发送完响应体后调用，处理时间包含发送耗时
+            log_data['response_data'] = stream.response_data()
+            if start_ns:
+                log_data['process_time'] = round((time.perf_counter_ns() - start_ns) / 1e6, 3)
+            persist_log(log_data, module, endpoint, request_length, stream.size)
+
+        request_length = request.content_length
+        response.call_on_close(finish_stream)
+        return response
+
+    persist_log(log_data, module, endpoint, request.content_length, response_length(response))
+    return response
+
+
+def in_event_loop():
+    """当前线程是否正在运行asyncio事件循环"""
     try:
-        save_request_log(log_data)
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def persist_log(log_data, module, endpoint, request_length, response_bytes):
+    """序列化并保存到存储后端（异步模式下只放入写入队列），并更新阶段耗时和运行指标"""
+    timings = log_data['timings']
+    try:
+        row = serialize_log(log_data)
+        storage = get_storage()
+        # 事件循环线程（ASGI模式下的 async def 视图）中不同步提交，以免阻塞其他连接
+        if (config.LOG_ASYNC or in_event_loop()) and not storage.direct_write:
+            enqueue_start_ns = time.perf_counter_ns()
+            log_writer.submit(row, module, endpoint)
+            timings['enqueue'] = time.perf_counter_ns() - enqueue_start_ns
+        else:
+            _, commit_ns = log_sink.write([row])
+            if commit_ns is not None:
+                timings['commit'] = commit_ns
+                registry.observe('mocks_log_commit_duration_ms', None, commit_ns / 1e6)
+        if log_shipper.enabled:
+            log_shipper.submit(row)
     except Exception as e:
         print(f"保存请求日志到数据库时出错: {e}")
-    
-    return response
+
+    phase_stats.record(module, endpoint, timings)
+    record_request(module, endpoint, log_data['status_code'], log_data['process_time'],
+                   request_length, response_bytes)
 
 
 def request_interceptor(app):
     """注册全局请求拦截器"""
-    
+
     @app.before_request
     def before_request():
         """在每个请求之前记录信息"""
-        # 获取当前请求的蓝图名称
+        # base蓝图（日志页面和管理接口）不经过准入控制，也不计入运行指标
         blueprint_name = request.blueprint
-        
-        # 检查当前蓝图是否在排除列表中
-        if blueprint_name in EXCLUDED_BLUEPRINTS:
-            return  # 不记录这些蓝图下的请求
-        
-        request_id = log_request_info()
+        if blueprint_name == BASE_BLUEPRINT:
+            return
+        # 按预编译的采集策略决定记录级别；采集策略只控制日志，不记录的请求同样经过准入控制并更新运行指标
+        decision = capture_policy.decide(request)
+        g.capture = decision
+
+        # 准入控制: 超出并发或限流时立即返回503，不在worker中排队
+        reason, level = admission.admit(blueprint_name)
+        if reason:
+            g.admission_rejected = True
+            response = jsonify({
+                "errCode": 503,
+                "errMsg": f"服务繁忙，请稍后重试（{reason}）",
+                "data": None
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+        g.admission_module = blueprint_name
+        g.degrade_level = level
+
+        # 需要完整记录时，在视图读取请求体之前包装输入流以流式采集上传元数据
+        if not decision.skip and level < LEVEL_NO_BODY and (decision.level == FULL or decision.pending):
+            g.upload = install_tee(request)
+
         # 使用 Flask 的 g 对象存储 request_id，避免并发问题
-        g.request_id = request_id
+        log_request_info()
+        g.before_done_ns = time.perf_counter_ns()
+        g.timings['before'] = g.before_done_ns - g.request_start_ns
 
     @app.after_request
     def after_request(response):
         """在每个请求之后记录信息"""
-        # 获取当前请求的蓝图名称
-        blueprint_name = request.blueprint
-        
-        # 检查当前蓝图是否在排除列表中
-        if blueprint_name in EXCLUDED_BLUEPRINTS:
-            return response  # 不记录这些蓝图下的响应
-        
-        request_id = getattr(g, 'request_id', 'unknown')
-        return log_response_info(request_id, response)
+        # 被准入控制拒绝的请求不记录日志，也不做响应整形
+        if g.get('admission_rejected'):
+            return response
+
+        # base蓝图的请求跳过日志和运行指标，但仍按规则整形
+        if 'capture' in g:
+            request_id = getattr(g, 'request_id', 'unknown')
+            response = log_response_info(request_id, response)
+
+        # 按路由声明的延迟和带宽包装响应体，在发送时执行
+        response = shaping_policy.apply(request, response)
+
+        # 并发名额在响应体发送完毕（服务器关闭响应）时归还，流式、文件和整形响应发送期间仍然占用
+        if 'admission_module' in g:
+            module = g.pop('admission_module')
+            response.call_on_close(lambda: admission.release(module))
+        return response
 
     @app.teardown_request
     def teardown_request(exception):
         """请求结束时执行的清理工作"""
-        # 获取当前请求的蓝图名称
-        blueprint_name = request.blueprint
-        
-        # 检查当前蓝图是否在排除列表中
-        if blueprint_name in EXCLUDED_BLUEPRINTS:
-            return  # 不需要清理
-        
+        # base蓝图的请求没有需要清理的内容
+        if 'capture' not in g:
+            return
+
+        # after_request没有执行（如其中抛出异常）时在这里归还准入控制的并发名额
+        if 'admission_module' in g:
+            admission.release(g.pop('admission_module'))
+
         if exception:
             print(f"Request failed with exception: {exception}")
         # 清理request_id
         if hasattr(g, 'request_id'):
-            delattr(g, 'request_id')
\ No newline at end of file
+            delattr(g, 'request_id')
@@ -0,0 +1,128 @@
+"""请求日志后台写入器
+
+请求线程只把序列化好的日志行放入内存队列，由后台线程批量写入存储后端，
+请求不再等待SQLite提交。队列满时丢弃新日志并计数，不阻塞请求。
+数据库不可用时由熔断器（app/breaker.py）转存到溢出文件。
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from . import config
+from .breaker import log_sink
+from .metrics import registry
+from .profiling import phase_stats
+
+
+class LogWriter:
+    """基于队列的批量日志写入器（每个进程一个后台线程）"""
+
+    def __init__(self, max_queue=10000, batch_size=200):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_commit_ns = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _ensure_started(self):
+        """在当前进程中启动后台线程（fork出的worker进程会重新创建队列和线程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, row, module=None, endpoint=None):
+        """提交一条已序列化的日志行，队列满时返回False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((row, module, endpoint))
+        except queue.Full:
+            self.dropped += 1
+            registry.inc('mocks_log_records_total', {'outcome': 'dropped'})
+            return False
+        self.submitted += 1
+        return True
+
+    def depth(self):
+        """当前队列中等待写入的日志条数"""
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def flush(self, timeout=5.0):
+        """等待队列中的日志全部写入（用于进程退出和测试）"""
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _run(self):
+        work_queue = self._queue
+        while True:
+            batch = [work_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(work_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    work_queue.task_done()
+
+    def _write_batch(self, batch):
+        outcome, elapsed_ns = log_sink.write([item[0] for item in batch])
+
+        self.batches += 1
+        if elapsed_ns is not None:
+            self.last_commit_ns = elapsed_ns
+            registry.observe('mocks_log_commit_duration_ms', None, elapsed_ns / 1e6)
+        if outcome != 'written':
+            # 转存或丢弃的计数由 log_sink 记录
+            self.failed += len(batch)
+            return
+        self.written += len(batch)
+        registry.inc('mocks_log_records_total', {'outcome': 'written'}, len(batch))
+
+        # 提交耗时按批内条数均摊到各端点
+        per_record_ns = elapsed_ns // len(batch)
+        for _, module, endpoint in batch:
+            phase_stats.record(module, endpoint, {'commit': per_record_ns})
+
+    def stats(self):
+        """写入器计数"""
+        return {
+            'queue_depth': self.depth(),
+            'submitted': self.submitted,
+            'written': self.written,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'last_commit_ms': round(self.last_commit_ns / 1e6, 3) if self.last_commit_ns is not None else None
+        }
+
+
+# 全局写入器实例
+log_writer = LogWriter(max_queue=config.LOG_QUEUE_SIZE, batch_size=config.LOG_BATCH_SIZE)
+
+registry.register_gauge('mocks_log_queue_depth', log_writer.depth)
+
+# 进程正常退出时尽量写完队列中的日志
+atexit.register(log_writer.flush)
@@ -0,0 +1,257 @@
+"""带索引的条件响应规则
+
+模块用 RuleSet 声明「请求条件 -> 响应」，代替视图中按请求头、查询参数、JSON字段写的 if/else:
+
+    quotes = RuleSet('quotes')
+    quotes.add({'args': {'customer': 'c1001'}, 'json': {'plan': 'gold'}},
+               ResponseTemplate({'price': 80, 'customer': '{{ args.customer }}'}), name='c1001-gold')
+    quotes.add({'headers': {'X-Region': ['eu', 'uk']}}, ({'error': 'region closed'}, 403))
+    quotes.default(({'price': 100}, 200))
+
+    @bp.route('/quote', methods=['POST'])
+    def quote():
+        return quotes.dispatch()
+
+条件（同一规则内的条件都要满足）:
+    methods                   请求方法（字符串或列表）
+    path                      请求路径，支持 * 通配
+    args / headers / form     {名称: 值}，值为列表时匹配其中任意一个，为 "*" 时存在即可
+    json                      {"a.b.0": 值}，按点号路径取JSON请求体中的字段，比较时区分类型
+
+响应可以是 ResponseTemplate、可以直接返回的视图结果（如 (dict, 状态码)），或 fn(**kwargs) 形式的函数。
+
+多条规则同时匹配时按添加顺序取第一条。首次分发时编译索引: 每条规则按它的等值条件中
+取值最分散的一个字段放入哈希索引（字段 -> 值 -> 规则列表），没有等值条件的规则放入公共列表；
+分发时每个被索引的字段只做一次字典查找，只对命中桶内的规则和公共列表逐条校验，
+耗时与规则总数基本无关。命中的规则（规则集、规则名、索引字段、校验条数）记录在请求日志的 matched_rule 列中。
+"""
+import fnmatch
+import heapq
+import re
+import threading
+
+from flask import abort, g, request
+
+from .templating import ResponseTemplate
+
+ANY = '*'
+
+
+def _json_value(body, keys):
+    value = body
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+def _hashable(value):
+    """JSON值转换为可以作为索引键的值（区分 1、True 和 "1"）"""
+    return (type(value).__name__, value if not isinstance(value, (dict, list)) else repr(value))
+
+
+class Field:
+    """规则可以匹配的请求字段，如 ('args', 'customer')"""
+
+    __slots__ = ('source', 'name', 'keys', 'key')
+
+    def __init__(self, source, name=None):
+        self.source = source
+        self.name = name
+        self.keys = name.split('.') if source == 'json' and name else None
+        self.key = (source, name)
+
+    def __str__(self):
+        return f'{self.source}.{self.name}' if self.name else self.source
+
+    def extract(self, req):
+        """取出请求中该字段的值（不存在时为None）"""
+        if self.source == 'method':
+            return req.method
+        if self.source == 'path':
+            return req.path
+        if self.source == 'args':
+            return req.args.get(self.name)
+        if self.source == 'headers':
+            return req.headers.get(self.name)
+        if self.source == 'form':
+            return req.form.get(self.name)
+        return _json_value(req.get_json(silent=True), self.keys)
+
+    def normalize(self, value):
+        """条件值转换为与请求中取出的值可比较的索引键"""
+        if self.source == 'json':
+            return _hashable(value)
+        if self.source == 'method':
+            return str(value).upper()
+        return str(value)
+
+
+class Condition:
+    """单个字段上的条件: 等值（一个或多个候选值）、存在或通配路径"""
+
+    __slots__ = ('field', 'values', 'pattern')
+
+    def __init__(self, field, spec):
+        self.field = field
+        self.values = None
+        self.pattern = None
+        if spec == ANY:
+            return
+        if field.source == 'path' and isinstance(spec, str) and any(c in spec for c in '*?['):
+            self.pattern = re.compile(fnmatch.translate(spec))
+            return
+        candidates = spec if isinstance(spec, (list, tuple, set)) and field.source != 'json' else [spec]
+        self.values = frozenset(field.normalize(value) for value in candidates)
+
+    @property
+    def indexable(self):
+        return self.values is not None
+
+    def test(self, value):
+        if self.pattern is not None:
+            return value is not None and self.pattern.match(value) is not None
+        if self.values is None:
+            return value is not None
+        if value is None and self.field.source != 'json':
+            return False
+        return self.field.normalize(value) in self.values
+
+
+class MockRule:
+    """编译后的单条规则"""
+
+    __slots__ = ('name', 'order', 'conditions', 'response', 'indexed_by')
+
+    def __init__(self, spec, response, name, order):
+        self.name = name
+        self.order = order
+        self.response = response
+        # 编译索引时选中的字段
+        self.indexed_by = None
+        conditions = []
+        methods = spec.get('methods') or spec.get('method')
+        if methods:
+            conditions.append(Condition(Field('method'), [methods] if isinstance(methods, str) else methods))
+        if spec.get('path') is not None:
+            conditions.append(Condition(Field('path'), spec['path']))
+        for source in ('args', 'headers', 'form', 'json'):
+            for name, value in (spec.get(source) or {}).items():
+                conditions.append(Condition(Field(source, name), value))
+        self.conditions = conditions
+
+    def matches(self, values):
+        """values: 字段键 -> 请求中的值（按需取出并缓存）"""
+        for condition in self.conditions:
+            if not condition.test(values(condition.field)):
+                return False
+        return True
+
+
+class RuleSet:
+    """一组按添加顺序生效的条件响应规则"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rules = []
+        self.fallback = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def add(self, when, response, name=None):
+        """添加规则
+
+        Args:
+            when: 条件字典（见模块说明），为空时匹配所有请求
+            response: ResponseTemplate、视图返回值或 fn(**kwargs)
+            name: 规则名称（记录在请求日志中），默认为序号
+        """
+        order = len(self.rules)
+        self.rules.append(MockRule(when or {}, response, name or f'#{order}', order))
+        self._index = None
+        return self
+
+    def default(self, response):
+        """没有规则匹配时的响应（未设置时返回404）"""
+        self.fallback = response
+        return self
+
+    def compile(self):
+        """为每条规则选择索引字段，建立 字段 -> 值 -> 规则列表 的哈希索引"""
+        distinct = {}
+        for rule in self.rules:
+            for condition in rule.conditions:
+                if condition.indexable:
+                    distinct.setdefault(condition.field.key, set()).update(condition.values)
+        buckets = {}
+        fields = {}
+        unindexed = []
+        for rule in self.rules:
+            indexable = [c for c in rule.conditions if c.indexable]
+            if not indexable:
+                rule.indexed_by = None
+                unindexed.append(rule)
+                continue
+            best = max(indexable, key=lambda c: len(distinct[c.field.key]))
+            rule.indexed_by = best.field
+            fields[best.field.key] = best.field
+            by_value = buckets.setdefault(best.field.key, {})
+            for value in best.values:
+                by_value.setdefault(value, []).append(rule)
+        index = ([(fields[key], by_value) for key, by_value in buckets.items()], unindexed)
+        with self._lock:
+            self._index = index
+        return index
+
+    def match(self, req=None):
+        """返回 (命中的规则或None, 命中规则的索引字段, 校验过的规则条数)"""
+        req = req or request
+        indexed, unindexed = self._index or self.compile()
+        cache = {}
+
+        def values(field):
+            key = field.key
+            if key not in cache:
+                cache[key] = field.extract(req)
+            return cache[key]
+
+        candidates = [unindexed] if unindexed else []
+        for field, by_value in indexed:
+            value = values(field)
+            if value is None and field.source != 'json':
+                continue
+            bucket = by_value.get(field.normalize(value))
+            if bucket:
+                candidates.append(bucket)
+        if len(candidates) > 1:
+            ordered = heapq.merge(*candidates, key=lambda r: r.order)
+        else:
+            ordered = candidates[0] if candidates else ()
+        checked = 0
+        for rule in ordered:
+            checked += 1
+            if rule.matches(values):
+                return rule, rule.indexed_by, checked
+        return None, None, checked
+
+    def dispatch(self, **kwargs):
+        """按命中的规则返回响应，并把命中信息记录到请求日志"""
+        rule, field, checked = self.match()
+        g.matched_rule = {
+            'ruleset': self.name,
+            'rule': rule.name if rule is not None else None,
+            'index': str(field) if field is not None else None,
+            'checked': checked
+        }
+        response = rule.response if rule is not None else self.fallback
+        if response is None:
+            abort(404)
+        if isinstance(response, ResponseTemplate):
+            return response.render(**kwargs)
+        if callable(response):
+            return response(**kwargs)
+        return response
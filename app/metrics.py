@@ -0,0 +1,367 @@
+"""运行指标注册表
+
+在内存中维护计数器、仪表和固定桶延迟直方图，由拦截器和日志写入器更新。
+gunicorn 的每个worker进程定期把自己的指标快照写入共享目录（MOCKS_METRICS_DIR），
+任意worker处理 /.api/metrics 请求时合并所有worker的快照，以Prometheus文本格式输出，
+整个过程不查询SQLite。
+
+快照按部署隔离在 MOCKS_METRICS_DIR/<范围> 子目录中: gunicorn主进程启动时（gunicorn.conf.py 的 on_starting）
+把范围设为主进程pid并清理已退出主进程留下的目录，worker通过环境变量 MOCKS_METRICS_SCOPE 继承；
+单进程运行时范围为本进程pid。已退出worker的计数器和直方图合并进范围内的 archived.json 后删除其快照文件，
+重启或同一主机上的其他实例不会影响计数。
+"""
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from . import config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 延迟直方图的桶上界（毫秒），最后隐含一个 +Inf 桶
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 指标说明和类型: 名称 -> (类型, 说明)
+METRIC_INFO = {
+    'mocks_requests_total': ('counter', 'Mocked requests handled'),
+    'mocks_request_bytes_total': ('counter', 'Request body bytes received'),
+    'mocks_response_bytes_total': ('counter', 'Response body bytes sent'),
+    'mocks_request_duration_ms': ('histogram', 'Mocked request processing time in milliseconds'),
+    'mocks_log_commit_duration_ms': ('histogram', 'Request log batch commit time in milliseconds'),
+    'mocks_log_records_total': ('counter', 'Request log records by outcome'),
+    'mocks_log_queue_depth': ('gauge', 'Request log records waiting to be written'),
+    'mocks_admission_total': ('counter', 'Admission control decisions'),
+    'mocks_degraded_total': ('counter', 'Requests logged in a degraded mode'),
+    'mocks_inflight_requests': ('gauge', 'Requests currently being handled'),
+    'mocks_degrade_level': ('gauge', 'Current degrade level (0 normal, 1 no body, 2 sampled, 3 reject)'),
+    'mocks_log_breaker_open': ('gauge', 'Whether the request log circuit breaker is open'),
+    'mocks_log_spill_bytes': ('gauge', 'Request log bytes waiting in spill files'),
+    'mocks_shaped_total': ('counter', 'Responses delayed or throttled by shaping rules'),
+    'mocks_shaping_delay_ms': ('histogram', 'Injected response latency in milliseconds'),
+    'mocks_shaping_active': ('gauge', 'Shaped responses currently being delayed or sent'),
+    'mocks_proxy_requests_total': ('counter', 'Requests forwarded to the recording proxy upstream'),
+    'mocks_proxy_upstream_ms': ('histogram', 'Recording proxy upstream round trip in milliseconds'),
+    'mocks_snapshot_refresh_ms': ('histogram', 'Dashboard snapshot refresh duration in milliseconds'),
+    'mocks_ship_records_total': ('counter', 'Request log records sent to the collector by outcome'),
+    'mocks_ship_retries_total': ('counter', 'Log batches resent to the collector'),
+    'mocks_ship_batch_ms': ('histogram', 'Collector round trip per shipped log batch in milliseconds'),
+    'mocks_ship_queue_depth': ('gauge', 'Request log records waiting to be sent to the collector'),
+    'mocks_ingest_records_total': ('counter', 'Request log records received by the collector by outcome'),
+    'mocks_peer_requests_total': ('counter', 'Federated dashboard queries sent to peer nodes by outcome'),
+    'mocks_peer_request_ms': ('histogram', 'Peer node response time for federated queries in milliseconds'),
+}
+
+# 快照目录与刷新间隔
+METRICS_DIR = config.env_str('MOCKS_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mocks-metrics'))
+METRICS_FLUSH_INTERVAL = config.env_float('MOCKS_METRICS_FLUSH_INTERVAL', 1.0)
+# 已退出worker的累计指标
+ARCHIVE_FILE = 'archived.json'
+
+
+def scope_dir():
+    """当前部署的快照目录"""
+    return os.path.join(METRICS_DIR, os.environ.get('MOCKS_METRICS_SCOPE') or str(os.getpid()))
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def inc(self, name, labels=None, value=1):
+        """计数器加值"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS_MS):
+        """向直方图记录一个观测值"""
+        key = (name, _label_key(labels))
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0, buckets]
+            hist[0][index] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def register_gauge(self, name, func, labels=None):
+        """注册一个在生成快照时求值的仪表"""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = func
+
+    def snapshot(self):
+        """生成当前进程的可序列化快照"""
+        with self._lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, dict(labels), list(h[0]), h[1], h[2], list(h[3])]
+                          for (name, labels), h in self._histograms.items()]
+            gauge_funcs = list(self._gauges.items())
+
+        gauges = []
+        for (name, labels), func in gauge_funcs:
+            try:
+                gauges.append([name, dict(labels), func()])
+            except Exception:
+                continue
+        return {'pid': os.getpid(), 'time': time.time(),
+                'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def ensure_flusher(self):
+        """在当前进程中启动快照刷新线程（fork出的worker会各自启动）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        if not os.environ.get('MOCKS_METRICS_SCOPE'):
+            # 单进程运行时没有主进程负责清理
+            _remove_dead_scopes()
+        thread = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+        thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """将快照原子地写入共享目录"""
+        snapshot = self.snapshot()
+        try:
+            directory = scope_dir()
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"worker-{snapshot['pid']}.json")
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入指标快照时出错: {e}")
+        return snapshot
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _remove_dead_scopes():
+    """删除已退出的主进程（或单进程实例）留下的快照目录"""
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(METRICS_DIR, name)
+        if name.isdigit() and os.path.isdir(path) and not _pid_alive(int(name)):
+            shutil.rmtree(path, ignore_errors=True)
+        elif name.startswith('worker-') and name.endswith('.json'):
+            # 旧版本直接写在 MOCKS_METRICS_DIR 下的快照
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def init_master(pid=None):
+    """gunicorn主进程启动时调用: 清空本部署的快照目录，worker继承快照范围"""
+    scope = str(pid or os.getpid())
+    os.environ['MOCKS_METRICS_SCOPE'] = scope
+    _remove_dead_scopes()
+    directory = os.path.join(METRICS_DIR, scope)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def archive_worker(pid, directory=None):
+    """把已退出worker的计数器和直方图合并进 archived.json，并删除其快照文件"""
+    directory = directory or scope_dir()
+    path = os.path.join(directory, f'worker-{pid}.json')
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    try:
+        lock_file = open(archive_path + '.lock', 'a+b')
+    except OSError:
+        return
+    with lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        snapshot = _load(path)
+        if snapshot is None:
+            return
+        archived = _load(archive_path) or {}
+        counters, histograms, _ = merge_snapshots([archived, snapshot])
+        archived = {
+            'pid': 0, 'time': time.time(),
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, dict(labels), h[0], h[1], h[2], list(h[3])]
+                           for (name, labels), h in histograms.items()],
+            'gauges': []
+        }
+        try:
+            tmp_path = archive_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(archived, f)
+            os.replace(tmp_path, archive_path)
+            os.remove(path)
+        except OSError as e:
+            print(f"归档worker {pid} 的指标快照时出错: {e}")
+
+
+def collect_snapshots(current):
+    """读取本部署所有worker的快照，当前进程使用实时快照
+
+    已退出worker的计数器和直方图先归档再计入（保持计数器单调递增），仪表则忽略。
+    """
+    directory = scope_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+
+    snapshots = [current]
+    for name in names:
+        if not (name.startswith('worker-') and name.endswith('.json')):
+            continue
+        path = os.path.join(directory, name)
+        snapshot = _load(path)
+        if snapshot is None or snapshot.get('pid') == current['pid']:
+            continue
+        if not _pid_alive(snapshot.get('pid', 0)):
+            archive_worker(snapshot.get('pid', 0), directory)
+            continue
+        snapshots.append(snapshot)
+    archived = _load(os.path.join(directory, ARCHIVE_FILE))
+    if archived is not None:
+        snapshots.append(archived)
+    return snapshots
+
+
+def merge_snapshots(snapshots):
+    """合并多个快照: 计数器、直方图和仪表按名称与标签求和"""
+    counters = {}
+    histograms = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, _label_key(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count, buckets in snapshot.get('histograms', []):
+            key = (name, _label_key(labels))
+            merged = histograms.get(key)
+            if merged is None or merged[3] != buckets:
+                histograms[key] = [list(counts), total, count, buckets]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+        for name, labels, value in snapshot.get('gauges', []):
+            key = (name, _label_key(labels))
+            gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    parts = []
+    for k, v in items:
+        value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_prometheus(counters, histograms, gauges):
+    """以Prometheus文本格式（0.0.4）输出合并后的指标"""
+    lines = []
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(('counter', labels, value))
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append(('gauge', labels, value))
+    for (name, labels), hist in histograms.items():
+        by_name.setdefault(name, []).append(('histogram', labels, hist))
+
+    for name in sorted(by_name):
+        metric_type, help_text = METRIC_INFO.get(name, (by_name[name][0][0], name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for kind, labels, value in sorted(by_name[name], key=lambda item: item[1]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+                continue
+            counts, total, count, buckets = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else _format_number(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(float(total))}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def status_class(status_code):
+    """将状态码归类为 2xx/4xx/5xx 等"""
+    return f'{status_code // 100}xx' if status_code else 'unknown'
+
+
+def record_request(module, endpoint, status_code, duration_ms, request_bytes, response_bytes):
+    """拦截器在每个请求结束时调用，更新请求相关指标"""
+    registry.ensure_flusher()
+    labels = {'module': module or '', 'endpoint': endpoint or '', 'status': status_class(status_code)}
+    registry.inc('mocks_requests_total', labels)
+    if duration_ms is not None:
+        registry.observe('mocks_request_duration_ms', labels, duration_ms)
+    if request_bytes:
+        registry.inc('mocks_request_bytes_total', {'module': module or ''}, request_bytes)
+    if response_bytes:
+        registry.inc('mocks_response_bytes_total', {'module': module or ''}, response_bytes)
+
+
+def render_all_workers():
+    """合并所有worker的指标并以Prometheus文本格式输出"""
+    current = registry.write_snapshot()
+    return render_prometheus(*merge_snapshots(collect_snapshots(current)))
+
+
+# 全局指标注册表（每个worker进程独立）
+registry = MetricsRegistry()
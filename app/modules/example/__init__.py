@@ -17,6 +17,13 @@ MODULE_ENABLED = True
 MODULE_CONFIG = {
     'debug': False,
     'cache_timeout': 3600,
-    'max_items': 100
+    'max_items': 100,
+    # 日志采集策略: 默认完整记录，提交接口的4xx响应只记录摘要
+    'capture': {
+        'default': 'full',
+        'rules': [
+            {'path': '/example/submit', 'status': '4xx', 'capture': 'summary'}
+        ]
+    }
 }
 
@@ -2,11 +2,30 @@
 
 此模块提供示例功能，展示如何按照模块化架构规范实现功能模块。
 """
+import asyncio
+import time
+
 from flask import Blueprint, request, jsonify
+from ...fixtures import fixture_response
+from ...matching import RuleSet
+from ...state import collection
+from ...streaming import json_array_response, ndjson_response
+from ...synthetic import SyntheticGenerator
+from ...templating import ResponseTemplate
 
 # 创建蓝图实例
 bp = Blueprint('example', __name__, url_prefix='/example')
 
+# 批量导出接口的合成数据字段
+EXPORT_FIELDS = {
+    'id': 'seq',
+    'uuid': 'uuid',
+    'name': 'word',
+    'score': 'int:0:100',
+    'status': 'choice:active,inactive,pending',
+    'created_at': 'timestamp'
+}
+
 @bp.route('/', methods=['GET'])
 def get_example():
     """示例API端点 - 获取示例信息
@@ -29,27 +48,170 @@ def get_example_data():
         type: 数据类型（可选，默认为'default'）
     
     Returns:
-        JSON响应: 包含示例数据的JSON对象
+        JSON响应: 包含示例数据的JSON对象，数据以流式分块返回，count很大时内存占用不变
     """
     # 获取查询参数
-    count = request.args.get('count', default=5, type=int)
+    count = max(request.args.get('count', default=5, type=int), 0)
     data_type = request.args.get('type', default='default', type=str)
     
-    # 生成示例数据
-    data = []
-    for i in range(count):
-        data.append({
-            'id': i + 1,
-            'value': f'示例数据 {i + 1}',
-            'type': data_type
-        })
+    # 按需生成示例数据，不在内存中构造完整列表
+    data = ({
+        'id': i + 1,
+        'value': f'示例数据 {i + 1}',
+        'type': data_type
+    } for i in range(count))
+    
+    return json_array_response(data, envelope={
+        'count': count,
+        'type': data_type
+    })
+
+@bp.route('/export', methods=['GET'])
+def export_example_data():
+    """示例API端点 - 模拟分页的批量导出接口
+    
+    Query Parameters:
+        count: 本页记录数（可选，默认为1000）
+        offset: 起始偏移（可选，默认为0）
+        seed: 随机种子，同一种子下每条记录固定（可选，默认为0）
+        format: json 或 ndjson（可选，默认为json）
+    
+    Returns:
+        流式响应: 合成的导出记录
+    """
+    count = max(request.args.get('count', default=1000, type=int), 0)
+    offset = max(request.args.get('offset', default=0, type=int), 0)
+    seed = request.args.get('seed', default=0, type=int)
     
+    records = SyntheticGenerator(EXPORT_FIELDS, seed=seed).iter_records(count, offset)
+    if request.args.get('format') == 'ndjson':
+        return ndjson_response(records)
+    return json_array_response(records, envelope={
+        'offset': offset,
+        'count': count,
+        'next_offset': offset + count
+    })
+
+@bp.route('/poll', methods=['GET'])
+async def poll_example_events():
+    """示例API端点 - 模拟长轮询接口（异步视图）
+
+    等待期间不占用线程: ASGI模式下在事件循环中执行，单个进程可以同时保持大量长轮询连接。
+
+    Query Parameters:
+        timeout: 等待秒数（可选，默认为30，最大为300）
+        since: 客户端已收到的最后一个事件序号（可选，默认为0）
+
+    Returns:
+        JSON响应: 等待结束时产生的一个新事件
+    """
+    timeout = min(max(request.args.get('timeout', default=30, type=float), 0), 300)
+    since = request.args.get('since', default=0, type=int)
+
+    await asyncio.sleep(timeout)
+
     return jsonify({
-        'count': len(data),
-        'type': data_type,
-        'data': data
+        'events': [{'id': since + 1, 'type': 'tick', 'timestamp': time.time()}],
+        'last_id': since + 1,
+        'waited': timeout
     })
 
+@bp.route('/files/<path:filename>', methods=['GET'])
+def get_example_file(filename):
+    """示例API端点 - 返回 fixtures/ 目录下的文件
+
+    支持 ETag 条件请求和 Range 分段下载，文件直接从磁盘发送。
+
+    Returns:
+        文件响应: fixtures/ 下的对应文件，不存在时返回404
+    """
+    return fixture_response(filename)
+
+# 报价接口的条件响应规则: 按客户、套餐和地区返回不同结果，按添加顺序第一条匹配的规则生效
+QUOTE_RULES = RuleSet('example.quote')
+QUOTE_RULES.add({'headers': {'X-Region': ['cn-north', 'cn-south']}, 'json': {'plan': 'trial'}},
+                ({'error': '该地区不支持试用套餐'}, 403), name='region-no-trial')
+QUOTE_RULES.add({'args': {'customer': 'vip'}, 'json': {'plan': 'gold'}},
+                ResponseTemplate({'customer': '{{ args.customer }}', 'plan': 'gold', 'price': 80, 'discount': 0.2}),
+                name='vip-gold')
+QUOTE_RULES.add({'args': {'customer': 'vip'}},
+                ResponseTemplate({'customer': '{{ args.customer }}', 'plan': '{{ json.plan }}', 'price': 95, 'discount': 0.05}),
+                name='vip')
+QUOTE_RULES.default(ResponseTemplate({
+    'customer': '{{ args.customer }}', 'plan': '{{ json.plan|default:"basic" }}', 'price': 100, 'discount': 0
+}))
+
+@bp.route('/quote', methods=['POST'])
+def quote_example():
+    """示例API端点 - 按请求条件返回不同报价（条件响应规则）
+
+    Query Parameters:
+        customer: 客户标识（可选）
+
+    Request Body:
+        JSON对象: plan 为套餐名称（可选）
+
+    Returns:
+        JSON响应: 命中规则对应的报价，命中的规则记录在请求日志中
+    """
+    return QUOTE_RULES.dispatch()
+
+# 订单接口的共享状态: 所有worker读写同一份数据，重启后保留，按客户建立索引
+ORDERS = collection('example', 'orders', indexes=['customer'])
+
+@bp.route('/orders', methods=['POST'])
+def create_example_order():
+    """示例API端点 - 创建订单（有状态mock）
+
+    Request Body:
+        JSON对象: customer 为客户标识（必填），其他字段原样保存
+
+    Returns:
+        JSON响应: 创建的订单，id 为生成的订单号
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or 'customer' not in data:
+        return jsonify({'error': '缺少必需字段: customer'}), 400
+    order_id = ORDERS.insert(dict(data, status='created'), key_field='id')
+    return jsonify(ORDERS.get(order_id)), 201
+
+@bp.route('/orders', methods=['GET'])
+def list_example_orders():
+    """示例API端点 - 查询订单列表
+
+    Query Parameters:
+        customer: 按客户筛选（可选）
+
+    Returns:
+        JSON响应: 订单列表
+    """
+    customer = request.args.get('customer')
+    orders = ORDERS.find(customer=customer) if customer else ORDERS.all()
+    return jsonify({'count': len(orders), 'data': orders})
+
+@bp.route('/orders/<order_id>', methods=['GET', 'DELETE'])
+def example_order(order_id):
+    """示例API端点 - 查询或删除单个订单
+
+    Returns:
+        JSON响应: 订单内容，不存在时返回404
+    """
+    order = ORDERS.get(order_id)
+    if order is None:
+        return jsonify({'error': f'订单不存在: {order_id}'}), 404
+    if request.method == 'DELETE':
+        ORDERS.delete(order_id)
+    return jsonify(order)
+
+# 提交接口的响应模板，启动时预编译，每个请求只计算占位符
+SUBMIT_RESPONSE = ResponseTemplate({
+    'status': 'success',
+    'message': '已成功提交数据，名称: {{ json.name }}',
+    'received_data': '{{ json }}'
+}, status=201)
+NOT_JSON_RESPONSE = ResponseTemplate({'error': '请求体必须是JSON格式'}, status=400)
+MISSING_NAME_RESPONSE = ResponseTemplate({'error': '缺少必需字段: name'}, status=400)
+
 @bp.route('/submit', methods=['POST'])
 def submit_example_data():
     """示例API端点 - 提交示例数据
@@ -62,19 +224,15 @@ def submit_example_data():
     """
     # 获取请求体数据
     if not request.is_json:
-        return jsonify({'error': '请求体必须是JSON格式'}), 400
+        return NOT_JSON_RESPONSE.render()
     
     data = request.get_json()
     
     # 简单的数据验证
     if 'name' not in data:
-        return jsonify({'error': '缺少必需字段: name'}), 400
+        return MISSING_NAME_RESPONSE.render()
     
     # 处理提交的数据
     # 在实际应用中，这里可能会涉及数据库操作、外部API调用等
     
-    return jsonify({
-        'status': 'success',
-        'message': f'已成功提交数据，名称: {data["name"]}',
-        'received_data': data
-    }), 201
\ No newline at end of file
+    return SUBMIT_RESPONSE.render()
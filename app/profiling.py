@@ -0,0 +1,79 @@
+"""请求阶段耗时统计
+
+拦截器使用 perf_counter_ns 记录每个请求各阶段的耗时，并在内存中按 模块/端点 聚合，
+用于区分慢在mock本身（view）还是日志记录链路（capture/serialize/enqueue/commit）。
+"""
+import threading
+
+# 阶段名称，按请求处理顺序排列
+#   before: 拦截器before_request钩子
+#   view: before_request结束到after_request开始（视图函数及其他钩子）
+#   capture: 采集请求/响应数据
+#   serialize: 日志序列化为数据库行
+#   enqueue: 提交到后台写入队列（同步写入时不记录）
+#   commit: 数据库提交（批量写入时按批内条数均摊）
+PHASES = ('before', 'view', 'capture', 'serialize', 'enqueue', 'commit')
+
+
+class PhaseStats:
+    """按 (模块, 端点) 聚合的阶段耗时统计"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, module, endpoint, timings):
+        """记录一个请求的阶段耗时
+
+        Args:
+            module: 模块（蓝图）名称
+            endpoint: 端点名称
+            timings: 阶段名 -> 耗时（纳秒）
+        """
+        key = (module, endpoint)
+        with self._lock:
+            phases = self._stats.get(key)
+            if phases is None:
+                phases = self._stats[key] = {}
+            for phase, ns in timings.items():
+                if ns is None:
+                    continue
+                stat = phases.get(phase)
+                if stat is None:
+                    phases[phase] = [1, ns, ns]
+                else:
+                    stat[0] += 1
+                    stat[1] += ns
+                    if ns > stat[2]:
+                        stat[2] = ns
+
+    def snapshot(self):
+        """返回当前统计的可序列化副本（耗时单位为微秒）"""
+        with self._lock:
+            items = [(key, {phase: list(stat) for phase, stat in phases.items()})
+                     for key, phases in self._stats.items()]
+
+        result = []
+        for (module, endpoint), phases in items:
+            result.append({
+                'module': module,
+                'endpoint': endpoint,
+                'phases': {
+                    phase: {
+                        'count': phases[phase][0],
+                        'avg_us': round(phases[phase][1] / phases[phase][0] / 1000, 3),
+                        'max_us': round(phases[phase][2] / 1000, 3)
+                    }
+                    for phase in PHASES if phase in phases
+                }
+            })
+        return result
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._stats.clear()
+
+
+# 全局阶段耗时统计实例（每个worker进程独立）
+phase_stats = PhaseStats()
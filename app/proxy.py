@@ -0,0 +1,130 @@
+"""录制代理
+
+配置 MOCKS_PROXY_UPSTREAM（如 http://127.0.0.1:8080）后注册 proxy 蓝图: 没有任何模块匹配的路径
+转发到上游服务，响应原样返回，并像其他请求一样记录到请求日志（模块名为 proxy）。
+录制下来的请求可以通过 /.api/recordings/compile 编译为mock模块（见 app/recordings.py）。
+
+上游连接使用每个进程独立的 keep-alive 连接池（fork出的worker进程会重新创建），
+复用的连接已被上游关闭时自动重试一次。为了让录制的响应体可读，转发时不传递 Accept-Encoding。
+"""
+import http.client
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import Blueprint, Response, jsonify, request
+
+from . import config
+from .metrics import registry
+
+# 不转发的逐跳请求头和响应头（Content-Length由双方各自计算）
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+    'trailers', 'transfer-encoding', 'upgrade', 'host', 'content-length', 'accept-encoding'
+])
+
+# 复用的连接被上游关闭时出现的异常，可以安全地换一个新连接重试
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def forward_headers(headers):
+    """过滤逐跳头后的请求/响应头列表"""
+    return [(name, value) for name, value in headers if name.lower() not in HOP_BY_HOP_HEADERS]
+
+
+class UpstreamPool:
+    """上游服务的 keep-alive 连接池"""
+
+    def __init__(self, base_url, size=10, timeout=30.0):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"上游地址必须是 http(s)://host[:port][/path] 格式: {base_url}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._idle = []
+
+    def _acquire(self):
+        """取出一个空闲连接，没有时新建；返回 (连接, 是否为复用的连接)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork之后不能使用父进程的socket
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop(), True
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout), False
+
+    def _release(self, connection):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, path, headers=None, body=None):
+        """发送请求并读取完整响应
+
+        Returns:
+            tuple: (响应码, 响应头列表, 响应体bytes)
+        """
+        url = self.base_path + path
+        for attempt in range(2):
+            connection, reused = self._acquire()
+            try:
+                connection.request(method, url, body=body, headers=dict(headers or ()))
+                response = connection.getresponse()
+                data = response.read()
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(connection)
+            return response.status, response.getheaders(), data
+
+    def idle(self):
+        """当前进程中的空闲连接数"""
+        return len(self._idle) if self._pid == os.getpid() else 0
+
+
+bp = Blueprint('proxy', __name__)
+
+upstream = UpstreamPool(config.PROXY_UPSTREAM, config.PROXY_POOL_SIZE,
+                        config.PROXY_TIMEOUT) if config.PROXY_UPSTREAM else None
+
+
+@bp.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'])
+def proxy_request(path):
+    """将没有模块匹配的请求转发到上游服务"""
+    target = request.full_path if request.query_string else request.path
+    headers = forward_headers(request.headers.items())
+    headers.append(('X-Forwarded-For', request.remote_addr or ''))
+    start = time.perf_counter()
+    try:
+        status, response_headers, data = upstream.request(request.method, target, headers,
+                                                          request.get_data() or None)
+    except Exception as e:
+        print(f"转发请求到上游服务时出错: {e}")
+        registry.inc('mocks_proxy_requests_total', {'outcome': 'error'})
+        return jsonify({
+            "errCode": 502,
+            "errMsg": f"转发请求到上游服务失败: {e}",
+            "data": None
+        }), 502
+    registry.inc('mocks_proxy_requests_total', {'outcome': 'forwarded'})
+    registry.observe('mocks_proxy_upstream_ms', None, (time.perf_counter() - start) * 1000)
+    return Response(data, status=status, headers=forward_headers(response_headers))
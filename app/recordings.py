@@ -0,0 +1,186 @@
+"""录制回放
+
+把录制代理（app/proxy.py）记录下来的请求编译为普通的mock模块:
+
+    POST /.api/recordings/compile  {"module": "recorded_api"}（需要 MOCKS_RECORDINGS_TOKEN 令牌）
+
+生成 app/modules/<module>/ 目录（__init__.py 和 recordings.json），重启后由模块加载器加载。
+没有记录完整响应体的请求（摘要采集、降级或二进制响应体）不能回放，编译时跳过并计入 uncaptured。
+每个录制的请求按 (方法, 路径, 查询参数) 索引，同一请求录制多次时使用最新的一次；
+查询参数没有完全匹配的录制时返回该方法和路径最新的录制。
+响应在模块加载时预先编码，回放时直接从内存返回，不再访问上游或数据库。
+"""
+import json
+import os
+import re
+
+from flask import Response, abort, request
+
+from .proxy import HOP_BY_HOP_HEADERS
+
+RECORDINGS_FILE = 'recordings.json'
+MODULE_NAME_PATTERN = re.compile(r'^[a-z_][a-z0-9_]*$')
+# 录制的响应头中不回放的部分（由回放时重新生成）
+SKIPPED_RESPONSE_HEADERS = HOP_BY_HOP_HEADERS | {'date', 'server', 'content-encoding'}
+
+# 生成的 __init__.py 不包含任何来自请求的内容: 模块名称取自目录名，来源等元数据保存在 recordings.json 中
+MODULE_TEMPLATE = '''"""录制回放模块（由录制代理的请求日志生成）
+
+录制的响应保存在 recordings.json 中，可以直接编辑；重新编译会覆盖本目录。
+"""
+import os
+
+from flask import Blueprint
+
+from ...recordings import RecordingSet
+
+MODULE_NAME = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+bp = Blueprint(MODULE_NAME, __name__)
+recordings = RecordingSet.load(os.path.join(os.path.dirname(__file__), 'recordings.json'))
+recordings.register(bp)
+
+__all__ = ['bp']
+
+# 模块元数据
+MODULE_VERSION = '1.0.0'
+MODULE_DESCRIPTION = f'录制回放模块（来源: {recordings.source}）'
+MODULE_AUTHOR = '录制代理'
+MODULE_ENABLED = True
+
+MODULE_CONFIG = {}
+'''
+
+
+def recording_key(method, path, args):
+    """录制的索引键: (方法, 路径, 排序后的查询参数)"""
+    return method.upper(), path, tuple(sorted((str(k), str(v)) for k, v in (args or {}).items()))
+
+
+def exchange_from_record(record):
+    """将请求日志记录转换为可回放的录制条目"""
+    headers = {name: value for name, value in (record.get('response_headers') or {}).items()
+               if name.lower() not in SKIPPED_RESPONSE_HEADERS}
+    return {
+        'method': record['method'],
+        'path': record['url'],
+        'args': record.get('request_args') or {},
+        'status': record['status_code'],
+        'headers': headers,
+        'body': record.get('response_data')
+    }
+
+
+def captured_body(record):
+    """录制的响应体是否可以原样回放
+
+    摘要级别采集、降级或二进制响应体都没有记录响应体（response_data 为 None），
+    按文本解码后含有替换字符的响应体也不能还原上游的响应。
+    """
+    body = record.get('response_data')
+    if body is None:
+        return False
+    return not (isinstance(body, str) and '\ufffd' in body)
+
+
+def collect_exchanges(records):
+    """按索引键去重（保留最新的一次），跳过不能注册为路由的路径和没有完整响应体的记录
+
+    Returns:
+        tuple: (录制条目列表, 路径不能注册的条数, 没有完整响应体的条数)
+    """
+    exchanges = {}
+    skipped = 0
+    uncaptured = 0
+    for record in records:
+        path = record.get('url') or ''
+        if not path.startswith('/') or path == '/' or path.startswith('/.') or '<' in path or '>' in path:
+            skipped += 1
+            continue
+        if not captured_body(record):
+            uncaptured += 1
+            continue
+        exchange = exchange_from_record(record)
+        exchanges[recording_key(exchange['method'], exchange['path'], exchange['args'])] = exchange
+    return list(exchanges.values()), skipped, uncaptured
+
+
+def compile_module(module, records, source='proxy', overwrite=False):
+    """把请求日志记录写为 app/modules/<module>/ 下的回放模块
+
+    Returns:
+        dict: 模块目录、录制条数、跳过条数和没有完整响应体的条数
+    """
+    if not MODULE_NAME_PATTERN.match(module or ''):
+        raise ValueError(f"模块名称只能包含小写字母、数字和下划线: {module}")
+    if not MODULE_NAME_PATTERN.match(source or ''):
+        raise ValueError(f"录制来源必须是模块名称: {source}")
+    directory = os.path.join(os.path.dirname(__file__), 'modules', module)
+    recordings_path = os.path.join(directory, RECORDINGS_FILE)
+    if os.path.exists(directory) and not (overwrite and os.path.exists(recordings_path)):
+        raise ValueError(f"模块目录已存在: {module}（只能覆盖之前生成的回放模块，需要指定 overwrite）")
+
+    exchanges, skipped, uncaptured = collect_exchanges(records)
+    os.makedirs(directory, exist_ok=True)
+    with open(recordings_path, 'w', encoding='utf-8') as f:
+        json.dump({'source': source, 'exchanges': exchanges}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(directory, '__init__.py'), 'w', encoding='utf-8') as f:
+        f.write(MODULE_TEMPLATE)
+    return {'module': module, 'directory': directory, 'exchanges': len(exchanges),
+            'skipped': skipped, 'uncaptured': uncaptured}
+
+
+class RecordingSet:
+    """内存中的录制索引，响应体在加载时预先编码"""
+
+    def __init__(self, exchanges, source='proxy'):
+        self.source = source
+        self.exact = {}
+        self.latest = {}
+        self.paths = {}
+        for exchange in exchanges:
+            prepared = self._prepare(exchange)
+            method, path = exchange['method'].upper(), exchange['path']
+            self.exact[recording_key(method, path, exchange.get('args'))] = prepared
+            self.latest[(method, path)] = prepared
+            self.paths.setdefault(path, set()).add(method)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('exchanges') or [], data.get('source') or 'proxy')
+
+    @staticmethod
+    def _prepare(exchange):
+        body = exchange.get('body')
+        headers = dict(exchange.get('headers') or {})
+        if body is None:
+            data = b''
+        elif isinstance(body, str):
+            data = body.encode('utf-8')
+        else:
+            # 录制时解析为JSON的响应体重新编码
+            data = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+        return exchange.get('status', 200), list(headers.items()), data
+
+    def lookup(self, method, path, args):
+        """查找录制的响应: 先按查询参数完全匹配，再退回该方法和路径最新的录制"""
+        prepared = self.exact.get(recording_key(method, path, args))
+        if prepared is None:
+            prepared = self.latest.get((method.upper(), path))
+        return prepared
+
+    def view(self, **kwargs):
+        """回放视图: 所有录制的路由共用"""
+        prepared = self.lookup(request.method, request.path, request.args.to_dict())
+        if prepared is None:
+            abort(404)
+        status, headers, data = prepared
+        return Response(data, status=status, headers=headers)
+
+    def register(self, bp):
+        """为每个录制的路径注册路由"""
+        for index, (path, methods) in enumerate(sorted(self.paths.items())):
+            bp.add_url_rule(path, endpoint=f'recording_{index}', view_func=self.view, methods=sorted(methods))
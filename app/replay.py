@@ -0,0 +1,332 @@
+"""请求回放模块
+
+读取请求日志中记录的请求，按配置的并发、速率和时间压缩比重新发送到目标服务，
+并统计吞吐量和延迟分位数。目标可以是远程HTTP服务，也可以是进程内的Flask应用。
+"""
+import asyncio
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from .storage import get_storage
+
+# 回放时不转发的请求头（由目标连接重新生成）
+SKIPPED_HEADERS = {
+    'host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding',
+    'proxy-connection', 'upgrade', 'te', 'trailer', 'accept-encoding'
+}
+
+
+class ReplayRequest:
+    """一条待回放的请求"""
+    __slots__ = ('method', 'path', 'headers', 'body', 'timestamp')
+
+    def __init__(self, method, path, headers, body, timestamp):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_log(cls, log):
+        """根据日志记录构造回放请求"""
+        path = log.get('url') or '/'
+        if log.get('request_args'):
+            path += '?' + urlencode(log['request_args'])
+
+        headers = {k: v for k, v in (log.get('request_headers') or {}).items()
+                   if k.lower() not in SKIPPED_HEADERS}
+
+        body = None
+        if log.get('request_json') is not None:
+            body = json.dumps(log['request_json'], ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif log.get('request_form'):
+            body = urlencode(log['request_form']).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+
+        try:
+            timestamp = float(log.get('timestamp'))
+        except (TypeError, ValueError):
+            timestamp = None
+
+        return cls(log.get('method') or 'GET', path, headers, body, timestamp)
+
+
+def load_replay_requests(start_time=None, end_time=None, modules=None, status_code=None, limit=None):
+    """从请求日志中按条件读取待回放请求（按记录顺序）"""
+    for index, log in enumerate(get_storage().iter(start_time=start_time, end_time=end_time,
+                                                          modules=modules, status_code=status_code)):
+        if limit is not None and index >= limit:
+            return
+        yield ReplayRequest.from_log(log)
+
+
+class HttpTarget:
+    """通过 HTTP/1.1 长连接发送请求的远程目标，每个线程复用一个连接"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def send(self, req):
+        """发送请求并返回响应状态码"""
+        conn = self._connection()
+        try:
+            conn.request(req.method, self.prefix + req.path, body=req.body, headers=req.headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except Exception:
+            # 连接异常时丢弃该连接，下次请求重新建立
+            conn.close()
+            self._local.conn = None
+            raise
+
+    async def send_async(self, req, state):
+        """在事件循环中发送请求，state 保存该协程独占的连接"""
+        if state.get('writer') is None:
+            if self.scheme == 'https':
+                state['reader'], state['writer'] = await asyncio.open_connection(self.host, self.port or 443, ssl=True)
+            else:
+                state['reader'], state['writer'] = await asyncio.open_connection(self.host, self.port or 80)
+        reader, writer = state['reader'], state['writer']
+
+        body = req.body or b''
+        lines = [f'{req.method} {self.prefix + req.path} HTTP/1.1', f'Host: {self.host}']
+        lines.extend(f'{k}: {v}' for k, v in req.headers.items())
+        lines.append(f'Content-Length: {len(body)}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+
+        try:
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                while True:
+                    size = int((await reader.readline()).split(b';')[0], 16)
+                    await reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+            elif 'content-length' in headers:
+                await reader.readexactly(int(headers['content-length']))
+
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+                state['writer'] = None
+            return status
+        except Exception:
+            writer.close()
+            state['writer'] = None
+            raise
+
+
+class FlaskTarget:
+    """进程内的Flask应用目标，通过测试客户端发送请求，不经过网络"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, req):
+        """发送请求并返回响应状态码"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(req.path, method=req.method, headers=req.headers, data=req.body)
+        # 消费响应体，确保流式响应也计入耗时
+        for _ in response.response:
+            pass
+        response.close()
+        return response.status_code
+
+    async def send_async(self, req, state):
+        """进程内应用没有异步接口，放到线程池中执行"""
+        return await asyncio.to_thread(self.send, req)
+
+
+def percentile(sorted_values, pct):
+    """计算已排序序列的分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+class ReplayStats:
+    """回放统计信息"""
+
+    def __init__(self):
+        self.latencies = []
+        self.status_counts = {}
+        self.errors = 0
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms, status):
+        with self.lock:
+            if status is None:
+                self.errors += 1
+            else:
+                self.latencies.append(latency_ms)
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def report(self):
+        """生成统计报告"""
+        latencies = sorted(self.latencies)
+        duration = (self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+        total = len(latencies) + self.errors
+        return {
+            'requests': total,
+            'errors': self.errors,
+            'duration_s': round(duration, 3),
+            'throughput_rps': round(total / duration, 2) if duration > 0 else None,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                'p50': _round(percentile(latencies, 50)),
+                'p90': _round(percentile(latencies, 90)),
+                'p99': _round(percentile(latencies, 99)),
+                'max': _round(latencies[-1] if latencies else None)
+            },
+            'status_codes': {str(k): v for k, v in sorted(self.status_counts.items())}
+        }
+
+
+class ReplaySchedule:
+    """计算每条请求的计划发送时间（相对回放开始的秒数）
+
+    - speed: 时间压缩比，按原始请求间隔除以 speed 回放
+    - rate: 固定速率（每秒请求数）
+    两者都未设置时尽可能快地发送。
+    """
+
+    def __init__(self, requests, rate=None, speed=None):
+        self._iter = iter(requests)
+        self.rate = rate
+        self.speed = speed
+        self._index = 0
+        self._first_ts = None
+        self._lock = threading.Lock()
+
+    def next(self):
+        """取出下一条请求及其计划时间，没有更多请求时返回None"""
+        with self._lock:
+            try:
+                req = next(self._iter)
+            except StopIteration:
+                return None
+            index = self._index
+            self._index += 1
+
+            if self.speed and req.timestamp is not None:
+                if self._first_ts is None:
+                    self._first_ts = req.timestamp
+                return req, max(req.timestamp - self._first_ts, 0) / self.speed
+            if self.rate:
+                return req, index / self.rate
+            return req, 0
+
+
+def _run_threaded(schedule, target, stats, concurrency):
+    def worker():
+        while True:
+            item = schedule.next()
+            if item is None:
+                return
+            req, due = item
+            delay = stats.started_at + due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            start = time.perf_counter()
+            try:
+                status = target.send(req)
+            except Exception:
+                status = None
+            stats.record((time.perf_counter() - start) * 1000, status)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+async def _run_asyncio(schedule, target, stats, concurrency):
+    async def worker():
+        state = {}
+        while True:
+            item = schedule.next()
+            if item is None:
+                break
+            req, due = item
+            delay = stats.started_at + due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = time.perf_counter()
+            try:
+                status = await target.send_async(req, state)
+            except Exception:
+                status = None
+            stats.record((time.perf_counter() - start) * 1000, status)
+        if state.get('writer') is not None:
+            state['writer'].close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def replay(requests, target, concurrency=4, mode='thread', rate=None, speed=None):
+    """回放请求并返回统计报告
+
+    Args:
+        requests: ReplayRequest 可迭代对象
+        target: HttpTarget 或 FlaskTarget
+        concurrency: 并发数（线程数或协程数）
+        mode: 'thread' 使用线程池，'asyncio' 使用事件循环
+        rate: 固定发送速率（每秒请求数，可选）
+        speed: 时间压缩比，按原始时间间隔的 1/speed 回放（可选）
+
+    Returns:
+        dict: 吞吐量和延迟分位数统计
+    """
+    schedule = ReplaySchedule(requests, rate=rate, speed=speed)
+    stats = ReplayStats()
+    stats.started_at = time.perf_counter()
+
+    if mode == 'asyncio':
+        asyncio.run(_run_asyncio(schedule, target, stats, concurrency))
+    elif mode == 'thread':
+        _run_threaded(schedule, target, stats, concurrency)
+    else:
+        raise ValueError(f"不支持的并发模式: {mode}")
+
+    stats.finished_at = time.perf_counter()
+    return stats.report()
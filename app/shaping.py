@@ -0,0 +1,354 @@
+"""响应延迟与带宽整形
+
+按路由声明延迟分布和带宽上限，模拟慢速上游，模块不再需要在视图中 time.sleep:
+
+    # 环境变量（JSON数组），或模块 MODULE_CONFIG['shaping'] 中的规则列表
+    MOCKS_SHAPING_RULES='[{"path": "/example/data", "latency": {"type": "normal", "mean": 200, "stddev": 50},
+                           "bandwidth": "64k"}]'
+
+    # 或直接装饰视图
+    @bp.route('/slow')
+    @shape(latency={'type': 'percentiles', 'p50': 120, 'p90': 300, 'p99': 900})
+    def slow(): ...
+
+延迟分布:
+    数字 / {"type": "fixed", "ms": 100}        固定延迟
+    {"type": "uniform", "min": 50, "max": 150}  均匀分布
+    {"type": "normal", "mean": 100, "stddev": 20, "min": 0}  正态分布（不低于min）
+    {"type": "percentiles", "p50": 100, "p90": 250, "p99": 800, "min": 50, "max": 1500}
+                                                按分位数表分段线性插值
+    {"type": "replay", "window": 3600}          从已记录日志的 process_time 分位数（延迟分析统计）回放，
+                                                默认使用同一模块、同一路由的记录，可用 module/route 指定
+带宽: 每秒字节数，可写作 65536、"64k"、"1m"。
+
+延迟和限速在WSGI服务器发送响应体时执行（视图和日志记录不等待），休眠使用 time.sleep:
+在 gunicorn 的 gevent worker（MOCKS_WORKER_CLASS=gevent 或 -k gevent，time 模块已被 monkey patch）下
+休眠是协作式的，一个worker可以同时保持数千个慢速连接。
+ASGI模式（app/asgi.py）下响应体由事件循环发送，使用 asyncio.sleep 休眠（ShapedBody.apace）。
+
+gunicorn同步worker每次只处理一个请求，延迟期间整个worker被占用，因此配置了整形规则时拒绝在同步worker中启动
+（设置 MOCKS_SHAPING_ALLOW_BLOCKING=1 可以强制启动）。只配置了 MOCKS_SHAPING_RULES 而没有设置
+MOCKS_WORKER_CLASS 时，gunicorn.conf.py 默认使用gevent worker。
+"""
+import asyncio
+import bisect
+import copy
+import random
+import sys
+import threading
+import time
+
+from . import config
+from .capture import RequestRule, load_env_rules, load_module_configs
+from .metrics import registry
+
+# 限速时每次发送的最小字节数
+MIN_SLICE_BYTES = 1024
+# 回放延迟分布的统计缓存时间（秒）
+REPLAY_REFRESH_SECONDS = 60
+
+_rng = random.Random()
+
+
+def parse_bandwidth(value):
+    """解析带宽（每秒字节数），支持 k/m 后缀"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    text = str(value).strip().lower().replace('/s', '').rstrip('b')
+    multiplier = 1
+    if text.endswith('k'):
+        multiplier, text = 1024, text[:-1]
+    elif text.endswith('m'):
+        multiplier, text = 1024 * 1024, text[:-1]
+    rate = float(text) * multiplier
+    return rate if rate > 0 else None
+
+
+def percentile_sampler(points, minimum=None, maximum=None):
+    """按分位数表 [(分位数, 毫秒)] 构造分段线性插值的采样函数"""
+    points = sorted((float(p), float(v)) for p, v in points)
+    if not points:
+        return lambda: 0.0
+    if points[0][0] > 0:
+        points.insert(0, (0.0, points[0][1] / 2 if minimum is None else float(minimum)))
+    if points[-1][0] < 100:
+        points.append((100.0, points[-1][1] if maximum is None else float(maximum)))
+    percentiles = [p for p, _ in points]
+
+    def sample():
+        u = _rng.uniform(0, 100)
+        index = min(max(bisect.bisect_left(percentiles, u), 1), len(points) - 1)
+        (p0, v0), (p1, v1) = points[index - 1], points[index]
+        return v0 if p1 == p0 else v0 + (v1 - v0) * (u - p0) / (p1 - p0)
+    return sample
+
+
+def _percentile_points(spec):
+    points = []
+    for key, value in spec.items():
+        if isinstance(key, str) and key.startswith('p') and value is not None:
+            try:
+                points.append((float(key[1:]), value))
+            except ValueError:
+                continue
+    return points
+
+
+class ReplayLatency:
+    """从已记录请求的延迟分位数回放（使用存储后端的延迟分析统计，定期刷新）"""
+
+    def __init__(self, window=3600, module=None, route=None):
+        self.window = window
+        self.module = module
+        self.route = route
+        self._sampler = None
+        self._refreshed = 0.0
+        self._lock = threading.Lock()
+
+    def bind(self, module, route):
+        """规则未指定模块/路由时使用所在端点的模块和路由"""
+        return ReplayLatency(self.window, self.module or module, self.route or route)
+
+    def _refresh(self):
+        from .storage import get_storage
+        now = time.time()
+        sampler = None
+        try:
+            result = get_storage().analytics(start_time=now - self.window, end_time=now,
+                                             group_by=['module', 'route'],
+                                             modules=[self.module] if self.module else None)
+            for group in result.get('groups', []):
+                if self.route is None or group.get('route') == self.route:
+                    if group.get('p50_ms') is not None:
+                        sampler = percentile_sampler(
+                            [(50, group['p50_ms']), (90, group['p90_ms']), (99, group['p99_ms'])],
+                            maximum=group.get('max_ms'))
+                    break
+        except Exception as e:
+            print(f"读取回放延迟统计时出错: {e}")
+        self._sampler = sampler
+        self._refreshed = now
+
+    def __call__(self):
+        if time.time() - self._refreshed >= REPLAY_REFRESH_SECONDS:
+            with self._lock:
+                if time.time() - self._refreshed >= REPLAY_REFRESH_SECONDS:
+                    self._refresh()
+        return self._sampler() if self._sampler is not None else 0.0
+
+
+def compile_latency(spec):
+    """将延迟定义编译为返回毫秒数的采样函数"""
+    if spec is None:
+        return None
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind = spec.get('type', 'fixed')
+    if kind == 'fixed':
+        value = float(spec.get('ms', 0))
+        return lambda: value
+    if kind == 'uniform':
+        low, high = float(spec.get('min', 0)), float(spec['max'])
+        return lambda: _rng.uniform(low, high)
+    if kind == 'normal':
+        mean, stddev, low = float(spec['mean']), float(spec.get('stddev', 0)), float(spec.get('min', 0))
+        return lambda: max(_rng.gauss(mean, stddev), low)
+    if kind == 'percentiles':
+        return percentile_sampler(_percentile_points(spec), spec.get('min'), spec.get('max'))
+    if kind == 'replay':
+        return ReplayLatency(spec.get('window', 3600), spec.get('module'), spec.get('route'))
+    raise ValueError(f"不支持的延迟分布类型: {kind}")
+
+
+class ShapingRule(RequestRule):
+    """编译后的单条整形规则"""
+
+    __slots__ = ('latency', 'bandwidth')
+
+    def __init__(self, spec, source='config', module=None):
+        super().__init__(spec, source, module)
+        self.latency = compile_latency(spec.get('latency'))
+        self.bandwidth = parse_bandwidth(spec.get('bandwidth'))
+
+    def bind(self, module, route):
+        """回放延迟绑定到端点的模块和路由"""
+        if isinstance(self.latency, ReplayLatency):
+            bound = copy.copy(self)
+            bound.latency = self.latency.bind(module, route)
+            return bound
+        return self
+
+
+class ShapedBody:
+    """延迟后按带宽上限分片产出响应体"""
+
+    active = 0
+    _lock = threading.Lock()
+
+    def __init__(self, iterable, delay_ms=0.0, bandwidth=None):
+        self.iterable = iterable
+        self.delay_ms = delay_ms
+        self.bandwidth = bandwidth
+
+    @classmethod
+    def _track(cls, delta):
+        with cls._lock:
+            cls.active += delta
+
+    def _slices(self, chunk):
+        data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        slice_bytes = max(int(self.bandwidth / 10), MIN_SLICE_BYTES)
+        for offset in range(0, len(data), slice_bytes):
+            yield data[offset:offset + slice_bytes]
+
+    def __iter__(self):
+        self._track(1)
+        try:
+            if self.delay_ms > 0:
+                time.sleep(self.delay_ms / 1000.0)
+            if not self.bandwidth:
+                yield from self.iterable
+                return
+            start = time.monotonic()
+            sent = 0
+            for chunk in self.iterable:
+                for piece in self._slices(chunk):
+                    sent += len(piece)
+                    wait = start + sent / self.bandwidth - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    yield piece
+        finally:
+            self._track(-1)
+
+    async def apace(self, chunks):
+        """异步版本（ASGI模式）: chunks 为内部响应体的异步迭代器，使用 asyncio.sleep 休眠"""
+        self._track(1)
+        try:
+            if self.delay_ms > 0:
+                await asyncio.sleep(self.delay_ms / 1000.0)
+            start = time.monotonic()
+            sent = 0
+            async for chunk in chunks:
+                if not self.bandwidth:
+                    yield chunk
+                    continue
+                for piece in self._slices(chunk):
+                    sent += len(piece)
+                    wait = start + sent / self.bandwidth - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    yield piece
+        finally:
+            self._track(-1)
+
+    def close(self):
+        close = getattr(self.iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+def shape(latency=None, bandwidth=None):
+    """视图装饰器: 声明该路由的延迟分布和带宽上限"""
+    def decorator(view):
+        view.shaping = {'latency': latency, 'bandwidth': bandwidth}
+        return view
+    return decorator
+
+
+def is_cooperative():
+    """休眠是否为协作式（gevent已patch time模块）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('time')
+
+
+def is_blocking_worker():
+    """是否运行在gunicorn的同步worker中（主进程只导入所配置的worker类的模块）"""
+    return 'gunicorn.workers.sync' in sys.modules and not is_cooperative()
+
+
+class ShapingPolicy:
+    """响应整形策略，启动时调用 compile(app) 按端点预编译"""
+
+    def __init__(self):
+        self.rules = []
+        self._plans = {}
+
+    def load(self, env_rules=None, module_configs=None):
+        """加载规则: 环境变量中的规则优先，其次为各模块 MODULE_CONFIG['shaping'] 中的规则"""
+        rules = [ShapingRule(spec, 'env') for spec in env_rules or []]
+        for blueprint, specs in (module_configs or {}).items():
+            rules.extend(ShapingRule(spec, blueprint, module=blueprint) for spec in specs or [])
+        self.rules = rules
+        self._plans = {}
+
+    def compile(self, app):
+        """为每个端点预计算候选规则，视图上的 @shape 声明排在最后"""
+        plans = {}
+        for url_rule in app.url_map.iter_rules():
+            blueprint = url_rule.endpoint.rpartition('.')[0] or None
+            if blueprint == 'base':
+                continue
+            methods = frozenset(url_rule.methods or ()) - {'HEAD', 'OPTIONS'} or None
+            candidates = []
+            for rule in self.rules:
+                matched = rule.static_match(blueprint, url_rule.rule, methods)
+                if matched is False:
+                    continue
+                candidates.append(rule.bind(blueprint, url_rule.rule))
+                if matched is True:
+                    break
+            else:
+                declared = getattr(app.view_functions.get(url_rule.endpoint), 'shaping', None)
+                if declared:
+                    candidates.append(ShapingRule(declared, 'view').bind(blueprint, url_rule.rule))
+            if candidates:
+                plans[url_rule.endpoint] = tuple(candidates)
+        self._plans = plans
+        if plans and is_blocking_worker() and not config.SHAPING_ALLOW_BLOCKING:
+            raise RuntimeError(
+                "已配置响应整形规则，但gunicorn使用同步worker: 每个延迟中的请求会占用整个worker。"
+                "请设置 MOCKS_WORKER_CLASS=gevent 或 asgi（见 gunicorn.conf.py），"
+                "或设置 MOCKS_SHAPING_ALLOW_BLOCKING=1 强制启动")
+        if plans and not is_cooperative():
+            print("响应整形的延迟期间会占用处理该请求的线程，大量慢速连接请设置 MOCKS_WORKER_CLASS=gevent（见 gunicorn.conf.py）或使用ASGI模式（asgi.py）")
+        return plans
+
+    def select(self, request):
+        """当前请求命中的整形规则"""
+        for rule in self._plans.get(request.endpoint, ()):
+            if rule.request_match(request.method, request.path, request.headers):
+                return rule
+        return None
+
+    def apply(self, request, response):
+        """按命中的规则包装响应体"""
+        if not self._plans:
+            return response
+        rule = self.select(request)
+        if rule is None:
+            return response
+        delay_ms = rule.latency() if rule.latency is not None else 0.0
+        response.response = ShapedBody(response.response, delay_ms, rule.bandwidth)
+        registry.inc('mocks_shaped_total', {'module': request.blueprint or ''})
+        registry.observe('mocks_shaping_delay_ms', None, delay_ms)
+        return response
+
+
+def init_shaping_policy(app, registered_modules):
+    """加载并编译响应整形策略（在所有蓝图注册之后调用）"""
+    shaping_policy.load(load_env_rules(config.SHAPING_RULES, 'MOCKS_SHAPING_RULES'),
+                        load_module_configs(registered_modules, 'shaping'))
+    shaping_policy.compile(app)
+    return shaping_policy
+
+
+# 全局响应整形策略
+shaping_policy = ShapingPolicy()
+
+registry.register_gauge('mocks_shaping_active', lambda: ShapedBody.active)
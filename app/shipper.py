@@ -0,0 +1,292 @@
+"""请求日志集中收集
+
+多个mock节点各自有 requests.db 和控制台，查找一个请求需要逐个节点查看。
+配置 MOCKS_COLLECTOR_URL 后，节点把采集到的日志行同时发送到收集端，在收集端的控制台中统一查询:
+
+- 发送端: 拦截器把序列化好的日志行放入内存队列（与本地写入互不影响），每个worker一个后台线程
+  凑够 MOCKS_SHIP_BATCH_SIZE 条或等待 MOCKS_SHIP_FLUSH_INTERVAL 秒后，把一批日志编码为NDJSON、
+  gzip压缩后 POST 到收集端的 /.api/ingest，使用 keep-alive 连接。
+- 收集端返回5xx/429或连接失败时按指数退避（遵循 Retry-After）重发同一批，期间新日志在队列中积压，
+  队列满（MOCKS_SHIP_QUEUE_SIZE）后丢弃并计数，请求线程从不等待发送。一批日志重发超过
+  MOCKS_SHIP_RETRY_TIMEOUT 秒后放弃，计为被拒绝，避免一个无法写入的批次永远阻塞发送。
+- 收集端校验每行各列的类型，格式错误的批次返回400，发送端不重发。
+- 收集端（MOCKS_COLLECTOR=1）解压后在一个事务中批量写入，按 (节点, 原始id) 的唯一索引跳过已存在的行，
+  重发的批次不会重复。每条日志的 node 列记录产生它的节点（MOCKS_NODE_NAME）。
+- 各节点需配置不同的 MOCKS_NODE_ID 以保证id不冲突，未显式配置时不发送（收集端仍会保留id冲突的日志，
+  但为其分配新的id，详情链接与产生节点上的不一致）。
+
+收集端必须配置 MOCKS_COLLECTOR_TOKEN（未配置时拒绝所有日志），发送端携带相同的令牌。
+"""
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+
+from . import config
+from .database import ROW_COLUMNS, ROW_INDEX, TIMING_COLUMNS
+from .ids import NODE_ID_CONFIGURED
+from .metrics import registry
+from .proxy import UpstreamPool
+from .storage.base import encode_row, ensure_row_id
+
+INGEST_PATH = '/.api/ingest'
+# 重发的初始等待和最长等待（秒）
+RETRY_INITIAL = 0.5
+RETRY_MAX = 30.0
+# 收集端返回这些响应码时重发，其他4xx说明请求本身有问题，重发也不会成功
+RETRY_STATUS = frozenset([408, 429])
+
+NODE_INDEX = ROW_INDEX['node']
+
+# 收到的日志行按列校验类型，其余列为文本；类型不对的行整批拒绝（400），不会让收集端写入失败后被无限重发
+INTEGER_COLUMNS = ('id', 'status_code')
+NUMBER_COLUMNS = ('process_time', 'timestamp') + tuple(TIMING_COLUMNS)
+REQUIRED_COLUMNS = ('method', 'url', 'timestamp')
+# SQLite整数的上限
+MAX_ROW_ID = 2 ** 63 - 1
+
+
+def encode_batch(rows):
+    """日志行编码为gzip压缩的NDJSON"""
+    text = '\n'.join(encode_row(row) for row in rows) + '\n'
+    return gzip.compress(text.encode('utf-8'), compresslevel=6)
+
+
+def check_row(row):
+    """校验一条日志行各列的类型
+
+    Raises:
+        ValueError: 列的类型不正确或缺少必填列
+    """
+    for name in REQUIRED_COLUMNS:
+        if row[ROW_INDEX[name]] is None:
+            raise ValueError(f"缺少 {name} 列")
+    for name, value in zip(ROW_COLUMNS, row):
+        if value is None:
+            continue
+        if name in INTEGER_COLUMNS:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+            if valid and name == 'id':
+                valid = 0 < value <= MAX_ROW_ID
+        elif name in NUMBER_COLUMNS:
+            valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            # 旧版本的时间戳可能是文本
+            valid = valid or (name == 'timestamp' and isinstance(value, str))
+        else:
+            valid = isinstance(value, str)
+        if not valid:
+            raise ValueError(f"{name} 列的值类型不正确: {value!r:.50}")
+
+
+def decode_batch(data, content_encoding=None, node=None):
+    """解析发送端的一批日志，补齐旧版本缺少的列，没有节点名称的行使用node
+
+    Raises:
+        ValueError: 数据无法解压、解析，或日志行的列类型不正确
+    """
+    if content_encoding == 'gzip':
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError) as e:
+            raise ValueError(f"无法解压日志数据: {e}")
+    width = len(ROW_COLUMNS)
+    rows = []
+    try:
+        lines = data.decode('utf-8').splitlines()
+    except UnicodeDecodeError as e:
+        raise ValueError(f"日志数据不是UTF-8编码: {e}")
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if not isinstance(row, list) or not row:
+            raise ValueError("每行日志必须是非空的JSON数组")
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        try:
+            check_row(row)
+        except ValueError as e:
+            raise ValueError(f"第{number}行: {e}")
+        if node and not row[NODE_INDEX]:
+            row = row[:NODE_INDEX] + (node,) + row[NODE_INDEX + 1:]
+        rows.append(ensure_row_id(row))
+    return rows
+
+
+class LogShipper:
+    """分批压缩发送日志到收集端（每个进程一个后台线程）"""
+
+    def __init__(self, url, batch_size=500, flush_interval=1.0, max_queue=50000, timeout=10.0, token='',
+                 retry_timeout=300.0):
+        self.url = url
+        self.retry_timeout = retry_timeout
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.token = token
+        self.pool = UpstreamPool(url, 1, timeout) if url else None
+        self.submitted = 0
+        self.shipped = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.retries = 0
+        self.batches = 0
+        self.last_batch_ms = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    @property
+    def enabled(self):
+        return self.pool is not None
+
+    def _ensure_started(self):
+        """在当前进程中启动发送线程（fork出的worker进程会重新创建队列和线程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._run, name='log-shipper', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, row):
+        """提交一条已序列化的日志行，积压超过上限时丢弃并返回False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            registry.inc('mocks_ship_records_total', {'outcome': 'dropped'})
+            return False
+        self.submitted += 1
+        return True
+
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def flush(self, timeout=5.0):
+        """等待队列中的日志全部发送（收集端不可用时最多等待timeout秒）"""
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def _run(self):
+        work_queue = self._queue
+        while True:
+            batch = [work_queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(work_queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(work_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._ship(batch)
+            except Exception as e:
+                print(f"发送请求日志到收集端时出错: {e}")
+            finally:
+                for _ in batch:
+                    work_queue.task_done()
+
+    def _ship(self, batch):
+        """发送一批日志，失败时退避重发，直到成功、被收集端拒绝或重发超过 retry_timeout 秒"""
+        body = encode_batch(batch)
+        headers = {
+            'Content-Type': 'application/x-ndjson',
+            'Content-Encoding': 'gzip',
+            'X-Mocks-Node': config.NODE_NAME
+        }
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        delay = RETRY_INITIAL
+        started = time.monotonic()
+        while True:
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                status, response_headers, data = self.pool.request('POST', INGEST_PATH, headers, body)
+            except Exception as e:
+                status = None
+                self.last_error = str(e)
+            else:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if status < 300:
+                    self.batches += 1
+                    self.shipped += len(batch)
+                    self.last_batch_ms = elapsed_ms
+                    registry.inc('mocks_ship_records_total', {'outcome': 'shipped'}, len(batch))
+                    registry.observe('mocks_ship_batch_ms', None, elapsed_ms)
+                    return
+                self.last_error = f'HTTP {status}: {data[:200].decode("utf-8", "replace")}'
+                if status < 500 and status not in RETRY_STATUS:
+                    self._reject(batch, f"收集端拒绝了 {len(batch)} 条请求日志: {self.last_error}")
+                    return
+                retry_after = dict((name.lower(), value) for name, value in response_headers).get('retry-after')
+            try:
+                wait = min(float(retry_after) if retry_after else delay, RETRY_MAX)
+            except ValueError:
+                wait = delay
+            if time.monotonic() - started + wait > self.retry_timeout:
+                # 一直发送失败的批次不能永远阻塞后面的日志
+                self._reject(batch, f"{self.retry_timeout}秒内未能发送 {len(batch)} 条请求日志，放弃该批: {self.last_error}")
+                return
+            self.retries += 1
+            registry.inc('mocks_ship_retries_total')
+            time.sleep(wait)
+            delay = min(delay * 2, RETRY_MAX)
+
+    def _reject(self, batch, message):
+        print(message)
+        self.rejected += len(batch)
+        registry.inc('mocks_ship_records_total', {'outcome': 'rejected'}, len(batch))
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'queue_depth': self.depth(),
+            'submitted': self.submitted,
+            'shipped': self.shipped,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'retries': self.retries,
+            'batches': self.batches,
+            'last_batch_ms': round(self.last_batch_ms, 3) if self.last_batch_ms is not None else None,
+            'last_error': self.last_error
+        }
+
+
+def collector_url():
+    """发送日志的收集端地址，未显式配置 MOCKS_NODE_ID 时拒绝发送"""
+    if config.COLLECTOR_URL and not NODE_ID_CONFIGURED:
+        print("未配置 MOCKS_NODE_ID，不发送日志到收集端: 各节点需要配置不同的节点ID（0-31），否则请求ID会冲突")
+        return ''
+    return config.COLLECTOR_URL
+
+
+# 全局发送器（未配置 MOCKS_COLLECTOR_URL 或 MOCKS_NODE_ID 时不启用）
+log_shipper = LogShipper(collector_url(), config.SHIP_BATCH_SIZE, config.SHIP_FLUSH_INTERVAL,
+                         config.SHIP_QUEUE_SIZE, config.SHIP_TIMEOUT, config.COLLECTOR_TOKEN,
+                         config.SHIP_RETRY_TIMEOUT)
+
+if log_shipper.enabled:
+    registry.register_gauge('mocks_ship_queue_depth', log_shipper.depth)
+    # 进程正常退出时尽量发送完队列中的日志
+    atexit.register(log_shipper.flush)
@@ -0,0 +1,241 @@
+"""日志查询的只读快照
+
+日志列表、总数和模块列表（控制台的翻页、筛选、计数）是扫描量最大的查询，直接在 requests.db 上执行时
+与后台写入器共用连接池和数据库文件的锁。配置 MOCKS_SNAPSHOT_INTERVAL 后这些查询改为读取快照:
+
+- 快照文件由 SQLite 在线备份API从 requests.db 复制而来，先写入临时文件再原子替换，
+  文件修改时间即为快照时间。各worker的后台线程在快照超过刷新间隔时尝试刷新，
+  通过文件锁保证同一时刻只有一个进程在复制，其他进程直接使用新文件。
+- 快照文件不再被修改，查询以 immutable 只读方式打开（不加锁、不读WAL），
+  每个线程一个连接，发现文件被替换后重新打开。
+- 快照之后写入的日志（实时尾部）由每个worker在内存中保留最近 MOCKS_SNAPSHOT_TAIL_SIZE 条，
+  列表、总数和模块列表把尾部中id大于快照最大id的记录合并在快照结果之前。
+  尾部只包含本worker写入的日志，其他worker的日志在下一次刷新后出现。
+
+查询结果附带 freshness（快照时间、快照年龄、合并的尾部条数），控制台据此提示数据的新鲜度。
+"""
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+from . import config, database
+from .metrics import registry
+from .storage.base import ID_INDEX, row_in_range, row_matches, row_to_record
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LiveTail:
+    """当前worker最近写入的日志行"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._rows = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def extend(self, rows):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork出的worker不继承主进程的尾部
+                self._rows = collections.deque(maxlen=self.capacity)
+                self._pid = os.getpid()
+            self._rows.extend(row for row in rows if row[ID_INDEX] is not None)
+
+    def rows_after(self, row_id):
+        """id大于row_id的日志行，按id倒序"""
+        with self._lock:
+            rows = [row for row in self._rows if row_id is None or row[ID_INDEX] > row_id]
+        rows.sort(key=lambda row: row[ID_INDEX], reverse=True)
+        return rows
+
+    def discard_range(self, start_time=None, end_time=None):
+        with self._lock:
+            kept = [row for row in self._rows if not row_in_range(row, start_time, end_time)]
+            self._rows = collections.deque(kept, maxlen=self.capacity)
+
+
+class DashboardSnapshot:
+    """定期刷新的 requests.db 只读快照，加上本worker的实时尾部"""
+
+    def __init__(self, db_path=None, path=None, interval=None, tail_size=None):
+        self.db_path = db_path or database.DB_PATH
+        self.path = path or config.SNAPSHOT_PATH or self.db_path + '.snapshot'
+        self.interval = config.SNAPSHOT_INTERVAL if interval is None else interval
+        self.tail = LiveTail(tail_size or config.SNAPSHOT_TAIL_SIZE)
+        self.refreshes = 0
+        self.last_refresh_ms = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._wakeup = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def _ensure_started(self):
+        """在当前进程中启动刷新线程（fork出的worker重新创建）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._run, name='snapshot-refresher', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(min(self.interval, 1.0))
+            forced = self._wakeup.is_set()
+            self._wakeup.clear()
+            age = self.age()
+            if forced or age is None or age >= self.interval:
+                self.refresh(force=forced)
+
+    def request_refresh(self):
+        """在后台尽快刷新快照（如删除日志之后）"""
+        if self.enabled:
+            self._ensure_started()
+            self._wakeup.set()
+
+    def snapshot_time(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def age(self):
+        snapshot_time = self.snapshot_time()
+        return None if snapshot_time is None else max(time.time() - snapshot_time, 0.0)
+
+    def refresh(self, force=False, blocking=False):
+        """复制 requests.db 并原子替换快照文件，其他进程正在刷新时返回False"""
+        with open(self.path + '.lock', 'a+b') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            # 等锁期间其他进程可能已经完成刷新
+            age = self.age()
+            if not force and age is not None and age < self.interval:
+                return True
+            temp_path = f'{self.path}.{os.getpid()}.tmp'
+            started = time.time()
+            start = time.perf_counter()
+            try:
+                source = sqlite3.connect(self.db_path, timeout=10)
+                target = sqlite3.connect(temp_path)
+                try:
+                    # 一次复制全部页面: WAL模式下只是一个读事务，不阻塞写入
+                    source.backup(target)
+                    target.execute('PRAGMA journal_mode = DELETE')
+                finally:
+                    target.close()
+                    source.close()
+                os.utime(temp_path, (started, started))
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"刷新日志快照时出错: {e}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return False
+        self.refreshes += 1
+        self.last_refresh_ms = (time.perf_counter() - start) * 1000
+        registry.observe('mocks_snapshot_refresh_ms', None, self.last_refresh_ms)
+        return True
+
+    def _connection(self):
+        """当前线程的快照连接和快照中的最大id，快照文件被替换后重新打开"""
+        self._ensure_started()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            # 还没有快照时同步创建第一份
+            self.refresh(force=True, blocking=True)
+            stat = os.stat(self.path)
+        key = (stat.st_ino, stat.st_mtime_ns)
+        local = self._local
+        if getattr(local, 'key', None) != key or local.pid != os.getpid():
+            if getattr(local, 'conn', None) is not None and local.pid == os.getpid():
+                local.conn.close()
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro&immutable=1', uri=True, check_same_thread=False)
+            local.conn = conn
+            local.max_id = conn.execute('SELECT MAX(id) FROM request_logs').fetchone()[0]
+            local.time = stat.st_mtime
+            local.key = key
+            local.pid = os.getpid()
+        return local.conn, local.max_id, local.time
+
+    def _tail(self, max_id, start_time=None, end_time=None, modules=None, status_code=None):
+        return [row for row in self.tail.rows_after(max_id)
+                if row_matches(row, start_time, end_time, modules, status_code)]
+
+    def list(self, pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
+        conn, max_id, _ = self._connection()
+        tail = self._tail(max_id, start_time, end_time, modules, status_code)
+        if not (pagesize and current):
+            return [row_to_record(row) for row in tail] + database.get_all_requests(
+                None, None, start_time, end_time, modules, status_code, conn=conn)
+        skip = (current - 1) * pagesize
+        records = [row_to_record(row) for row in tail[skip:skip + pagesize]]
+        if len(records) < pagesize:
+            records += database.get_all_requests(pagesize - len(records), current, start_time, end_time, modules,
+                                                 status_code, conn=conn, offset=max(skip - len(tail), 0))
+        return records
+
+    def list_before(self, before_id=None, pagesize=20, start_time=None, end_time=None, modules=None, status_code=None):
+        conn, max_id, _ = self._connection()
+        tail = self._tail(max_id, start_time, end_time, modules, status_code)
+        records = [row_to_record(row) for row in tail
+                   if before_id is None or row[ID_INDEX] < before_id][:pagesize]
+        if len(records) < pagesize:
+            records += database.get_all_requests(pagesize - len(records), 1, start_time, end_time, modules,
+                                                 status_code, conn=conn, before_id=before_id)
+        return records
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        conn, max_id, _ = self._connection()
+        return len(self._tail(max_id, start_time, end_time, modules, status_code)) + database.get_requests_count(
+            start_time, end_time, modules, status_code, conn=conn)
+
+    def modules(self):
+        conn, max_id, _ = self._connection()
+        seen = dict.fromkeys(database.get_all_modules(conn=conn))
+        for row in self.tail.rows_after(max_id):
+            module = row[database.ROW_INDEX['module']]
+            if module:
+                seen.setdefault(module)
+        return list(seen)
+
+    def discard_range(self, start_time=None, end_time=None):
+        """日志被删除后同步清理尾部并刷新快照"""
+        self.tail.discard_range(start_time, end_time)
+        self.request_refresh()
+
+    def freshness(self):
+        _, max_id, snapshot_time = self._connection()
+        return {
+            'source': 'snapshot',
+            'snapshot_time': snapshot_time,
+            'age_seconds': round(max(time.time() - snapshot_time, 0.0), 3),
+            'interval': self.interval,
+            'tail_records': len(self.tail.rows_after(max_id))
+        }
+
+    def stats(self):
+        return {'enabled': self.enabled, 'age_seconds': self.age(), 'refreshes': self.refreshes,
+                'last_refresh_ms': round(self.last_refresh_ms, 3) if self.last_refresh_ms is not None else None}
+
+
+# 全局快照（配置 MOCKS_SNAPSHOT_INTERVAL 后由 SQLite 存储后端使用）
+dashboard_snapshot = DashboardSnapshot()
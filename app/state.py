@@ -0,0 +1,369 @@
+"""模块共享状态存储
+
+有状态的mock（先创建、再查询）需要在所有gunicorn worker之间共享数据，并且重启后不丢失。
+模块通过 collection() 取得按模块隔离的集合，值为可以JSON序列化的对象:
+
+    orders = collection('example', 'orders', indexes=['customer'])
+    key = orders.insert({'customer': 'c1', 'amount': 10})
+    orders.get(key)
+    orders.find(customer='c1')
+    orders.put(key, {...}) / orders.delete(key) / orders.all() / orders.count()
+
+数据保存在独立的SQLite数据库（MOCKS_STATE_DB_PATH，默认为项目根目录的 state.db，与请求日志分开）中，
+索引字段的值写入单独的索引表。写入由每个进程一个的后台线程按批提交: 同时到达的写入合并为一个事务，
+调用方等待提交完成后才返回，之后任何worker都能读到。
+
+读取使用worker内缓存: 数据库旁的 .versions 文件被所有worker映射到内存，每个集合对应一个版本号槽位，
+提交后递增该集合的版本号。读取时先比较版本号（一次内存读取），未变化时直接从缓存返回，
+变化时丢弃该集合的缓存再从数据库读取。
+"""
+import json
+import mmap
+import os
+import queue
+import sqlite3
+import struct
+import threading
+import zlib
+
+from . import config
+from .ids import new_request_id
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 版本号文件的槽位数，集合按名称哈希到槽位（冲突只会造成多余的缓存失效）
+VERSION_SLOTS = 4096
+VERSION = struct.Struct('<Q')
+# 每批提交的最大写入操作数
+WRITE_BATCH_SIZE = 200
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS state_items (
+        module TEXT NOT NULL,
+        collection TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (module, collection, key)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS state_index (
+        module TEXT NOT NULL,
+        collection TEXT NOT NULL,
+        field TEXT NOT NULL,
+        value TEXT NOT NULL,
+        key TEXT NOT NULL,
+        PRIMARY KEY (module, collection, field, value, key)
+    ) WITHOUT ROWID''',
+    '''CREATE INDEX IF NOT EXISTS idx_state_index_key
+        ON state_index (module, collection, key)'''
+]
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+
+def index_value(value):
+    """索引字段的值统一编码为文本（区分 1 和 "1"）"""
+    return _dumps(value)
+
+
+class VersionTable:
+    """映射到所有worker进程的集合版本号"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def _ensure_mapped(self):
+        if self._pid == os.getpid():
+            return self._map
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._map
+            size = VERSION_SLOTS * VERSION.size
+            handle = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+            if os.path.getsize(self.path) != size:
+                self._flock(handle, True)
+                try:
+                    if os.path.getsize(self.path) != size:
+                        handle.truncate(size)
+                finally:
+                    self._flock(handle, False)
+            self._map = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_WRITE)
+            self._file = handle
+            self._pid = os.getpid()
+        return self._map
+
+    @staticmethod
+    def _flock(handle, exclusive):
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    @staticmethod
+    def slot(module, name):
+        return zlib.crc32(f'{module}/{name}'.encode('utf-8')) % VERSION_SLOTS
+
+    def get(self, slot):
+        return VERSION.unpack_from(self._ensure_mapped(), slot * VERSION.size)[0]
+
+    def bump(self, slots):
+        """在进程间互斥地递增版本号"""
+        buf = self._ensure_mapped()
+        with self._lock:
+            self._flock(self._file, True)
+            try:
+                for slot in slots:
+                    offset = slot * VERSION.size
+                    VERSION.pack_into(buf, offset, VERSION.unpack_from(buf, offset)[0] + 1)
+            finally:
+                self._flock(self._file, False)
+
+
+class StateStore:
+    """SQLite状态存储: 后台线程按批提交写入，读取使用worker内缓存"""
+
+    def __init__(self, path=None):
+        self.path = path or config.STATE_DB_PATH
+        self.versions = VersionTable(self.path + '.versions')
+        self.batches = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._queue = None
+        self._cache = {}
+
+    def _ensure_started(self):
+        """在当前进程中建表并启动写入线程（fork出的worker重新创建队列、线程和缓存）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            conn = self._connect()
+            try:
+                conn.execute('PRAGMA journal_mode = WAL')
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            finally:
+                conn.close()
+            self._cache = {}
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name='state-writer', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def _reader(self):
+        """当前线程的只读连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, operations):
+        """提交一组写入操作并等待提交完成，失败时抛出异常"""
+        self._ensure_started()
+        done = threading.Event()
+        item = [operations, done, None]
+        self._queue.put(item)
+        done.wait()
+        if item[2] is not None:
+            raise item[2]
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            while count < WRITE_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+            slots = set()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for operations, _, _ in batch:
+                    for operation in operations:
+                        slots.add(self._apply(conn, operation))
+                conn.execute('COMMIT')
+            except Exception as e:
+                print(f"写入状态存储时出错: {e}")
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                for item in batch:
+                    item[2] = e
+                slots = set()
+            if slots:
+                self.versions.bump(slots)
+                self.batches += 1
+                self.writes += count
+            for item in batch:
+                item[1].set()
+
+    @staticmethod
+    def _apply(conn, operation):
+        action, collection, key, value = operation
+        scope = (collection.module, collection.name)
+        conn.execute('DELETE FROM state_index WHERE module = ? AND collection = ? AND key = ?', scope + (key,))
+        if action == 'delete':
+            conn.execute('DELETE FROM state_items WHERE module = ? AND collection = ? AND key = ?', scope + (key,))
+        else:
+            conn.execute('INSERT OR REPLACE INTO state_items (module, collection, key, value) VALUES (?, ?, ?, ?)',
+                         scope + (key, value))
+            conn.executemany(
+                'INSERT OR IGNORE INTO state_index (module, collection, field, value, key) VALUES (?, ?, ?, ?, ?)',
+                [scope + (field, index_value(field_value), key)
+                 for field, field_value in collection.index_entries(json.loads(value))])
+        return collection.slot
+
+    def cache_for(self, collection):
+        """集合的缓存，版本号变化时清空"""
+        self._ensure_started()
+        version = self.versions.get(collection.slot)
+        entry = self._cache.get(collection.key)
+        if entry is None or entry[0] != version:
+            # 先读版本号再读数据库: 之后的写入一定会让版本号继续变化
+            entry = (version, {})
+            self._cache[collection.key] = entry
+        return entry[1]
+
+    def query(self, sql, params):
+        self._ensure_started()
+        return self._reader().execute(sql, params).fetchall()
+
+    def stats(self):
+        return {'batches': self.batches, 'writes': self.writes,
+                'pending': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0}
+
+
+class Collection:
+    """模块内的一个集合: 键值读写和按索引字段查询"""
+
+    def __init__(self, store, module, name, indexes=()):
+        self.store = store
+        self.module = module
+        self.name = name
+        self.indexes = tuple(indexes)
+        self.key = (module, name)
+        self.slot = VersionTable.slot(module, name)
+
+    def index_entries(self, value):
+        """值中需要写入索引表的 (字段, 值)，值为列表时每个元素分别索引"""
+        if not isinstance(value, dict):
+            return []
+        entries = []
+        for field in self.indexes:
+            field_value = value.get(field)
+            if isinstance(field_value, list):
+                entries.extend((field, item) for item in field_value)
+            elif field_value is not None:
+                entries.append((field, field_value))
+        return entries
+
+    def _text(self, key):
+        cache = self.store.cache_for(self)
+        cache_key = ('key', key)
+        text = cache.get(cache_key)
+        if text is None:
+            rows = self.store.query(
+                'SELECT value FROM state_items WHERE module = ? AND collection = ? AND key = ?',
+                (self.module, self.name, key))
+            text = rows[0][0] if rows else None
+            # 不缓存不存在的键: 请求中任意的键会让缓存无限增长，缓存大小只受集合中已有数据的限制
+            if text is not None:
+                cache[cache_key] = text
+        return text
+
+    def get(self, key, default=None):
+        """按键读取，返回新解析的对象（修改返回值不影响存储）"""
+        text = self._text(str(key))
+        return default if text is None else json.loads(text)
+
+    def __contains__(self, key):
+        return self._text(str(key)) is not None
+
+    def put(self, key, value):
+        self.store.submit([('put', self, str(key), _dumps(value))])
+        return str(key)
+
+    def put_many(self, items):
+        """在同一个事务中写入多个 (键, 值)"""
+        self.store.submit([('put', self, str(key), _dumps(value)) for key, value in items])
+
+    def insert(self, value, key_field=None):
+        """以新生成的ID为键写入，key_field 不为空时同时写入值的该字段，返回键"""
+        key = str(new_request_id())
+        if key_field and isinstance(value, dict):
+            value = dict(value, **{key_field: key})
+        return self.put(key, value)
+
+    def delete(self, key):
+        self.store.submit([('delete', self, str(key), None)])
+
+    def _keys(self, sql, params, cache_key):
+        cache = self.store.cache_for(self)
+        keys = cache.get(cache_key)
+        if keys is None:
+            keys = [row[0] for row in self.store.query(sql, params)]
+            # 同样不缓存没有结果的查询条件
+            if keys:
+                cache[cache_key] = keys
+        return keys
+
+    def find(self, **conditions):
+        """按索引字段等值查询，多个条件取交集，按键排序返回值列表"""
+        keys = None
+        for field, value in conditions.items():
+            if field not in self.indexes:
+                raise ValueError(f"字段 {field} 不是集合 {self.name} 的索引字段")
+            matched = self._keys(
+                'SELECT key FROM state_index WHERE module = ? AND collection = ? AND field = ? AND value = ? '
+                'ORDER BY key', (self.module, self.name, field, index_value(value)),
+                ('find', field, index_value(value)))
+            if keys is None:
+                keys = matched
+            else:
+                matched = set(matched)
+                keys = [key for key in keys if key in matched]
+        if keys is None:
+            return self.all()
+        return [value for value in (self.get(key) for key in keys) if value is not None]
+
+    def keys(self):
+        return self._keys('SELECT key FROM state_items WHERE module = ? AND collection = ? ORDER BY key',
+                          (self.module, self.name), ('keys',))
+
+    def all(self):
+        return [value for value in (self.get(key) for key in self.keys()) if value is not None]
+
+    def count(self):
+        return len(self.keys())
+
+
+# 全局状态存储（每个进程一个写入线程）
+state_store = StateStore()
+_collections = {}
+
+
+def collection(module, name, indexes=()):
+    """取得模块的集合（同名集合只创建一次）"""
+    key = (module, name)
+    existing = _collections.get(key)
+    if existing is None:
+        existing = _collections.setdefault(key, Collection(state_store, module, name, indexes))
+    return existing
@@ -0,0 +1,56 @@
+"""请求日志存储后端
+
+拦截器、后台写入器和查询接口都通过 get_storage() 访问日志存储，
+具体后端由配置 MOCKS_STORAGE 选择，在 create_app 中创建并初始化:
+
+- sqlite: 默认后端，写入 requests.db（见 app/database.py）
+- memory: 进程内环形缓冲，不落盘，用于压测时排除存储开销
+- shm: worker进程之间共享的内存环形缓冲，只保留最近的请求
+- segment: 只追加的分段文件，写入时不需要维护索引
+"""
+import importlib
+import threading
+
+from .. import config
+from .base import LogStorage, RowStorage
+
+# 后端名称 -> (模块, 类名)，按需导入
+BACKENDS = {
+    'sqlite': ('.sqlite', 'SQLiteStorage'),
+    'memory': ('.memory', 'MemoryStorage'),
+    'shm': ('.shm', 'SharedRingStorage'),
+    'segment': ('.segment', 'SegmentStorage'),
+}
+
+_storage = None
+_lock = threading.Lock()
+
+
+def create_storage(name=None):
+    """按名称创建存储后端实例（未指定时使用配置的后端）"""
+    name = (name or config.STORAGE_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的存储后端: {name}，可选: {', '.join(BACKENDS)}")
+    module_name, class_name = BACKENDS[name]
+    module = importlib.import_module(module_name, __name__)
+    return getattr(module, class_name)()
+
+
+def set_storage(storage):
+    """初始化并设置当前进程使用的存储后端"""
+    global _storage
+    storage.init()
+    with _lock:
+        _storage = storage
+    return storage
+
+
+def get_storage():
+    """获取当前存储后端，未设置时按配置创建（命令行工具不经过 create_app）"""
+    storage = _storage
+    if storage is None:
+        with _lock:
+            storage = _storage
+        if storage is None:
+            storage = set_storage(create_storage())
+    return storage
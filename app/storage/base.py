@@ -0,0 +1,212 @@
+"""存储后端接口"""
+import json
+
+from ..analytics import analytics_from_rows
+from ..database import ROW_COLUMNS, ROW_INDEX, parse_list_row, parse_log_row
+from ..ids import decode_id, is_legacy_id, new_request_id
+
+ID_INDEX = ROW_INDEX['id']
+REQUEST_ID_INDEX = ROW_INDEX['request_id']
+TIMESTAMP_INDEX = ROW_INDEX['timestamp']
+MODULE_INDEX = ROW_INDEX['module']
+STATUS_INDEX = ROW_INDEX['status_code']
+
+
+class LogStorage:
+    """请求日志存储接口
+
+    写入的日志行是 serialize_log 返回的元组（ROW_COLUMNS顺序），
+    查询返回的记录与原有数据库查询函数的结构一致。
+    """
+
+    name = None
+    # 为True时拦截器在请求线程中直接写入，不经过后台写入队列（写入本身只是内存操作）
+    direct_write = False
+
+    def init(self):
+        """创建表、目录等存储结构"""
+
+    def write_batch(self, rows):
+        """批量写入日志行，成功返回True"""
+        raise NotImplementedError
+
+    def ingest_batch(self, rows):
+        """写入收集端从其他节点收到的日志行，返回新写入的条数，失败时返回None
+
+        默认直接调用 write_batch，不对发送方重发的日志去重
+        """
+        return len(rows) if self.write_batch(rows) else None
+
+    def list(self, pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
+        """按id倒序分页查询，记录只解析列表需要的JSON字段"""
+        raise NotImplementedError
+
+    def list_before(self, before_id=None, pagesize=20, start_time=None, end_time=None, modules=None, status_code=None):
+        """按id倒序返回id小于before_id的最多pagesize条记录（before_id为None时从最新开始）
+
+        与按页码翻页不同，翻页期间写入的新日志不会让后续页面重复或遗漏记录，多节点联合查询用它合并各节点的结果
+        """
+        raise NotImplementedError
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        """符合条件的日志条数"""
+        raise NotImplementedError
+
+    def get(self, request_id):
+        """按对外展示的请求ID获取完整解析的记录，不存在时返回None"""
+        raise NotImplementedError
+
+    def modules(self):
+        """所有出现过的模块名称"""
+        raise NotImplementedError
+
+    def freshness(self):
+        """列表、总数和模块列表查询结果的新鲜度，直接查询存储时为实时数据"""
+        return {'source': 'live', 'snapshot_time': None, 'age_seconds': 0, 'tail_records': 0}
+
+    def delete_range(self, start_time=None, end_time=None):
+        """删除时间范围内的日志，返回删除条数"""
+        raise NotImplementedError
+
+    def iter(self, start_time=None, end_time=None, modules=None, status_code=None, batch_size=500):
+        """按id升序流式遍历完整解析的记录"""
+        raise NotImplementedError
+
+    def analytics(self, start_time=None, end_time=None, group_by=None, modules=None,
+                  status_code=None, interval=60):
+        """延迟分位数、请求速率和错误率统计，结构见 app/analytics.py"""
+        raise NotImplementedError
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def row_in_range(row, start_time=None, end_time=None):
+    """判断日志行的时间戳是否在范围内（未指定范围时总是成立）"""
+    if not (start_time or end_time):
+        return True
+    timestamp = _to_float(row[TIMESTAMP_INDEX])
+    if timestamp is None:
+        return False
+    return ((not start_time or timestamp >= float(start_time))
+            and (not end_time or timestamp <= float(end_time)))
+
+
+def row_matches(row, start_time=None, end_time=None, modules=None, status_code=None):
+    """判断日志行是否满足筛选条件，规则与 build_filter_conditions 一致"""
+    if not row_in_range(row, start_time, end_time):
+        return False
+    if modules:
+        module = row[MODULE_INDEX]
+        if isinstance(modules, list):
+            if module not in modules:
+                return False
+        elif not module or modules not in module:
+            return False
+    if status_code and row[STATUS_INDEX] != status_code:
+        return False
+    return True
+
+
+def row_to_record(row, full=False):
+    """将日志行转换为记录字典，full为True时解析所有JSON字段"""
+    record = dict(zip(ROW_COLUMNS, row))
+    return parse_log_row(record) if full else parse_list_row(record)
+
+
+def ensure_row_id(row):
+    """没有整型ID的日志行（旧格式request_id）补充一个新ID，保证按id排序和查找"""
+    if row[ID_INDEX] is None:
+        return (new_request_id(),) + tuple(row[1:])
+    return tuple(row)
+
+
+def encode_row(row):
+    """日志行编码为一行JSON文本"""
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+
+
+class RowStorage(LogStorage):
+    """基于顺序扫描日志行实现查询的后端基类
+
+    子类只需要实现 write_batch、delete_range 和按id升序产出日志行的 scan_rows。
+    传给 scan_rows 的时间范围只用于跳过数据，调用方仍会逐行判断筛选条件。
+    """
+
+    def scan_rows(self, start_time=None, end_time=None):
+        raise NotImplementedError
+
+    def scan_rows_desc(self, start_time=None, end_time=None):
+        """按id倒序产出日志行，默认在内存中反转"""
+        rows = list(self.scan_rows(start_time, end_time))
+        rows.reverse()
+        return rows
+
+    def list(self, pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
+        skip = (current - 1) * pagesize if pagesize and current else 0
+        results = []
+        for row in self.scan_rows_desc(start_time, end_time):
+            if not row_matches(row, start_time, end_time, modules, status_code):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            results.append(row_to_record(row))
+            if pagesize and current and len(results) >= pagesize:
+                break
+        return results
+
+    def list_before(self, before_id=None, pagesize=20, start_time=None, end_time=None, modules=None, status_code=None):
+        results = []
+        for row in self.scan_rows_desc(start_time, end_time):
+            if before_id is not None and row[ID_INDEX] >= before_id:
+                continue
+            if not row_matches(row, start_time, end_time, modules, status_code):
+                continue
+            results.append(row_to_record(row))
+            if len(results) >= pagesize:
+                break
+        return results
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        return sum(1 for row in self.scan_rows(start_time, end_time) if row_matches(row, start_time, end_time, modules, status_code))
+
+    def find_row(self, request_id):
+        """按请求ID查找日志行"""
+        if is_legacy_id(request_id):
+            for row in self.scan_rows():
+                if row[REQUEST_ID_INDEX] == request_id:
+                    return row
+            return None
+        row_id = decode_id(request_id)
+        if row_id is None:
+            return None
+        for row in self.scan_rows():
+            if row[ID_INDEX] == row_id:
+                return row
+        return None
+
+    def get(self, request_id):
+        row = self.find_row(request_id)
+        return row_to_record(row, full=True) if row is not None else None
+
+    def modules(self):
+        seen = {}
+        for row in self.scan_rows():
+            if row[MODULE_INDEX]:
+                seen[row[MODULE_INDEX]] = True
+        return list(seen)
+
+    def iter(self, start_time=None, end_time=None, modules=None, status_code=None, batch_size=500):
+        for row in self.scan_rows(start_time, end_time):
+            if row_matches(row, start_time, end_time, modules, status_code):
+                yield row_to_record(row, full=True)
+
+    def analytics(self, start_time=None, end_time=None, group_by=None, modules=None,
+                  status_code=None, interval=60):
+        return analytics_from_rows(self.scan_rows(start_time, end_time), start_time, end_time, group_by,
+                                   modules, status_code, interval)
@@ -0,0 +1,95 @@
+"""进程内环形缓冲存储后端
+
+日志只保存在当前进程的内存中，超过容量后丢弃最旧的记录，写入时没有任何IO。
+适合压测时排除存储开销；多个gunicorn worker之间不共享数据，重启后数据丢失。
+"""
+import bisect
+import collections
+import threading
+
+from .. import config
+from ..ids import decode_id, is_legacy_id
+from .base import ID_INDEX, RowStorage, ensure_row_id, row_in_range, row_matches, row_to_record
+
+
+class MemoryStorage(RowStorage):
+    """基于 deque 的环形缓冲，另外维护 id -> 行 的字典用于按ID查找"""
+
+    name = 'memory'
+    direct_write = True
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or config.MEMORY_STORAGE_CAPACITY
+        self._rows = collections.deque()
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def write_batch(self, rows):
+        with self._lock:
+            for row in rows:
+                row = ensure_row_id(row)
+                if len(self._rows) >= self.capacity:
+                    evicted = self._rows.popleft()
+                    self._by_id.pop(evicted[ID_INDEX], None)
+                self._insert(row)
+                self._by_id[row[ID_INDEX]] = row
+        return True
+
+    def _insert(self, row):
+        """按id顺序插入（调用方持有锁）
+
+        并发请求的完成顺序与id顺序基本一致，绝大多数行直接追加到末尾；
+        晚到的行从末尾向前找到位置，只需要越过少量更新的行。
+        """
+        rows = self._rows
+        row_id = row[ID_INDEX]
+        if not rows or rows[-1][ID_INDEX] <= row_id:
+            rows.append(row)
+            return
+        index = len(rows) - 1
+        while index > 0 and rows[index - 1][ID_INDEX] > row_id:
+            index -= 1
+        rows.insert(index, row)
+
+    def _snapshot(self):
+        # 复制一份快照，遍历期间不持有锁；写入时已按id排序，不需要再排序
+        with self._lock:
+            return list(self._rows)
+
+    def scan_rows(self, start_time=None, end_time=None):
+        return self._snapshot()
+
+    def scan_rows_desc(self, start_time=None, end_time=None):
+        return reversed(self._snapshot())
+
+    def list_before(self, before_id=None, pagesize=20, start_time=None, end_time=None, modules=None, status_code=None):
+        rows = self._snapshot()
+        # 快照按id排序，二分查找游标的位置后向前遍历
+        end = len(rows) if before_id is None else bisect.bisect_left(rows, before_id, key=lambda row: row[ID_INDEX])
+        results = []
+        for index in range(end - 1, -1, -1):
+            row = rows[index]
+            if not row_matches(row, start_time, end_time, modules, status_code):
+                continue
+            results.append(row_to_record(row))
+            if len(results) >= pagesize:
+                break
+        return results
+
+    def find_row(self, request_id):
+        if is_legacy_id(request_id):
+            return super().find_row(request_id)
+        return self._by_id.get(decode_id(request_id))
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        if not (start_time or end_time or modules or status_code):
+            return len(self._rows)
+        return super().count(start_time, end_time, modules, status_code)
+
+    def delete_range(self, start_time=None, end_time=None):
+        with self._lock:
+            kept = collections.deque(row for row in self._rows if not row_in_range(row, start_time, end_time))
+            deleted = len(self._rows) - len(kept)
+            self._rows = kept
+            self._by_id = {row[ID_INDEX]: row for row in kept}
+        return deleted
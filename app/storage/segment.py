@@ -0,0 +1,459 @@
+"""只追加的分段文件存储后端
+
+每个进程把日志行以长度前缀记录（4字节小端长度 + JSON）顺序追加到自己的分段文件中，
+文件超过 MOCKS_SEGMENT_MAX_BYTES 后切换到新分段，写入时不需要维护B树索引。
+
+每个分段旁边有一个 .idx 稀疏索引文件，每 MOCKS_SEGMENT_INDEX_INTERVAL 条记录写一条定长索引项，
+记录这一块记录的id范围、时间戳范围、偏移和长度。查询时通过 mmap 读取分段，
+根据索引跳过不相关的块；分段末尾尚未写索引的记录在读取时现场扫描。
+
+保留策略按分段整体删除（见 drop_segments），不需要改写文件。
+"""
+import collections
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .. import config
+from ..ids import decode_id, is_legacy_id
+from .base import (ID_INDEX, TIMESTAMP_INDEX, RowStorage, _to_float, encode_row,
+                   ensure_row_id, row_in_range)
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+# 记录头: 负载字节数
+RECORD_HEADER = struct.Struct('<I')
+# 索引项: 最小id, 最大id, 最小时间戳, 最大时间戳, 块偏移, 块字节数, 块记录数
+INDEX_ENTRY = struct.Struct('<qqddQQI')
+
+# 两次检查保留策略之间的最小间隔（秒）
+RETENTION_CHECK_INTERVAL = 60
+
+Block = collections.namedtuple('Block', 'min_id max_id min_ts max_ts offset length count')
+
+
+def iter_payloads(buf, offset, end):
+    """从缓冲区中依次取出记录负载，遇到未写完整的记录时停止
+
+    Yields:
+        tuple: (记录起始偏移, 记录总字节数, 负载)
+    """
+    header_size = RECORD_HEADER.size
+    while offset + header_size <= end:
+        (length,) = RECORD_HEADER.unpack_from(buf, offset)
+        record_end = offset + header_size + length
+        if record_end > end:
+            return
+        yield offset, header_size + length, buf[offset + header_size:record_end]
+        offset = record_end
+
+
+class BlockBuilder:
+    """累积一块记录的id与时间戳范围"""
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.length = 0
+        self.count = 0
+        self.min_id = None
+        self.max_id = None
+        self.min_ts = math.inf
+        self.max_ts = -math.inf
+
+    def add(self, row, size):
+        row_id = row[ID_INDEX]
+        self.min_id = row_id if self.min_id is None else min(self.min_id, row_id)
+        self.max_id = row_id if self.max_id is None else max(self.max_id, row_id)
+        timestamp = _to_float(row[TIMESTAMP_INDEX])
+        if timestamp is None:
+            # 时间戳无法解析时不能按时间跳过这一块
+            self.min_ts, self.max_ts = -math.inf, math.inf
+        else:
+            self.min_ts = min(self.min_ts, timestamp)
+            self.max_ts = max(self.max_ts, timestamp)
+        self.length += size
+        self.count += 1
+
+    def build(self):
+        return Block(self.min_id, self.max_id, self.min_ts, self.max_ts, self.offset, self.length, self.count)
+
+
+class SegmentReader:
+    """单个分段的只读视图，文件增长时重新映射并补读索引"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        self.size = 0
+        self.inode = None
+        self.buffer = b''
+        self.indexed = []
+        self.index_size = 0
+        self.blocks = []
+
+    def refresh(self):
+        """根据文件当前大小更新映射和块列表，文件不存在时返回False"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if stat.st_ino != self.inode:
+            # 分段被其他进程重写，丢弃已读取的索引
+            self.inode = stat.st_ino
+            self.size = -1
+            self.indexed = []
+            self.index_size = 0
+        if stat.st_size != self.size:
+            self._remap(stat.st_size)
+            self._load_index()
+            self.blocks = self.indexed + self._scan_tail()
+        return True
+
+    def _remap(self, size):
+        # 旧的映射不主动关闭，其他线程可能仍在读取，释放引用后由垃圾回收关闭
+        self.size = size
+        if size == 0:
+            self.buffer = b''
+            return
+        with open(self.path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _load_index(self):
+        try:
+            index_size = os.path.getsize(self.index_path)
+        except OSError:
+            index_size = 0
+        index_size -= index_size % INDEX_ENTRY.size
+        if index_size < self.index_size:
+            # 索引文件被改写，从头读取
+            self.indexed = []
+            self.index_size = 0
+        if index_size > self.index_size:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self.index_size)
+                data = f.read(index_size - self.index_size)
+            for values in INDEX_ENTRY.iter_unpack(data):
+                block = Block(*values)
+                if block.offset + block.length > self.size:
+                    break
+                self.indexed.append(block)
+            self.index_size = len(self.indexed) * INDEX_ENTRY.size
+
+    def _scan_tail(self):
+        """扫描最后一个索引块之后尚未建立索引的记录"""
+        offset = self.indexed[-1].offset + self.indexed[-1].length if self.indexed else 0
+        builder = BlockBuilder(offset)
+        for _, size, payload in iter_payloads(self.buffer, offset, self.size):
+            builder.add(decode_row(payload), size)
+        return [builder.build()] if builder.count else []
+
+    def read_block(self, block):
+        """读取一个块中的所有日志行"""
+        end = block.offset + block.length
+        buffer = self.buffer
+        return [decode_row(payload) for _, _, payload in iter_payloads(buffer, block.offset, end)]
+
+    @property
+    def max_ts(self):
+        return max((block.max_ts for block in self.blocks), default=-math.inf)
+
+    @property
+    def count(self):
+        return sum(block.count for block in self.blocks)
+
+    def close(self):
+        self.buffer = b''
+        self.blocks = []
+
+
+def decode_row(payload):
+    return tuple(json.loads(payload))
+
+
+def block_overlaps(block, start_time=None, end_time=None):
+    """判断块的时间戳范围是否与查询范围相交"""
+    if start_time and block.max_ts < float(start_time):
+        return False
+    if end_time and block.min_ts > float(end_time):
+        return False
+    return True
+
+
+def block_within(block, start_time=None, end_time=None):
+    """判断块中所有记录是否都在时间范围内"""
+    return ((not start_time or block.min_ts >= float(start_time))
+            and (not end_time or block.max_ts <= float(end_time)))
+
+
+class SegmentStorage(RowStorage):
+    """分段文件存储，目录可在多个worker进程之间共享"""
+
+    name = 'segment'
+
+    def __init__(self, directory=None, max_bytes=None, index_interval=None,
+                 retention_seconds=None, max_total_bytes=None):
+        self.directory = directory or config.SEGMENT_DIR
+        self.max_bytes = max_bytes or config.SEGMENT_MAX_BYTES
+        self.index_interval = index_interval or config.SEGMENT_INDEX_INTERVAL
+        self.retention_seconds = config.SEGMENT_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+        self.max_total_bytes = config.SEGMENT_MAX_TOTAL_BYTES if max_total_bytes is None else max_total_bytes
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._readers = {}
+        self._pid = None
+        self._sequence = 0
+        self._path = None
+        self._size = 0
+        self._block = None
+        self._last_retention_check = 0.0
+
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ---- 写入 ----
+
+    def _open_segment(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._sequence = 0
+        self._sequence += 1
+        name = f'segment-{int(time.time() * 1000):013d}-{self._pid}-{self._sequence}{SEGMENT_SUFFIX}'
+        self._path = os.path.join(self.directory, name)
+        self._size = 0
+        self._block = BlockBuilder(0)
+
+    def _index_path(self, path):
+        return path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+
+    def write_batch(self, rows):
+        try:
+            with self._lock:
+                # fork出的worker进程使用自己的分段；分段被删除或改写后切换到新分段
+                if self._pid != os.getpid() or self._path is None or self._disk_size() != self._size:
+                    self._open_segment()
+
+                chunks = []
+                entries = []
+                block = self._block
+                for row in rows:
+                    row = ensure_row_id(row)
+                    payload = encode_row(row).encode('utf-8')
+                    record = RECORD_HEADER.pack(len(payload)) + payload
+                    chunks.append(record)
+                    block.add(row, len(record))
+                    if block.count >= self.index_interval:
+                        entries.append(INDEX_ENTRY.pack(*block.build()))
+                        block = BlockBuilder(block.offset + block.length)
+                self._block = block
+
+                data = b''.join(chunks)
+                with open(self._path, 'ab') as f:
+                    f.write(data)
+                self._size += len(data)
+                # 索引项在数据之后写入，崩溃时最多丢失索引，读取时会扫描未索引的记录
+                if entries:
+                    with open(self._index_path(self._path), 'ab') as f:
+                        f.write(b''.join(entries))
+
+                if self._size >= self.max_bytes:
+                    self._seal_segment()
+            self._maybe_drop_segments()
+            return True
+        except OSError as e:
+            print(f"写入分段文件时出错: {e}")
+            self._path = None
+            return False
+
+    def _disk_size(self):
+        try:
+            return os.path.getsize(self._path)
+        except OSError:
+            return 0
+
+    def _seal_segment(self):
+        """为最后一个未满的块写索引，之后的写入切换到新分段"""
+        if self._block is not None and self._block.count:
+            with open(self._index_path(self._path), 'ab') as f:
+                f.write(INDEX_ENTRY.pack(*self._block.build()))
+        self._open_segment()
+        self._last_retention_check = 0.0
+
+    # ---- 读取 ----
+
+    def segment_paths(self):
+        """所有分段文件路径（按创建时间排序）"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in sorted(names) if name.endswith(SEGMENT_SUFFIX)]
+
+    def readers(self):
+        """刷新并返回所有分段的读取器"""
+        readers = []
+        paths = self.segment_paths()
+        with self._read_lock:
+            for path in paths:
+                reader = self._readers.get(path)
+                if reader is None:
+                    reader = self._readers[path] = SegmentReader(path)
+                if reader.refresh():
+                    readers.append(reader)
+            # 清理已被删除的分段
+            for path in set(self._readers) - set(paths):
+                self._readers.pop(path).close()
+        return readers
+
+    def _blocks(self, start_time=None, end_time=None):
+        return [(reader, block) for reader in self.readers() for block in reader.blocks
+                if block_overlaps(block, start_time, end_time)]
+
+    def _ordered_rows(self, blocks, reverse=False):
+        """按id有序产出多个块中的日志行
+
+        并发请求的完成顺序与ID顺序不完全一致，块之间的id范围可能重叠。
+        按块的边界id排序后依次读入，只有确定不会再出现更小（倒序时更大）id的行才输出。
+        """
+        if reverse:
+            blocks = sorted(blocks, key=lambda item: -item[1].max_id)
+        else:
+            blocks = sorted(blocks, key=lambda item: item[1].min_id)
+        pending = []
+        sign = -1 if reverse else 1
+        # 重复的id（溢出回放、收集端写入）按块和行的顺序排列，不比较日志行本身（其中有None和不同类型的值）
+        for block_seq, (reader, block) in enumerate(blocks):
+            bound = sign * (block.max_id if reverse else block.min_id)
+            while pending and pending[0][0] < bound:
+                yield heapq.heappop(pending)[-1]
+            for row_idx, row in enumerate(reader.read_block(block)):
+                heapq.heappush(pending, (sign * row[ID_INDEX], block_seq, row_idx, row))
+        while pending:
+            yield heapq.heappop(pending)[-1]
+
+    def scan_rows(self, start_time=None, end_time=None):
+        return self._ordered_rows(self._blocks(start_time, end_time))
+
+    def scan_rows_desc(self, start_time=None, end_time=None):
+        return self._ordered_rows(self._blocks(start_time, end_time), reverse=True)
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        if modules or status_code:
+            return super().count(start_time, end_time, modules, status_code)
+        # 只有时间条件时，完全在范围内的块直接使用索引中的记录数
+        total = 0
+        for reader, block in self._blocks(start_time, end_time):
+            if block_within(block, start_time, end_time):
+                total += block.count
+            else:
+                total += sum(1 for row in reader.read_block(block) if row_in_range(row, start_time, end_time))
+        return total
+
+    def find_row(self, request_id):
+        if is_legacy_id(request_id):
+            return super().find_row(request_id)
+        row_id = decode_id(request_id)
+        if row_id is None:
+            return None
+        for reader in self.readers():
+            for block in reader.blocks:
+                if block.min_id <= row_id <= block.max_id:
+                    for row in reader.read_block(block):
+                        if row[ID_INDEX] == row_id:
+                            return row
+        return None
+
+    # ---- 删除与保留策略 ----
+
+    def drop_segments(self, now=None):
+        """按保留策略整体删除分段，返回删除的分段数
+
+        当前进程正在写入的分段不会被删除；其他进程的分段被删除后，
+        其写入时会发现文件大小不一致并切换到新分段。
+        """
+        if not self.retention_seconds and not self.max_total_bytes:
+            return 0
+        now = now or time.time()
+        readers = [reader for reader in self.readers() if reader.path != self._path]
+        dropped = []
+        if self.retention_seconds:
+            cutoff = now - self.retention_seconds
+            dropped.extend(reader for reader in readers if reader.blocks and reader.max_ts < cutoff)
+        if self.max_total_bytes:
+            total = sum(reader.size for reader in self.readers())
+            total -= sum(reader.size for reader in dropped)
+            for reader in readers:
+                if total <= self.max_total_bytes:
+                    break
+                if reader not in dropped:
+                    dropped.append(reader)
+                    total -= reader.size
+        for reader in dropped:
+            self._remove_segment(reader)
+        return len(dropped)
+
+    def _maybe_drop_segments(self):
+        now = time.time()
+        if now - self._last_retention_check < RETENTION_CHECK_INTERVAL:
+            return
+        self._last_retention_check = now
+        try:
+            self.drop_segments(now)
+        except OSError as e:
+            print(f"清理过期分段时出错: {e}")
+
+    def _remove_segment(self, reader):
+        with self._read_lock:
+            self._readers.pop(reader.path, None)
+        for path in (reader.path, reader.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete_range(self, start_time=None, end_time=None):
+        """删除时间范围内的日志: 整个分段都在范围内时直接删除文件，部分覆盖的分段重写"""
+        deleted = 0
+        for reader in self.readers():
+            blocks = [block for block in reader.blocks if block_overlaps(block, start_time, end_time)]
+            if not blocks:
+                continue
+            if all(block_within(block, start_time, end_time) for block in reader.blocks):
+                deleted += reader.count
+                self._remove_segment(reader)
+                continue
+            rows = [row for block in reader.blocks for row in reader.read_block(block)]
+            kept = [row for row in rows if not row_in_range(row, start_time, end_time)]
+            if len(kept) == len(rows):
+                continue
+            deleted += len(rows) - len(kept)
+            self._rewrite_segment(reader, kept)
+        return deleted
+
+    def _rewrite_segment(self, reader, rows):
+        data = []
+        entries = []
+        block = BlockBuilder(0)
+        for row in rows:
+            payload = encode_row(row).encode('utf-8')
+            record = RECORD_HEADER.pack(len(payload)) + payload
+            data.append(record)
+            block.add(row, len(record))
+            if block.count >= self.index_interval:
+                entries.append(INDEX_ENTRY.pack(*block.build()))
+                block = BlockBuilder(block.offset + block.length)
+        if block.count:
+            entries.append(INDEX_ENTRY.pack(*block.build()))
+
+        with self._read_lock:
+            self._readers.pop(reader.path, None)
+        for path, content in ((reader.index_path, b''.join(entries)), (reader.path, b''.join(data))):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
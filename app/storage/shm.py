@@ -0,0 +1,302 @@
+"""共享内存环形缓冲存储后端
+
+所有worker进程映射同一个共享内存文件（默认位于 /dev/shm），文件由固定数量、固定大小的槽位组成，
+新日志按全局序号依次覆盖最旧的槽位，不写磁盘也不经过后台写入队列，写入开销只是一次内存复制。
+
+槽位头部保存序号、id、时间戳、响应码和模块名，列表、计数和筛选只读取头部，
+只有需要返回的记录才解析JSON。写入时先把序号清零、写完数据后再写入序号，
+读取时前后两次序号一致才认为数据完整。超出槽位大小的记录会截断响应体等大字段。
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+
+from .. import config
+from ..database import ROW_INDEX
+from ..ids import decode_id, is_legacy_id
+from .base import (ID_INDEX, MODULE_INDEX, STATUS_INDEX, TIMESTAMP_INDEX, RowStorage,
+                   _to_float, encode_row, ensure_row_id, row_to_record)
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'MOCKRING'
+# 文件头: 魔数, 槽位数, 槽位字节数, 下一个序号
+FILE_HEADER = struct.Struct('<8sIIQ')
+FILE_HEADER_BYTES = 64
+SEQUENCE_OFFSET = 16
+# 槽位头: 序号, id, 时间戳, 响应码, 模块名, 负载字节数
+SLOT_HEADER = struct.Struct('<Qqdi32sI')
+SEQUENCE = struct.Struct('<Q')
+MODULE_BYTES = 32
+
+# 记录超出槽位时依次截断的字段
+TRUNCATE_COLUMNS = ['response_data', 'request_json', 'request_form', 'request_body', 'request_args',
+                    'response_headers', 'request_headers']
+
+
+def fit_payload(row, limit):
+    """编码日志行，超出limit字节时依次把大字段替换为截断说明"""
+    payload = encode_row(row).encode('utf-8')
+    if len(payload) <= limit:
+        return payload
+    row = list(row)
+    for column in TRUNCATE_COLUMNS:
+        index = ROW_INDEX[column]
+        value = row[index]
+        if value is None:
+            continue
+        row[index] = json.dumps(f'[truncated {len(value)} chars]')
+        payload = encode_row(row).encode('utf-8')
+        if len(payload) <= limit:
+            return payload
+    return None
+
+
+def encode_module(module):
+    return (module or '').encode('utf-8')[:MODULE_BYTES]
+
+
+class SlotHeader:
+    """读取到的槽位头部"""
+
+    __slots__ = ('slot', 'sequence', 'id', 'timestamp', 'status_code', 'module', 'length')
+
+    def __init__(self, slot, sequence, row_id, timestamp, status_code, module, length):
+        self.slot = slot
+        self.sequence = sequence
+        self.id = row_id
+        self.timestamp = timestamp
+        self.status_code = status_code
+        self.module = module
+        self.length = length
+
+    def matches(self, start_time=None, end_time=None, modules=None, status_code=None):
+        """与 row_matches 相同的筛选规则，只使用头部字段"""
+        if start_time and self.timestamp < float(start_time):
+            return False
+        if end_time and self.timestamp > float(end_time):
+            return False
+        if modules:
+            if isinstance(modules, list):
+                if self.module not in [encode_module(m).decode('utf-8', 'ignore') for m in modules]:
+                    return False
+            elif not self.module or modules not in self.module:
+                return False
+        if status_code and self.status_code != status_code:
+            return False
+        return True
+
+
+class SharedRingStorage(RowStorage):
+    """基于共享内存文件的定长槽位环形缓冲，多个worker进程共享同一份数据"""
+
+    name = 'shm'
+    # 写入只是内存复制，拦截器直接写入而不经过后台写入队列
+    direct_write = True
+
+    def __init__(self, path=None, capacity=None, slot_bytes=None):
+        self.path = path or config.SHM_PATH
+        self.capacity = capacity or config.SHM_CAPACITY
+        self.slot_bytes = slot_bytes or config.SHM_SLOT_BYTES
+        self.payload_limit = self.slot_bytes - SLOT_HEADER.size
+        self.size = FILE_HEADER_BYTES + self.capacity * self.slot_bytes
+        self._lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+
+    def init(self):
+        self._ensure_mapped()
+
+    def _ensure_mapped(self):
+        """映射共享内存文件（fork出的worker重新打开，文件锁才能在进程之间互斥）"""
+        if self._pid == os.getpid():
+            return self._map
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._map
+            handle = self._open_file()
+            self._map = mmap.mmap(handle.fileno(), self.size, access=mmap.ACCESS_WRITE)
+            self._file = handle
+            self._pid = os.getpid()
+        return self._map
+
+    def _open_file(self):
+        """打开共享内存文件，首次创建或槽位配置变化时换成新初始化的文件
+
+        配置变化时（如gunicorn HUP重载后新worker的 MOCKS_SHM_* 不同）旧worker可能仍映射着原文件，
+        原地截断会让它们访问映射时收到SIGBUS。新文件写好后用 os.replace 替换路径，
+        旧worker继续使用原文件直到退出。
+        """
+        expected = (MAGIC, self.capacity, self.slot_bytes)
+        while True:
+            handle = os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+            self._flock(handle, True)
+            try:
+                stat = os.fstat(handle.fileno())
+                try:
+                    current = os.stat(self.path).st_ino == stat.st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    handle.seek(0)
+                    header = handle.read(FILE_HEADER.size)
+                    if len(header) == FILE_HEADER.size and FILE_HEADER.unpack(header)[:3] == expected \
+                            and stat.st_size == self.size:
+                        return handle
+                    # 持有原文件的锁时替换，同时等待的进程拿到锁后会发现路径已换成新文件
+                    tmp_path, fresh = self._create_file()
+                    os.replace(tmp_path, self.path)
+                    handle.close()
+                    return fresh
+            finally:
+                if not handle.closed:
+                    self._flock(handle, False)
+            # 等待文件锁期间路径已被其他进程替换，重新打开
+            handle.close()
+
+    def _create_file(self):
+        """在同一目录下创建并初始化一个新的共享内存文件"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        fresh = os.fdopen(os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644), 'r+b')
+        fresh.truncate(self.size)
+        fresh.write(FILE_HEADER.pack(MAGIC, self.capacity, self.slot_bytes, 1))
+        fresh.flush()
+        return tmp_path, fresh
+
+    @staticmethod
+    def _flock(handle, exclusive):
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_UN)
+
+    def _claim(self, count):
+        """在进程间互斥地分配count个连续序号，返回第一个序号"""
+        buf = self._ensure_mapped()
+        with self._lock:
+            self._flock(self._file, True)
+            try:
+                (sequence,) = SEQUENCE.unpack_from(buf, SEQUENCE_OFFSET)
+                SEQUENCE.pack_into(buf, SEQUENCE_OFFSET, sequence + count)
+            finally:
+                self._flock(self._file, False)
+        return sequence
+
+    def _slot_offset(self, slot):
+        return FILE_HEADER_BYTES + slot * self.slot_bytes
+
+    def write_batch(self, rows):
+        encoded = []
+        for row in rows:
+            row = ensure_row_id(row)
+            payload = fit_payload(row, self.payload_limit)
+            if payload is None:
+                print(f"日志记录超出共享内存槽位大小（{self.slot_bytes}字节），已丢弃")
+                continue
+            encoded.append((row, payload))
+        if not encoded:
+            return True
+
+        buf = self._ensure_mapped()
+        sequence = self._claim(len(encoded))
+        for row, payload in encoded:
+            offset = self._slot_offset(sequence % self.capacity)
+            SEQUENCE.pack_into(buf, offset, 0)
+            header = SLOT_HEADER.pack(0, row[ID_INDEX], _to_float(row[TIMESTAMP_INDEX]) or 0.0,
+                                      row[STATUS_INDEX] or 0, encode_module(row[MODULE_INDEX]), len(payload))
+            body_offset = offset + SLOT_HEADER.size
+            buf[offset + SEQUENCE.size:body_offset] = header[SEQUENCE.size:]
+            buf[body_offset:body_offset + len(payload)] = payload
+            # 最后写入序号，读取方据此判断槽位已写完整
+            SEQUENCE.pack_into(buf, offset, sequence)
+            sequence += 1
+        return True
+
+    # ---- 读取 ----
+
+    def headers(self):
+        """读取所有已写入的槽位头部"""
+        buf = self._ensure_mapped()
+        result = []
+        for slot in range(self.capacity):
+            values = SLOT_HEADER.unpack_from(buf, self._slot_offset(slot))
+            if values[0]:
+                result.append(SlotHeader(slot, values[0], values[1], values[2], values[3],
+                                         values[4].rstrip(b'\0').decode('utf-8', 'ignore'), values[5]))
+        return result
+
+    def read_row(self, header):
+        """读取槽位中的日志行，槽位在读取期间被覆盖时返回None"""
+        buf = self._ensure_mapped()
+        offset = self._slot_offset(header.slot)
+        body_offset = offset + SLOT_HEADER.size
+        payload = buf[body_offset:body_offset + header.length]
+        if SEQUENCE.unpack_from(buf, offset)[0] != header.sequence:
+            return None
+        try:
+            return tuple(json.loads(payload))
+        except ValueError:
+            return None
+
+    def _matching(self, start_time=None, end_time=None, modules=None, status_code=None, reverse=False):
+        headers = [h for h in self.headers() if h.matches(start_time, end_time, modules, status_code)]
+        headers.sort(key=lambda h: h.id, reverse=reverse)
+        return headers
+
+    def _read_rows(self, headers):
+        for header in headers:
+            row = self.read_row(header)
+            if row is not None:
+                yield row
+
+    def scan_rows(self, start_time=None, end_time=None):
+        return self._read_rows(self._matching(start_time, end_time))
+
+    def scan_rows_desc(self, start_time=None, end_time=None):
+        return self._read_rows(self._matching(start_time, end_time, reverse=True))
+
+    def list(self, pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
+        headers = self._matching(start_time, end_time, modules, status_code, reverse=True)
+        if pagesize and current:
+            offset = (current - 1) * pagesize
+            headers = headers[offset:offset + pagesize]
+        return [row_to_record(row) for row in self._read_rows(headers)]
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        return len(self._matching(start_time, end_time, modules, status_code))
+
+    def iter(self, start_time=None, end_time=None, modules=None, status_code=None, batch_size=500):
+        for row in self._read_rows(self._matching(start_time, end_time, modules, status_code)):
+            yield row_to_record(row, full=True)
+
+    def find_row(self, request_id):
+        if is_legacy_id(request_id):
+            return super().find_row(request_id)
+        row_id = decode_id(request_id)
+        for header in self.headers():
+            if header.id == row_id:
+                return self.read_row(header)
+        return None
+
+    def modules(self):
+        seen = {}
+        for header in self.headers():
+            if header.module:
+                seen[header.module] = True
+        return list(seen)
+
+    def delete_range(self, start_time=None, end_time=None):
+        buf = self._ensure_mapped()
+        deleted = 0
+        for header in self.headers():
+            if header.matches(start_time, end_time):
+                # 只有槽位未被新记录覆盖时才清空
+                offset = self._slot_offset(header.slot)
+                if SEQUENCE.unpack_from(buf, offset)[0] == header.sequence:
+                    SEQUENCE.pack_into(buf, offset, 0)
+                    deleted += 1
+        return deleted
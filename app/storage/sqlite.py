@@ -0,0 +1,73 @@
+"""SQLite存储后端（默认），直接使用 app/database.py 中的查询函数
+
+配置 MOCKS_SNAPSHOT_INTERVAL 后，日志列表、总数和模块列表改为读取只读快照（见 app/snapshot.py）。
+"""
+from .. import config, database
+from ..analytics import get_latency_analytics
+from ..snapshot import dashboard_snapshot
+from .base import LogStorage
+
+
+class SQLiteStorage(LogStorage):
+    """基于 requests.db 的存储后端"""
+
+    name = 'sqlite'
+
+    def init(self):
+        database.init_db()
+
+    def write_batch(self, rows):
+        # 缩短锁等待时间，数据库忙时尽快失败并由熔断器转存到溢出文件
+        written = database.save_log_rows(rows, busy_timeout_ms=config.LOG_BUSY_TIMEOUT_MS)
+        if written and dashboard_snapshot.enabled:
+            dashboard_snapshot.tail.extend(rows)
+        return written
+
+    def ingest_batch(self, rows):
+        inserted = database.ingest_log_rows(rows, busy_timeout_ms=config.LOG_BUSY_TIMEOUT_MS)
+        if inserted is None:
+            return None
+        if inserted and dashboard_snapshot.enabled:
+            dashboard_snapshot.tail.extend(inserted)
+        return len(inserted)
+
+    def list(self, pagesize=None, current=None, start_time=None, end_time=None, modules=None, status_code=None):
+        if dashboard_snapshot.enabled:
+            return dashboard_snapshot.list(pagesize, current, start_time, end_time, modules, status_code)
+        return database.get_all_requests(pagesize, current, start_time, end_time, modules, status_code)
+
+    def list_before(self, before_id=None, pagesize=20, start_time=None, end_time=None, modules=None, status_code=None):
+        if dashboard_snapshot.enabled:
+            return dashboard_snapshot.list_before(before_id, pagesize, start_time, end_time, modules, status_code)
+        return database.get_all_requests(pagesize, 1, start_time, end_time, modules, status_code, before_id=before_id)
+
+    def count(self, start_time=None, end_time=None, modules=None, status_code=None):
+        if dashboard_snapshot.enabled:
+            return dashboard_snapshot.count(start_time, end_time, modules, status_code)
+        return database.get_requests_count(start_time, end_time, modules, status_code)
+
+    def get(self, request_id):
+        return database.get_request_by_id(request_id)
+
+    def modules(self):
+        if dashboard_snapshot.enabled:
+            return dashboard_snapshot.modules()
+        return database.get_all_modules()
+
+    def freshness(self):
+        if dashboard_snapshot.enabled:
+            return dashboard_snapshot.freshness()
+        return super().freshness()
+
+    def delete_range(self, start_time=None, end_time=None):
+        deleted = database.delete_requests(start_time, end_time)
+        if dashboard_snapshot.enabled:
+            dashboard_snapshot.discard_range(start_time, end_time)
+        return deleted
+
+    def iter(self, start_time=None, end_time=None, modules=None, status_code=None, batch_size=500):
+        return database.iter_requests(start_time, end_time, modules, status_code, batch_size)
+
+    def analytics(self, start_time=None, end_time=None, group_by=None, modules=None,
+                  status_code=None, interval=60):
+        return get_latency_analytics(start_time, end_time, group_by, modules, status_code, interval)
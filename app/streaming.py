@@ -0,0 +1,141 @@
+"""流式响应
+
+模块返回大量数据时，用 json_array_response / ndjson_response 把生成器按批编码后分块发送
+（gunicorn下为chunked传输），内存占用只与单批大小有关，与总条数无关。
+
+请求拦截器用 StreamCapture 包装流式响应: 发送时顺带统计字节数和SHA-256，
+发送完成（WSGI close）后才提交日志。不超过 MOCKS_STREAM_CAPTURE_BYTES 的流照常记录完整响应体，
+更大的流只记录大小和摘要，不通过 get_data 缓冲。
+"""
+import hashlib
+import json
+
+from flask import current_app
+
+from . import config
+
+# 每次向WSGI服务器产出的记录条数
+DEFAULT_BATCH_SIZE = 500
+# 在外层对象中标记数组位置的占位值
+_PLACEHOLDER = '\0__stream__'
+
+
+def _dumps():
+    """按应用的JSON配置（与jsonify一致）构造编码函数，生成器在请求上下文之外执行时也能使用"""
+    provider = current_app.json
+    ensure_ascii = getattr(provider, 'ensure_ascii', True)
+    sort_keys = getattr(provider, 'sort_keys', True)
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=ensure_ascii, sort_keys=sort_keys, separators=(',', ':'))
+    return dumps
+
+
+def iter_json_array(items, dumps, envelope=None, key='data', batch_size=DEFAULT_BATCH_SIZE):
+    """把生成器编码为JSON数组（或放在envelope的key字段中），按批产出字符串
+
+    与jsonify一样以换行结尾。
+    """
+    if envelope is None:
+        head, tail = '[', ']\n'
+    else:
+        wrapper = dict(envelope)
+        wrapper[key] = _PLACEHOLDER
+        text = dumps(wrapper)
+        marker = dumps(_PLACEHOLDER)
+        position = text.index(marker)
+        head, tail = text[:position] + '[', ']' + text[position + len(marker):] + '\n'
+
+    batch = []
+    first = True
+    for item in items:
+        batch.append(dumps(item))
+        if len(batch) >= batch_size:
+            chunk = ','.join(batch)
+            yield (head if first else ',') + chunk
+            first = False
+            batch = []
+    chunk = ','.join(batch)
+    if first:
+        yield head + chunk + tail
+    else:
+        yield (',' + chunk if batch else '') + tail
+
+
+def iter_ndjson(items, dumps, batch_size=DEFAULT_BATCH_SIZE):
+    """把生成器编码为NDJSON（每行一条JSON记录），按批产出字符串"""
+    batch = []
+    for item in items:
+        batch.append(dumps(item))
+        if len(batch) >= batch_size:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+
+def json_array_response(items, envelope=None, key='data', status=200, headers=None,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """以流式JSON响应返回生成器产出的记录
+
+    Args:
+        items: 记录的可迭代对象（生成器在请求结束后才被消费，不能再访问request）
+        envelope: 数组之外的字段，如 {'count': 100}；为None时直接返回JSON数组
+        key: envelope中存放数组的字段名
+        status: 响应码
+        headers: 额外的响应头
+        batch_size: 每批编码的记录条数
+
+    Returns:
+        Response: application/json 的流式响应
+    """
+    body = iter_json_array(items, _dumps(), envelope, key, batch_size)
+    return current_app.response_class(body, status=status, headers=headers, mimetype='application/json')
+
+
+def ndjson_response(items, status=200, headers=None, batch_size=DEFAULT_BATCH_SIZE):
+    """以流式NDJSON响应返回生成器产出的记录"""
+    body = iter_ndjson(items, _dumps(), batch_size)
+    return current_app.response_class(body, status=status, headers=headers, mimetype='application/x-ndjson')
+
+
+class StreamCapture:
+    """包装流式响应体: 统计字节数和SHA-256，只缓冲不超过limit字节的开头部分"""
+
+    def __init__(self, iterable, limit=None):
+        self.iterable = iterable
+        self.limit = config.STREAM_CAPTURE_BYTES if limit is None else limit
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.buffer = bytearray()
+        self.complete = False
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            self.size += len(data)
+            self.hasher.update(data)
+            if len(self.buffer) <= self.limit:
+                self.buffer.extend(data[:self.limit + 1 - len(self.buffer)])
+            yield chunk
+        self.complete = True
+
+    def close(self):
+        close = getattr(self.iterable, 'close', None)
+        if close is not None:
+            close()
+
+    def response_data(self):
+        """日志中记录的响应体: 完整发送且不超过上限时为原内容，否则为大小和摘要"""
+        if self.complete and len(self.buffer) <= self.limit:
+            text = self.buffer.decode('utf-8', 'replace')
+            try:
+                return json.loads(text)
+            except ValueError:
+                return text
+        return {
+            'streamed': True,
+            'size': self.size,
+            'sha256': self.hasher.hexdigest(),
+            'complete': self.complete
+        }
@@ -0,0 +1,108 @@
+"""可复现的合成数据生成器
+
+模块用字段定义创建 SyntheticGenerator，按批生成记录:
+
+    generator = SyntheticGenerator({
+        'id': 'seq',
+        'name': 'word',
+        'score': 'int:0:100',
+        'status': 'choice:active,inactive',
+    }, seed=42)
+    for record in generator.iter_records(count=1000000, offset=0):
+        ...
+
+每一批使用由 (种子, 批序号) 确定的随机数发生器，同一种子下第N条记录总是相同的，
+与从哪个偏移开始读取无关，适合模拟分页的批量导出接口。字段定义在创建时编译为函数。
+
+字段定义:
+    seq              从1开始的全局序号
+    int:最小:最大    随机整数
+    float:最小:最大  随机小数（保留2位）
+    choice:a,b,c     从候选值中随机选择
+    word / text:N    随机单词 / N个随机单词
+    bool             随机布尔值
+    uuid             随机UUID
+    timestamp        固定起点之后一年内的随机时间（ISO格式）
+    其他字符串或非字符串值原样返回；也可以是 fn(rng, index) 形式的函数
+"""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_BATCH_SIZE = 1000
+
+# timestamp 字段的起点，保证同一种子生成的时间固定
+TIMESTAMP_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TIMESTAMP_RANGE_SECONDS = 365 * 24 * 3600
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'to', 'vi', 'ze', 'po', 'da', 'fe', 'gu', 'hi', 'ja', 'be']
+
+
+def _word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def compile_field(spec):
+    """将字段定义编译为 fn(rng, index) 函数"""
+    if callable(spec):
+        return spec
+    if not isinstance(spec, str):
+        return lambda rng, index: spec
+    kind, _, args = spec.partition(':')
+    if kind == 'seq':
+        return lambda rng, index: index + 1
+    if kind == 'int':
+        low, high = (int(v) for v in args.split(':'))
+        return lambda rng, index: rng.randint(low, high)
+    if kind == 'float':
+        low, high = (float(v) for v in args.split(':'))
+        return lambda rng, index: round(rng.uniform(low, high), 2)
+    if kind == 'choice':
+        choices = args.split(',')
+        return lambda rng, index: rng.choice(choices)
+    if kind == 'word':
+        return lambda rng, index: _word(rng)
+    if kind == 'text':
+        words = int(args or 5)
+        return lambda rng, index: ' '.join(_word(rng) for _ in range(words))
+    if kind == 'bool':
+        return lambda rng, index: rng.random() < 0.5
+    if kind == 'uuid':
+        return lambda rng, index: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    if kind == 'timestamp':
+        return lambda rng, index: (
+            TIMESTAMP_EPOCH + timedelta(seconds=rng.randrange(TIMESTAMP_RANGE_SECONDS))).isoformat()
+    return lambda rng, index: spec
+
+
+class SyntheticGenerator:
+    """按种子和批序号生成可复现的合成记录"""
+
+    def __init__(self, fields, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+        self.fields = [(name, compile_field(spec)) for name, spec in fields.items()]
+        self.seed = seed
+        self.batch_size = max(int(batch_size), 1)
+
+    def batch(self, batch_index):
+        """生成第batch_index批的全部记录"""
+        rng = random.Random(f'{self.seed}:{batch_index}')
+        start = batch_index * self.batch_size
+        return [
+            {name: fn(rng, index) for name, fn in self.fields}
+            for index in range(start, start + self.batch_size)
+        ]
+
+    def iter_batches(self, count, offset=0):
+        """从offset开始按批产出共count条记录（首尾两批会被截取）"""
+        end = offset + count
+        batch_index = offset // self.batch_size
+        while batch_index * self.batch_size < end:
+            start = batch_index * self.batch_size
+            records = self.batch(batch_index)
+            yield records[max(offset - start, 0):end - start]
+            batch_index += 1
+
+    def iter_records(self, count, offset=0):
+        """从offset开始逐条产出共count条记录"""
+        for records in self.iter_batches(count, offset):
+            yield from records
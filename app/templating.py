@@ -0,0 +1,234 @@
+"""预编译的响应模板
+
+模块用 ResponseTemplate 声明响应体，字符串中的 {{ ... }} 为占位符:
+
+    SUBMIT_RESPONSE = ResponseTemplate({
+        'status': 'success',
+        'message': '已成功提交数据，名称: {{ json.name }}',
+        'received_data': '{{ json }}',
+        'order_no': '{{ counter.orders }}',
+        'page': '{{ args.page|int|default:1 }}'
+    }, status=201)
+
+    @bp.route('/submit', methods=['POST'])
+    def submit():
+        return SUBMIT_RESPONSE.render()
+
+占位符:
+    path.X / args.X / form.X / headers.X   路由参数、查询参数、表单字段、请求头
+    json / json.a.b / json.items.0         整个JSON请求体或其中的字段（数字为列表下标）
+    vars.X                                 render(X=...) 传入的值
+    counter / counter.名称                 从1开始递增的计数器（每个worker进程独立）
+    now / timestamp / timestamp_ms         当前时间（ISO格式）/ 秒 / 毫秒
+    uuid / request_id / method / url       随机UUID、请求日志ID、请求方法、请求路径
+过滤器（用 | 连接）: int、float、str、bool、upper、lower、default:JSON值（值为null时使用）
+
+字符串只包含一个占位符时按原类型输出（如 '{{ json }}' 输出对象），否则格式化为字符串。
+占位符在创建模板时解析为取值函数；首次渲染时按应用的JSON配置（与jsonify一致）把模板序列化一次，
+静态部分保存为文本片段，之后每个请求只计算并编码占位符，再与片段拼接。
+"""
+import itertools
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, request
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{\s*(.*?)\s*\}\}')
+# 序列化时代替占位字符串的标记，生成后在JSON文本中切分
+_SLOT_MARKER = '\0slot:{}\0'
+_SLOT_PATTERN = re.compile(r'"\\u0000slot:(\d+)\\u0000"')
+
+_counters = {}
+
+
+def _counter(name):
+    counter = _counters.get(name)
+    if counter is None:
+        counter = _counters.setdefault(name, itertools.count(1))
+    return lambda context: next(counter)
+
+
+def _lookup(value, keys):
+    for key in keys:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def _mapping_getter(source, key):
+    if source == 'path':
+        return lambda context: (request.view_args or {}).get(key)
+    if source == 'args':
+        return lambda context: request.args.get(key)
+    if source == 'form':
+        return lambda context: request.form.get(key)
+    if source == 'headers':
+        return lambda context: request.headers.get(key)
+    return lambda context: context.get(key)
+
+
+GLOBAL_GETTERS = {
+    'now': lambda context: datetime.now(timezone.utc).isoformat(),
+    'timestamp': lambda context: int(time.time()),
+    'timestamp_ms': lambda context: int(time.time() * 1000),
+    'uuid': lambda context: str(uuid.uuid4()),
+    'request_id': lambda context: g.get('request_id'),
+    'method': lambda context: request.method,
+    'url': lambda context: request.path,
+}
+
+
+def compile_getter(expression):
+    """将占位符表达式（不含过滤器）编译为 fn(context) 取值函数"""
+    source, _, rest = expression.partition('.')
+    if source in GLOBAL_GETTERS and not rest:
+        return GLOBAL_GETTERS[source]
+    if source == 'counter':
+        return _counter(rest or 'default')
+    if source == 'json':
+        keys = rest.split('.') if rest else []
+        return lambda context: _lookup(request.get_json(silent=True), keys)
+    if source in ('path', 'args', 'form', 'headers', 'vars') and rest:
+        return _mapping_getter(source, rest)
+    raise ValueError(f"不支持的模板占位符: {expression}")
+
+
+def _convert(cast):
+    def apply(value):
+        if value is None:
+            return None
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+    return apply
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _default(value):
+    fallback = json.loads(value)
+    return lambda v: fallback if v is None else v
+
+
+FILTERS = {
+    'int': lambda arg: _convert(int),
+    'float': lambda arg: _convert(float),
+    'str': lambda arg: _convert(str),
+    'bool': lambda arg: _convert(_to_bool),
+    'upper': lambda arg: _convert(lambda v: str(v).upper()),
+    'lower': lambda arg: _convert(lambda v: str(v).lower()),
+    'default': _default,
+}
+
+
+def compile_placeholder(text):
+    """将 '表达式|过滤器|...' 编译为取值函数"""
+    expression, *filters = [part.strip() for part in text.split('|')]
+    getter = compile_getter(expression)
+    if not filters:
+        return getter
+    functions = []
+    for spec in filters:
+        name, _, arg = spec.partition(':')
+        if name not in FILTERS:
+            raise ValueError(f"不支持的模板过滤器: {name}")
+        functions.append(FILTERS[name](arg))
+
+    def evaluate(context):
+        value = getter(context)
+        for function in functions:
+            value = function(value)
+        return value
+    return evaluate
+
+
+def compile_string(text):
+    """编译含占位符的字符串为 fn(context) 取值函数，不含占位符时返回None
+
+    字符串只包含一个占位符时按原类型取值，否则格式化为字符串（值为null的占位符输出为空）。
+    """
+    parts = PLACEHOLDER_PATTERN.split(text)
+    if len(parts) == 1:
+        return None
+    if len(parts) == 3 and not parts[0] and not parts[2]:
+        return compile_placeholder(parts[1])
+    pieces = [part if index % 2 == 0 else compile_placeholder(part) for index, part in enumerate(parts)]
+
+    def evaluate(context):
+        output = []
+        for piece in pieces:
+            if isinstance(piece, str):
+                output.append(piece)
+            else:
+                value = piece(context)
+                if value is not None:
+                    output.append(str(value))
+        return ''.join(output)
+    return evaluate
+
+
+class ResponseTemplate:
+    """预编译的JSON响应模板"""
+
+    def __init__(self, body, status=200, headers=None, mimetype='application/json'):
+        self.status = status
+        self.headers = headers
+        self.mimetype = mimetype
+        self.slots = []
+        self.skeleton = self._compile(body)
+        self._fragments = None
+
+    def _compile(self, value):
+        """把占位字符串替换为标记，记录对应的取值函数"""
+        if isinstance(value, dict):
+            return {key: self._compile(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._compile(item) for item in value]
+        if isinstance(value, str):
+            compiled = compile_string(value)
+            if compiled is not None:
+                self.slots.append(compiled)
+                return _SLOT_MARKER.format(len(self.slots) - 1)
+        return value
+
+    def _prepare(self):
+        """按应用的JSON配置序列化模板，切分为静态片段和占位符序号"""
+        provider = current_app.json
+        ensure_ascii = getattr(provider, 'ensure_ascii', True)
+        sort_keys = getattr(provider, 'sort_keys', True)
+
+        # 复用同一个编码器，避免每次 json.dumps 按参数重新创建
+        dumps = json.JSONEncoder(ensure_ascii=ensure_ascii, sort_keys=sort_keys, separators=(',', ':')).encode
+        parts = _SLOT_PATTERN.split(dumps(self.skeleton) + '\n')
+        self._fragments = (parts[0::2], [int(index) for index in parts[1::2]], dumps)
+        return self._fragments
+
+    def render_text(self, **context):
+        """渲染为JSON文本（需要在请求上下文中调用）"""
+        fragments, order, dumps = self._fragments or self._prepare()
+        if not order:
+            return fragments[0]
+        output = [fragments[0]]
+        for index, fragment in zip(order, fragments[1:]):
+            output.append(dumps(self.slots[index](context)))
+            output.append(fragment)
+        return ''.join(output)
+
+    def render(self, status=None, headers=None, **context):
+        """渲染为响应对象，关键字参数可在模板中用 vars.X 引用"""
+        return current_app.response_class(self.render_text(**context), status=status or self.status,
+                                          headers=headers or self.headers, mimetype=self.mimetype)
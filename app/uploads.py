@@ -0,0 +1,216 @@
+"""上传请求体的流式采集
+
+multipart 和二进制上传不再通过 request.form / request.get_json 解析后记录，
+而是在请求开始时用 TeeInput 包装 wsgi.input: 视图读取请求体时顺带把数据送入
+增量的 multipart 解析器和 SHA-256，只保留字段名、文件名、大小和摘要等元数据，
+内存占用与上传大小无关。
+
+最多检查 MOCKS_UPLOAD_CAPTURE_BYTES 字节；视图没有读完的请求体在记录日志时补读到上限为止，
+超出上限的部分不再检查，元数据中 complete 为 false，只包含上限以内的字段和文件。
+"""
+import fnmatch
+import hashlib
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from . import config
+
+# 普通表单字段最多记录的字符数
+FIELD_VALUE_LIMIT = 1024
+# 补读请求体时每次读取的字节数
+DRAIN_CHUNK_BYTES = 64 * 1024
+
+
+def is_streaming_body(mimetype):
+    """是否按流式元数据记录该类型的请求体（默认 multipart/* 和 application/octet-stream）"""
+    if not mimetype:
+        return False
+    return any(fnmatch.fnmatch(mimetype, pattern) for pattern in config.UPLOAD_STREAM_TYPES)
+
+
+class RawBodyObserver:
+    """二进制请求体: 记录大小和SHA-256"""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+
+    def feed(self, chunk):
+        self.hasher.update(chunk)
+
+    def close(self):
+        pass
+
+    def metadata(self, complete):
+        return {'sha256': self.hasher.hexdigest() if complete else None}
+
+
+class MultipartObserver:
+    """multipart 请求体: 增量解析，记录普通字段的值和文件的名称、类型、大小、SHA-256"""
+
+    def __init__(self, boundary):
+        self.decoder = MultipartDecoder(boundary.encode('latin-1'))
+        self.fields = {}
+        self.files = []
+        self._current = None
+        self._hasher = None
+        self._value = None
+
+    def feed(self, chunk):
+        if self.decoder is not None:
+            self.decoder.receive_data(chunk)
+            self._drain_events()
+
+    def close(self):
+        if self.decoder is not None:
+            self.decoder.receive_data(None)
+            self._drain_events()
+
+    def _drain_events(self):
+        while True:
+            try:
+                event = self.decoder.next_event()
+            except ValueError:
+                # 请求体格式错误时停止解析，已解析的部分照常记录
+                self.decoder = None
+                return
+            if isinstance(event, (NeedData, Epilogue)):
+                return
+            if isinstance(event, File):
+                self._current = {
+                    'field': event.name,
+                    'filename': event.filename,
+                    'content_type': event.headers.get('Content-Type'),
+                    'size': 0,
+                    'sha256': None
+                }
+                self._hasher = hashlib.sha256()
+                self._value = None
+                self.files.append(self._current)
+            elif isinstance(event, Field):
+                self._current = None
+                self._hasher = None
+                self._value = [event.name, bytearray()]
+            elif isinstance(event, Data):
+                if self._current is not None:
+                    self._current['size'] += len(event.data)
+                    self._hasher.update(event.data)
+                    if not event.more_data:
+                        self._current['sha256'] = self._hasher.hexdigest()
+                elif self._value is not None:
+                    if len(self._value[1]) < FIELD_VALUE_LIMIT * 4:
+                        self._value[1].extend(event.data)
+                    if not event.more_data:
+                        name, value = self._value
+                        text = bytes(value).decode('utf-8', 'replace')
+                        self.fields[name] = text if len(text) <= FIELD_VALUE_LIMIT else text[:FIELD_VALUE_LIMIT] + '...'
+                        self._value = None
+
+    def metadata(self, complete):
+        return {'fields': self.fields, 'files': self.files}
+
+
+class TeeInput:
+    """包装 wsgi.input，视图读取的数据同时交给解析器，最多检查 limit 字节"""
+
+    def __init__(self, stream, observer, mimetype, content_length=None, limit=None):
+        self.stream = stream
+        self.observer = observer
+        self.mimetype = mimetype
+        self.content_length = content_length
+        self.limit = config.UPLOAD_CAPTURE_BYTES if limit is None else limit
+        self.size = 0
+        self.inspected = 0
+        self.eof = False
+
+    def _observe(self, chunk):
+        if not chunk:
+            self.eof = True
+            return chunk
+        self.size += len(chunk)
+        if self.inspected < self.limit:
+            part = chunk[:self.limit - self.inspected]
+            self.inspected += len(part)
+            if self.observer is not None:
+                self.observer.feed(part)
+        return chunk
+
+    def read(self, size=-1):
+        return self._observe(self.stream.read(size) if size is not None else self.stream.read())
+
+    def readline(self, size=-1):
+        return self._observe(self.stream.readline(size))
+
+    def readlines(self, hint=-1):
+        return [self._observe(line) for line in self.stream.readlines(hint)]
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                break
+            yield line
+
+    def close(self):
+        close = getattr(self.stream, 'close', None)
+        if close is not None:
+            close()
+
+    def _drain(self):
+        """补读视图没有读取的请求体（只在长度已知时，最多读到检查上限）"""
+        if self.content_length is None:
+            return
+        remaining = self.content_length - self.size
+        if remaining <= 0:
+            self.eof = True
+            return
+        # 超出检查上限时只补读到上限为止，剩余部分交给服务器丢弃
+        remaining = min(remaining, self.limit - self.inspected)
+        while remaining > 0:
+            chunk = self.read(min(remaining, DRAIN_CHUNK_BYTES))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+    def finish(self):
+        """结束采集，返回请求体元数据"""
+        self._drain()
+        complete = (self.eof or (self.content_length is not None and self.size >= self.content_length)) \
+            and self.inspected == self.size
+        if complete and self.observer is not None:
+            self.observer.close()
+        metadata = {
+            'content_type': self.mimetype,
+            'content_length': self.content_length,
+            'size': self.size,
+            'complete': complete
+        }
+        if self.observer is not None:
+            metadata.update(self.observer.metadata(complete))
+        return metadata
+
+
+def install_tee(request):
+    """在视图读取请求体之前包装 wsgi.input，不需要流式采集时返回None"""
+    mimetype = request.mimetype
+    if not is_streaming_body(mimetype) or 'stream' in request.__dict__:
+        return None
+    observer = None
+    if mimetype.startswith('multipart/'):
+        boundary = request.mimetype_params.get('boundary')
+        if boundary:
+            observer = MultipartObserver(boundary)
+    else:
+        observer = RawBodyObserver()
+    environ = request.environ
+    tee = TeeInput(environ['wsgi.input'], observer, mimetype, request.content_length)
+    environ['wsgi.input'] = tee
+    return tee
+
+
+def body_summary(request):
+    """没有包装输入流时（如流已被读取）只记录请求头中的类型和长度"""
+    return {
+        'content_type': request.mimetype,
+        'content_length': request.content_length,
+        'complete': False
+    }
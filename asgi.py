@@ -0,0 +1,5 @@
+"""ASGI入口: uvicorn asgi:app（见 README 中的ASGI模式说明）"""
+from app import create_app
+from app.asgi import AsgiApp
+
+app = AsgiApp(create_app())
@@ -0,0 +1,10 @@
+"""性能基准测试套件
+
+衡量请求日志记录链路（拦截器、save_request_log）和仪表盘查询
+（get_all_requests、get_requests_count）的开销。完全离线运行，
+使用固定随机种子生成合成数据，结果写入可对比的JSON文件。
+
+用法:
+    python -m benchmarks.bench --sizes 10k,1m -o bench_results.json
+    python -m benchmarks.compare old.json new.json
+"""
@@ -0,0 +1,249 @@
+"""基准测试运行器
+
+运行所有基准测试并将结果写入JSON文件:
+    python -m benchmarks.bench --sizes 10k,1m,10m --threads 1,4,8 -o bench_results.json
+
+- capture: 进程内请求开启/关闭日志记录时的单请求耗时，以及两者之差（日志开销）
+- insert: N个线程并发调用save_request_log的写入吞吐量
+- query: 不同数据规模、不同筛选组合下get_all_requests/get_requests_count的延迟，以及分钟统计分析查询的延迟
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from app import database
+from app.analytics import get_latency_analytics
+from benchmarks.synthetic import TIME_SPAN, dataset_path, make_log_data, seed_database
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data')
+BASE_TIME = 1700000000.0
+
+# 查询基准的筛选组合: 名称 -> 筛选参数
+QUERY_FILTERS = {
+    'none': {},
+    'time_range': {'start_time': str(BASE_TIME + TIME_SPAN * 0.5), 'end_time': str(BASE_TIME + TIME_SPAN * 0.6)},
+    'module': {'modules': ['orders']},
+    'modules_multi': {'modules': ['orders', 'users', 'search']},
+    'status_code': {'status_code': 500},
+    'module_status': {'modules': ['orders'], 'status_code': 404},
+    'all': {
+        'start_time': str(BASE_TIME + TIME_SPAN * 0.5), 'end_time': str(BASE_TIME + TIME_SPAN * 0.6),
+        'modules': ['orders'], 'status_code': 200
+    }
+}
+
+
+def parse_size(value):
+    """解析 10k/1m 形式的数据规模"""
+    value = value.strip().lower()
+    multiplier = 1
+    if value.endswith('k'):
+        multiplier, value = 1000, value[:-1]
+    elif value.endswith('m'):
+        multiplier, value = 1000000, value[:-1]
+    return int(float(value) * multiplier)
+
+
+def use_database(db_path):
+    """将数据库模块切换到指定的数据库文件"""
+    database.DB_PATH = db_path
+    database.pool = database.DatabaseConnectionPool(db_path, max_connections=10)
+    database.init_db()
+
+
+def timed(func, repeat):
+    """多次执行func，返回耗时统计（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 4),
+        'min_ms': round(samples[0], 4)
+    }
+
+
+def bench_capture(requests_count):
+    """测量进程内请求在开启/关闭日志记录时的单请求耗时"""
+    from app import create_app
+    from app.capture import capture_policy
+    from app.log_writer import log_writer
+
+    app = create_app()
+    client = app.test_client()
+    paths = ['/example/', '/example/data?count=5']
+
+    def run():
+        # 与WSGI服务器一样关闭响应，流式响应的日志在关闭时提交
+        # 预热
+        for _ in range(50):
+            client.get(paths[0]).close()
+        start = time.perf_counter()
+        for i in range(requests_count):
+            client.get(paths[i % len(paths)]).close()
+        elapsed = time.perf_counter() - start
+        # 等待后台写入完成，避免影响下一轮测量
+        log_writer.flush(timeout=60)
+        return elapsed / requests_count * 1e6
+
+    logging_on_us = run()
+    capture_policy.set_module_capture('example', 'skip')
+    try:
+        logging_off_us = run()
+    finally:
+        capture_policy.set_module_capture('example', None)
+
+    return {
+        'requests': requests_count,
+        'logging_on_us_per_request': round(logging_on_us, 2),
+        'logging_off_us_per_request': round(logging_off_us, 2),
+        'logging_overhead_us_per_request': round(logging_on_us - logging_off_us, 2)
+    }
+
+
+def bench_insert(thread_counts, records_per_thread, seed, db_dir):
+    """测量多线程并发调用save_request_log的写入吞吐量（每种线程数使用独立的空数据库）"""
+    results = {}
+    for threads in thread_counts:
+        use_database(os.path.join(db_dir, f'insert-{threads}.db'))
+        rng = random.Random(seed)
+        batches = [[make_log_data(rng, t * records_per_thread + i, BASE_TIME) for i in range(records_per_thread)]
+                   for t in range(threads)]
+
+        def worker(batch):
+            for log_data in batch:
+                database.save_request_log(log_data)
+
+        workers = [threading.Thread(target=worker, args=(batch,)) for batch in batches]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        total = threads * records_per_thread
+        results[str(threads)] = {
+            'records': total,
+            'seconds': round(elapsed, 3),
+            'records_per_second': round(total / elapsed, 1)
+        }
+    return results
+
+
+def bench_queries(repeat, deep_page):
+    """测量各筛选组合下的列表、计数和模块查询延迟"""
+    results = {}
+    for name, filters in QUERY_FILTERS.items():
+        results[name] = {
+            'list_page1': timed(lambda: database.get_all_requests(pagesize=20, current=1, **filters), repeat),
+            f'list_page{deep_page}': timed(lambda: database.get_all_requests(pagesize=20, current=deep_page, **filters), repeat),
+            'count': timed(lambda: database.get_requests_count(**filters), repeat)
+        }
+    results['modules'] = timed(database.get_all_modules, repeat)
+    results['analytics_7d'] = timed(lambda: get_latency_analytics(
+        start_time=BASE_TIME, end_time=BASE_TIME + TIME_SPAN, group_by=['module', 'status_code'], interval=3600
+    ), repeat)
+    return results
+
+
+def ensure_dataset(data_dir, rows, seed):
+    """准备指定规模的合成数据集，已存在时直接复用"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = dataset_path(data_dir, rows, seed)
+    if os.path.exists(path):
+        return path, None
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    use_database(tmp_path)
+    seconds = seed_database(tmp_path, rows, seed=seed, base_time=BASE_TIME)
+    # 合成数据绕过了save_log_rows，重新建表以回填分钟统计
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('DROP TABLE request_rollups')
+    conn.commit()
+    conn.close()
+    database.init_db()
+    os.replace(tmp_path, path)
+    return path, round(seconds, 2)
+
+
+def environment_info(seed):
+    """记录运行环境，便于对比不同结果文件"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, cwd=os.path.dirname(DEFAULT_DATA_DIR)).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': revision,
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='运行请求日志链路的性能基准测试')
+    parser.add_argument('--sizes', default='10k', help='查询基准的数据规模，逗号分隔，例如 10k,1m,10m')
+    parser.add_argument('--threads', default='1,4,8', help='写入基准的线程数，逗号分隔')
+    parser.add_argument('--records-per-thread', type=int, default=500, help='写入基准中每个线程写入的记录数')
+    parser.add_argument('--capture-requests', type=int, default=2000, help='拦截器基准的请求数')
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询的重复次数')
+    parser.add_argument('--deep-page', type=int, default=100, help='深分页基准使用的页码')
+    parser.add_argument('--seed', type=int, default=42, help='合成数据的随机种子')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='合成数据集缓存目录')
+    parser.add_argument('--only', choices=['capture', 'insert', 'query'], action='append', help='只运行指定基准')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='结果JSON文件')
+    args = parser.parse_args()
+
+    selected = set(args.only or ['capture', 'insert', 'query'])
+    report = {'environment': environment_info(args.seed), 'results': {}}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if 'capture' in selected:
+            print('运行拦截器开销基准...')
+            use_database(os.path.join(tmp_dir, 'capture.db'))
+            report['results']['capture'] = bench_capture(args.capture_requests)
+
+        if 'insert' in selected:
+            print('运行写入吞吐量基准...')
+            thread_counts = [int(t) for t in args.threads.split(',')]
+            report['results']['insert'] = bench_insert(thread_counts, args.records_per_thread, args.seed, tmp_dir)
+
+    if 'query' in selected:
+        report['results']['query'] = {}
+        for size in args.sizes.split(','):
+            rows = parse_size(size)
+            print(f'准备 {rows} 行合成数据...')
+            path, seed_seconds = ensure_dataset(args.data_dir, rows, args.seed)
+            use_database(path)
+            print(f'运行 {rows} 行数据的查询基准...')
+            report['results']['query'][str(rows)] = {
+                'seed_seconds': seed_seconds,
+                'queries': bench_queries(args.repeat, args.deep_page)
+            }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
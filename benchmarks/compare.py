@@ -0,0 +1,63 @@
+"""对比两个基准测试结果文件
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+逐项对比数值型指标，变化超过阈值（百分比）的指标会被标记。
+耗时类指标（*_ms、*_us_per_request、seconds）越小越好，吞吐量类指标越大越好。
+存在回退时以退出码1结束，便于在CI中使用。
+"""
+import argparse
+import json
+import sys
+
+# 越大越好的指标名后缀
+HIGHER_IS_BETTER = ('records_per_second',)
+# 不参与对比的字段
+IGNORED_KEYS = {'records', 'requests', 'seed_seconds'}
+
+
+def flatten(data, prefix=''):
+    """将嵌套字典展开为 路径 -> 数值"""
+    items = {}
+    for key, value in data.items():
+        path = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            items.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in IGNORED_KEYS:
+            items[path] = value
+    return items
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='对比两个基准测试结果文件')
+    parser.add_argument('baseline', help='基准结果文件')
+    parser.add_argument('current', help='当前结果文件')
+    parser.add_argument('--threshold', type=float, default=10.0, help='标记为回退的变化百分比')
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = flatten(json.load(f)['results'])
+    with open(args.current, encoding='utf-8') as f:
+        current = flatten(json.load(f)['results'])
+
+    regressions = 0
+    for path in sorted(set(baseline) & set(current)):
+        old, new = baseline[path], current[path]
+        if old == 0:
+            continue
+        change = (new - old) / abs(old) * 100
+        worse = change > 0 if not path.endswith(HIGHER_IS_BETTER) else change < 0
+        flag = ''
+        if abs(change) >= args.threshold:
+            flag = '回退' if worse else '提升'
+            if worse:
+                regressions += 1
+        print(f'{path:<60} {old:>12} {new:>12} {change:>+8.1f}% {flag}')
+
+    print(f'\n共 {regressions} 项回退（阈值 {args.threshold}%）')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""合成请求日志数据生成器
+
+使用固定随机种子生成可复现的请求日志，并批量写入SQLite数据库。
+"""
+import json
+import os
+import random
+import sqlite3
+import time
+
+from app.ids import compose_id
+
+MODULES = ['example', 'orders', 'users', 'payments', 'search', 'upload', 'notify', 'report']
+METHODS = ['GET', 'GET', 'GET', 'POST', 'POST', 'PUT', 'DELETE']
+STATUS_CODES = [200] * 16 + [201, 201, 204, 400, 404, 500]
+
+# 合成数据覆盖的时间跨度（秒）
+TIME_SPAN = 7 * 24 * 3600
+
+INSERT_SQL = '''
+    INSERT INTO request_logs (
+        id, request_id, method, url, client_ip, request_headers, request_args,
+        request_form, request_json, status_code, response_headers,
+        response_data, process_time, timestamp, module
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def make_log_data(rng, index, base_time, step=1.0):
+    """生成一条与拦截器产出格式一致的日志数据（log_data字典）"""
+    module = rng.choice(MODULES)
+    method = rng.choice(METHODS)
+    item_id = rng.randint(1, 100000)
+    timestamp = base_time + (index + rng.random()) * step
+    return {
+        'request_id': compose_id(int(timestamp * 1000), 0, 0, index & 0xFFF),
+        'method': method,
+        'url': f'/{module}/items/{item_id}',
+        'client_ip': f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+        'request_headers': {
+            'Host': 'mock.local',
+            'User-Agent': 'bench/1.0',
+            'Accept': 'application/json',
+            'X-Trace-Id': '%016x' % rng.getrandbits(64)
+        },
+        'request_args': {'page': str(rng.randint(1, 50))} if method == 'GET' else {},
+        'request_form': {},
+        'request_json': {'name': f'item-{item_id}', 'qty': rng.randint(1, 9)} if method in ('POST', 'PUT') else None,
+        'status_code': rng.choice(STATUS_CODES),
+        'response_headers': {'Content-Type': 'application/json', 'Content-Length': '128'},
+        'response_data': {'id': item_id, 'status': 'ok', 'items': [rng.randint(0, 999) for _ in range(5)]},
+        'process_time': round(rng.lognormvariate(0.5, 0.8), 3),
+        'timestamp': timestamp,
+        'module': module
+    }
+
+
+def to_row(log_data):
+    """按save_request_log相同的方式序列化为数据库行"""
+    return (
+        log_data['request_id'],
+        None,
+        log_data['method'],
+        log_data['url'],
+        log_data['client_ip'],
+        json.dumps(log_data['request_headers'], ensure_ascii=False),
+        json.dumps(log_data['request_args'], ensure_ascii=False),
+        json.dumps(log_data['request_form'], ensure_ascii=False),
+        json.dumps(log_data['request_json'], ensure_ascii=False) if log_data['request_json'] else None,
+        log_data['status_code'],
+        json.dumps(log_data['response_headers'], ensure_ascii=False),
+        json.dumps(log_data['response_data'], ensure_ascii=False),
+        log_data['process_time'],
+        log_data['timestamp'],
+        log_data['module']
+    )
+
+
+def seed_database(db_path, rows, seed=42, base_time=1700000000.0, batch_size=10000):
+    """向数据库写入指定数量的合成日志（数据库需已由init_db建表）
+
+    Returns:
+        float: 写入耗时（秒）
+    """
+    rng = random.Random(seed)
+    step = TIME_SPAN / max(rows, 1)
+    conn = sqlite3.connect(db_path)
+    # init_db已把数据库切换到WAL模式且连接池中仍有打开的连接，不能再修改journal_mode
+    conn.execute('PRAGMA synchronous = OFF')
+    start = time.perf_counter()
+    try:
+        for offset in range(0, rows, batch_size):
+            batch = [to_row(make_log_data(rng, i, base_time, step))
+                     for i in range(offset, min(offset + batch_size, rows))]
+            conn.executemany(INSERT_SQL, batch)
+            conn.commit()
+    finally:
+        conn.close()
+    return time.perf_counter() - start
+
+
+def dataset_path(data_dir, rows, seed):
+    """返回指定规模和种子的数据集缓存路径"""
+    return os.path.join(data_dir, f'requests-{rows}-{seed}.db')
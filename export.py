@@ -0,0 +1,51 @@
+"""请求日志导出命令行工具
+
+直接读取请求日志数据库，将筛选后的日志以 NDJSON、CSV 或 HAR 格式流式写出，
+内存占用与日志总量无关。
+
+示例:
+    python export.py --format ndjson --gzip -o requests.ndjson.gz
+    python export.py --format har --module example --start-time "2025-01-01 00:00:00"
+"""
+import argparse
+import sys
+
+from app.cli import parse_time
+from app.storage import get_storage
+from app.exporters import EXPORT_FORMATS, export_records, gzip_chunks
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='导出请求日志')
+    parser.add_argument('-f', '--format', choices=list(EXPORT_FORMATS), default='ndjson', help='导出格式')
+    parser.add_argument('-o', '--output', default='-', help='输出文件路径，默认为标准输出')
+    parser.add_argument('--gzip', action='store_true', help='以gzip压缩输出')
+    parser.add_argument('--start-time', help='开始时间（时间戳或 YYYY-mm-dd HH:MM:SS）')
+    parser.add_argument('--end-time', help='结束时间（时间戳或 YYYY-mm-dd HH:MM:SS）')
+    parser.add_argument('--module', action='append', help='模块名称，可多次指定')
+    parser.add_argument('--status-code', type=int, help='响应码')
+    args = parser.parse_args()
+
+    records = get_storage().iter(
+        start_time=parse_time(args.start_time),
+        end_time=parse_time(args.end_time),
+        modules=args.module,
+        status_code=args.status_code
+    )
+    chunks = export_records(records, args.format)
+    if args.gzip:
+        chunks = gzip_chunks(chunks)
+
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""gunicorn配置（在项目目录下启动gunicorn时自动加载）
+
+主进程启动时为本次部署准备指标快照目录，worker退出时把它的计数归档（见 app/metrics.py），
+并清空它在共享并发计数中的槽位（见 app/admission.py）。
+
+MOCKS_WORKER_CLASS 选择worker类型:
+
+    sync    默认，运行 run:app
+    gevent  响应整形的延迟（time.sleep）是协作式的，一个worker可以同时保持 MOCKS_WORKER_CONNECTIONS 个慢速连接；
+            未设置 MOCKS_WORKER_CLASS 但配置了 MOCKS_SHAPING_RULES 时默认使用
+    asgi    uvicorn worker运行 asgi:app，async def 视图在事件循环中执行
+
+同步worker中配置了响应整形规则时应用拒绝启动（见 app/shaping.py）。
+
+命令行参数（如 -k 和应用入口）优先于这里的设置。
+"""
+import os
+
+WORKER_CLASSES = {'asgi': 'uvicorn.workers.UvicornWorker'}
+
+_worker = os.environ.get('MOCKS_WORKER_CLASS') or ('gevent' if os.environ.get('MOCKS_SHAPING_RULES') else 'sync')
+worker_class = WORKER_CLASSES.get(_worker, _worker)
+worker_connections = int(os.environ.get('MOCKS_WORKER_CONNECTIONS', '10000'))
+# 命令行没有指定应用入口时使用
+wsgi_app = 'asgi:app' if _worker == 'asgi' else 'run:app'
+
+
+def on_starting(server):
+    from app import metrics
+    metrics.init_master(server.pid)
+
+
+def child_exit(server, worker):
+    from app import metrics
+    metrics.archive_worker(worker.pid)
+    from app.admission import admission
+    if admission.shared is not None:
+        admission.shared.clear_worker(worker.pid)
@@ -0,0 +1,63 @@
+"""请求回放命令行工具
+
+从请求日志中读取筛选后的请求，重新发送到目标服务并输出吞吐量和延迟分位数。
+
+示例:
+    # 回放到远程服务，8个线程，按原始节奏的10倍速
+    python replay.py --target http://127.0.0.1:5000 --concurrency 8 --speed 10
+
+    # 在进程内回放到本应用（不经过网络），固定200请求/秒
+    python replay.py --in-process --module example --rate 200
+"""
+import argparse
+import json
+
+from app.cli import parse_time
+from app.replay import FlaskTarget, HttpTarget, load_replay_requests, replay
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='回放请求日志')
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument('--target', help='目标服务地址，例如 http://127.0.0.1:5000')
+    target_group.add_argument('--in-process', action='store_true', help='回放到进程内创建的本应用')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='并发数')
+    parser.add_argument('--mode', choices=['thread', 'asyncio'], default='thread', help='并发模式')
+    parser.add_argument('--rate', type=float, help='固定发送速率（请求/秒）')
+    parser.add_argument('--speed', type=float, help='时间压缩比，按原始请求间隔的 1/speed 回放')
+    parser.add_argument('--limit', type=int, help='最多回放的请求数')
+    parser.add_argument('--start-time', help='开始时间（时间戳或 YYYY-mm-dd HH:MM:SS）')
+    parser.add_argument('--end-time', help='结束时间（时间戳或 YYYY-mm-dd HH:MM:SS）')
+    parser.add_argument('--module', action='append', help='模块名称，可多次指定')
+    parser.add_argument('--status-code', type=int, help='响应码')
+    parser.add_argument('-o', '--output', help='将统计报告写入JSON文件')
+    args = parser.parse_args()
+
+    # 先把待回放请求读入内存，避免回放过程中新产生的日志被再次读取
+    requests = list(load_replay_requests(
+        start_time=parse_time(args.start_time),
+        end_time=parse_time(args.end_time),
+        modules=args.module,
+        status_code=args.status_code,
+        limit=args.limit
+    ))
+    print(f"待回放请求数: {len(requests)}")
+
+    if args.in_process:
+        from app import create_app
+        target = FlaskTarget(create_app())
+    else:
+        target = HttpTarget(args.target)
+
+    report = replay(requests, target, concurrency=args.concurrency, mode=args.mode,
+                    rate=args.rate, speed=args.speed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
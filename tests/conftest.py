@@ -0,0 +1,76 @@
+"""测试公共配置
+
+在导入 app 之前把数据库、指标快照、ID槽位等路径指向临时目录，测试不会读写项目目录下的 requests.db。
+"""
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DIR = tempfile.mkdtemp(prefix='mocks-test-')
+os.environ.update({
+    'MOCKS_DB_PATH': os.path.join(TEST_DIR, 'requests.db'),
+    'MOCKS_STATE_DB_PATH': os.path.join(TEST_DIR, 'state.db'),
+    'MOCKS_METRICS_DIR': os.path.join(TEST_DIR, 'metrics'),
+    'MOCKS_ID_SLOT_DIR': os.path.join(TEST_DIR, 'id-slots'),
+    'MOCKS_SPILL_DIR': os.path.join(TEST_DIR, 'spill'),
+    'MOCKS_SEGMENT_DIR': os.path.join(TEST_DIR, 'segments'),
+    # 同步写入日志，请求结束后即可查询
+    'MOCKS_LOG_ASYNC': '0',
+})
+
+
+@contextlib.contextmanager
+def serve(wsgi_app):
+    """在后台线程中用真实的HTTP服务器运行WSGI应用，返回其地址"""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.port}'
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+# 在子进程中运行一个独立的mock节点，启动后输出监听端口
+INSTANCE_SCRIPT = """
+from werkzeug.serving import make_server
+from app import create_app
+server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+print('PORT', server.port, flush=True)
+server.serve_forever()
+"""
+
+
+@contextlib.contextmanager
+def run_instance(name, **env):
+    """在子进程中启动一个使用独立数据库的节点，返回 (地址, 数据库路径)"""
+    directory = tempfile.mkdtemp(prefix=f'mocks-{name}-', dir=TEST_DIR)
+    db_path = os.path.join(directory, 'requests.db')
+    child_env = dict(os.environ, PYTHONPATH=ROOT, MOCKS_DB_PATH=db_path, MOCKS_NODE_NAME=name,
+                     MOCKS_STATE_DB_PATH=os.path.join(directory, 'state.db'),
+                     MOCKS_METRICS_DIR=os.path.join(directory, 'metrics'),
+                     MOCKS_SPILL_DIR=os.path.join(directory, 'spill'))
+    child_env.update(env)
+    process = subprocess.Popen([sys.executable, '-c', INSTANCE_SCRIPT], cwd=ROOT, env=child_env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith('PORT '):
+                port = int(line.split()[1])
+                break
+        else:
+            raise RuntimeError(f'节点 {name} 启动失败')
+        # 继续读取子进程的输出，避免管道写满后阻塞
+        threading.Thread(target=process.stdout.read, daemon=True).start()
+        yield f'http://127.0.0.1:{port}', db_path
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
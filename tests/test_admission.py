@@ -0,0 +1,30 @@
+"""准入控制的并发名额测试"""
+import pytest
+
+from app import create_app
+from app.admission import admission
+
+
+@pytest.fixture(scope='module')
+def client():
+    return create_app().test_client()
+
+
+def test_streamed_response_holds_slot_until_closed(client):
+    before = admission.inflight
+    response = client.get('/example/export?count=100', buffered=False)
+    assert response.status_code == 200
+    # 响应体发送期间仍然占用名额
+    assert admission.inflight == before + 1
+    body = b''.join(response.response)
+    response.close()
+    assert body
+    assert admission.inflight == before
+
+
+def test_buffered_response_releases_slot(client):
+    before = admission.inflight
+    response = client.get('/example/')
+    response.close()
+    assert response.status_code == 200
+    assert admission.inflight == before
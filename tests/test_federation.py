@@ -0,0 +1,138 @@
+"""多节点联合查询测试（其他节点在子进程中运行，各自使用独立的数据库）"""
+import json
+import sqlite3
+import time
+import uuid
+
+import pytest
+
+from conftest import run_instance, serve
+
+from app import database
+from app.database import INSERT_LOG_SQL, ROW_COLUMNS, ROW_INDEX
+from app.federation import Federation
+from app.ids import compose_id, encode_id
+from app.storage import get_storage
+
+BASE_MS = int(time.time() * 1000)
+
+
+def make_row(row_id, node, module):
+    row = [None] * len(ROW_COLUMNS)
+    row[ROW_INDEX['id']] = row_id
+    row[ROW_INDEX['method']] = 'GET'
+    row[ROW_INDEX['url']] = f'/{module}/items'
+    row[ROW_INDEX['status_code']] = 200
+    row[ROW_INDEX['process_time']] = 1.0
+    row[ROW_INDEX['timestamp']] = time.time()
+    row[ROW_INDEX['module']] = module
+    row[ROW_INDEX['node']] = node
+    return tuple(row)
+
+
+def insert(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(INSERT_LOG_SQL, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope='module')
+def peers():
+    # 本节点（测试进程）的数据库
+    get_storage()
+    with run_instance('node-b') as b, run_instance('node-c') as c:
+        yield {'node-b': b, 'node-c': c}
+
+
+@pytest.fixture
+def module():
+    return 'fed_' + uuid.uuid4().hex[:8]
+
+
+def test_merge_order_and_pagination(peers, module):
+    (b_url, b_db), (c_url, c_db) = peers['node-b'], peers['node-c']
+    ids = [compose_id(BASE_MS + i, 0, 0, 0) for i in range(12)]
+    # 未配置 MOCKS_NODE_ID 时不同节点会产生相同的id
+    local_ids, b_ids, c_ids = ids[0::3] + [ids[1], ids[4]], ids[1::3], ids[2::3] + [ids[4], ids[7]]
+    insert(database.DB_PATH, [make_row(i, 'node-a', module) for i in local_ids])
+    insert(b_db, [make_row(i, 'node-b', module) for i in b_ids])
+    insert(c_db, [make_row(i, 'node-c', module) for i in c_ids])
+    expected = sorted([(i, 'node-a') for i in local_ids] + [(i, 'node-b') for i in b_ids]
+                      + [(i, 'node-c') for i in c_ids], reverse=True)
+
+    federation = Federation(peers=[b_url, c_url], timeout=5)
+    seen = []
+    before = before_node = None
+    while True:
+        page = federation.list_requests(3, before, modules=[module], before_node=before_node)
+        assert not page['partial']
+        assert page['total'] == len(expected)
+        seen.extend((record['id'], record['node']) for record in page['logs'])
+        if page['next'] is None:
+            break
+        before, before_node = page['next'], page['next_node']
+    # 所有页按 (id, 节点) 倒序，没有重复也没有遗漏
+    assert seen == expected
+
+
+def test_duplicate_copy_from_collector_is_merged(peers, module):
+    (b_url, b_db) = peers['node-b']
+    row_id = compose_id(BASE_MS + 100, 0, 0, 0)
+    insert(database.DB_PATH, [make_row(row_id, 'node-b', module)])
+    insert(b_db, [make_row(row_id, 'node-b', module)])
+    page = Federation(peers=[b_url], timeout=5).list_requests(10, modules=[module])
+    assert [(record['id'], record['node']) for record in page['logs']] == [(row_id, 'node-b')]
+
+
+def slow_app(environ, start_response):
+    time.sleep(2)
+    start_response('200 OK', [('Content-Type', 'application/json')])
+    return [json.dumps({'errCode': 0, 'data': {'logs': [], 'total': 0}}).encode('utf-8')]
+
+
+def test_timeout_marks_partial(peers, module):
+    (b_url, b_db) = peers['node-b']
+    row_id = compose_id(BASE_MS + 200, 0, 0, 0)
+    insert(b_db, [make_row(row_id, 'node-b', module)])
+    with serve(slow_app) as slow_url:
+        start = time.monotonic()
+        page = Federation(peers=[b_url, slow_url], timeout=0.5).list_requests(10, modules=[module])
+        assert time.monotonic() - start < 1.5
+    assert page['partial']
+    statuses = {status['peer']: status for status in page['peers']}
+    assert statuses[b_url]['ok']
+    assert not statuses[slow_url]['ok'] and statuses[slow_url]['error']
+    assert [record['id'] for record in page['logs']] == [row_id]
+
+
+def test_modules_cache_fallback():
+    state = {'up': True}
+
+    def flaky_app(environ, start_response):
+        if not state['up']:
+            start_response('500 Internal Server Error', [('Content-Type', 'application/json')])
+            return [json.dumps({'errCode': 500, 'errMsg': 'down', 'data': None}).encode('utf-8')]
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [json.dumps({'errCode': 0, 'data': ['remote_only']}).encode('utf-8')]
+
+    with serve(flaky_app) as url:
+        federation = Federation(peers=[url], timeout=5, modules_ttl=0)
+        assert 'remote_only' in federation.modules()
+        state['up'] = False
+        # 节点不可用时使用上次的结果
+        assert 'remote_only' in federation.modules()
+
+
+def test_find_request_on_peer(peers, module):
+    (b_url, _), (c_url, c_db) = peers['node-b'], peers['node-c']
+    row_id = compose_id(BASE_MS + 300, 0, 0, 0)
+    insert(c_db, [make_row(row_id, 'node-c', module)])
+    federation = Federation(peers=[b_url, c_url], timeout=5)
+    record, peer = federation.find_request(encode_id(row_id))
+    assert peer == c_url
+    assert record['node'] == 'node-c'
+    assert record['module'] == module
+    assert federation.find_request(encode_id(compose_id(BASE_MS + 301, 0, 0, 0))) == (None, None)
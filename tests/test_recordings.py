@@ -0,0 +1,118 @@
+"""录制代理 → 编译 → 回放 的端到端测试（上游为本地的替身服务）"""
+import json
+import os
+import shutil
+import sys
+import uuid
+
+import pytest
+
+from conftest import serve
+
+from app import config, create_app, proxy
+from app.proxy import UpstreamPool
+
+PNG = b'\x89PNG\r\n\x1a\n\xff\xfe\x00\x01'
+
+
+def upstream_app(environ, start_response):
+    """替身上游: /api/items 按查询参数返回JSON，/api/logo.png 返回二进制内容"""
+    path = environ['PATH_INFO']
+    if path == '/api/items':
+        body = json.dumps({'query': environ.get('QUERY_STRING', ''), 'items': [1, 2]}).encode('utf-8')
+        start_response('200 OK', [('Content-Type', 'application/json'), ('X-Upstream', 'yes')])
+        return [body]
+    if path == '/api/logo.png':
+        start_response('200 OK', [('Content-Type', 'image/png')])
+        return [PNG]
+    start_response('404 Not Found', [('Content-Type', 'text/plain')])
+    return [b'not found']
+
+
+@pytest.fixture
+def module_name():
+    name = 'recorded_' + uuid.uuid4().hex[:8]
+    directory = os.path.join(os.path.dirname(config.__file__), 'modules', name)
+    yield name
+    shutil.rmtree(directory, ignore_errors=True)
+    sys.modules.pop(f'app.modules.{name}', None)
+
+
+@pytest.fixture
+def proxied_app(monkeypatch):
+    monkeypatch.setattr(config, 'RECORDINGS_TOKEN', 'secret')
+    with serve(upstream_app) as url:
+        monkeypatch.setattr(config, 'PROXY_UPSTREAM', url)
+        monkeypatch.setattr(proxy, 'upstream', UpstreamPool(url, 2, 5))
+        yield create_app()
+
+
+def compile_recordings(client, token='secret', **params):
+    response = client.post('/.api/recordings/compile', json=params, headers={'Authorization': f'Bearer {token}'})
+    status, data = response.status_code, response.get_json()
+    response.close()
+    return status, data
+
+
+def get(client, path):
+    response = client.get(path)
+    data, status = response.data, response.status_code
+    response.close()
+    return status, data
+
+
+def test_record_compile_replay(proxied_app, module_name, monkeypatch):
+    client = proxied_app.test_client()
+    assert get(client, '/api/items?id=1')[0] == 200
+    assert get(client, '/api/items?id=2')[0] == 200
+    status, data = get(client, '/api/logo.png')
+    assert (status, data) == (200, PNG)
+
+    status, data = compile_recordings(client, module=module_name)
+    assert status == 200
+    result = data['data']
+    assert result['exchanges'] == 2
+    # 二进制响应体没有记录，不能回放
+    assert result['uncaptured'] >= 1
+
+    # 关闭代理后重新创建应用，录制的路由由生成的模块直接从内存返回
+    monkeypatch.setattr(config, 'PROXY_UPSTREAM', '')
+    monkeypatch.setattr(proxy, 'upstream', None)
+    replay = create_app().test_client()
+    status, data = get(replay, '/api/items?id=2')
+    assert status == 200
+    assert json.loads(data) == {'query': 'id=2', 'items': [1, 2]}
+    status, data = get(replay, '/api/items?id=9')
+    assert status == 200
+    assert json.loads(data)['items'] == [1, 2]
+    # 没有回放内容的路径不注册路由
+    assert get(replay, '/api/logo.png')[0] == 404
+
+
+@pytest.mark.parametrize('source', ["x'\nimport os\n_='", 'Proxy', '../proxy', 1])
+def test_compile_rejects_invalid_source(proxied_app, module_name, source):
+    client = proxied_app.test_client()
+    status, _ = compile_recordings(client, module=module_name, source=source)
+    assert status == 400
+    assert not os.path.exists(os.path.join(os.path.dirname(config.__file__), 'modules', module_name))
+
+
+def test_generated_module_contains_no_request_data(proxied_app, module_name):
+    client = proxied_app.test_client()
+    get(client, '/api/items?id=1')
+    assert compile_recordings(client, module=module_name)[0] == 200
+    directory = os.path.join(os.path.dirname(config.__file__), 'modules', module_name)
+    with open(os.path.join(directory, '__init__.py'), encoding='utf-8') as f:
+        source = f.read()
+    assert module_name not in source
+    with open(os.path.join(directory, 'recordings.json'), encoding='utf-8') as f:
+        assert json.load(f)['source'] == 'proxy'
+
+
+def test_compile_requires_token(proxied_app, module_name, monkeypatch):
+    client = proxied_app.test_client()
+    get(client, '/api/items?id=1')
+    assert compile_recordings(client, token='wrong', module=module_name)[0] == 401
+    monkeypatch.setattr(config, 'RECORDINGS_TOKEN', '')
+    assert compile_recordings(client, token='', module=module_name)[0] == 403
+    assert not os.path.exists(os.path.join(os.path.dirname(config.__file__), 'modules', module_name))
@@ -0,0 +1,90 @@
+"""响应整形测试: 延迟分布、带宽解析和响应体的发送耗时"""
+import sys
+import time
+import types
+
+import pytest
+from flask import Blueprint, Flask
+
+from app import config
+from app.shaping import ShapedBody, ShapingPolicy, compile_latency, parse_bandwidth
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None), (0, None), (65536, 65536.0), ('64k', 65536.0), ('64KB/s', 65536.0),
+    ('1m', 1048576.0), ('1.5k', 1536.0), ('512b', 512.0),
+])
+def test_parse_bandwidth(value, expected):
+    assert parse_bandwidth(value) == expected
+
+
+def test_parse_bandwidth_rejects_invalid_value():
+    with pytest.raises(ValueError):
+        parse_bandwidth('fast')
+
+
+def samples(spec, count=2000):
+    sampler = compile_latency(spec)
+    return [sampler() for _ in range(count)]
+
+
+def test_compile_latency_distributions():
+    assert compile_latency(None) is None
+    assert set(samples(120, 10)) == {120.0}
+    assert set(samples({'type': 'fixed', 'ms': 80}, 10)) == {80.0}
+    assert all(50 <= value <= 150 for value in samples({'type': 'uniform', 'min': 50, 'max': 150}))
+    normal = samples({'type': 'normal', 'mean': 100, 'stddev': 30, 'min': 60})
+    assert min(normal) >= 60
+    assert 90 < sum(normal) / len(normal) < 115
+
+
+def test_compile_latency_percentiles():
+    values = sorted(samples({'type': 'percentiles', 'p50': 100, 'p90': 250, 'p99': 800, 'min': 50, 'max': 1500}, 5000))
+    assert values[0] >= 50 and values[-1] <= 1500
+    assert 85 < values[len(values) // 2] < 115
+    assert 200 < values[int(len(values) * 0.9)] < 300
+
+
+def test_compile_latency_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        compile_latency({'type': 'poisson'})
+
+
+def consume(body):
+    start = time.monotonic()
+    data = b''.join(body)
+    return data, time.monotonic() - start
+
+
+def test_shaped_body_delay():
+    data, elapsed = consume(ShapedBody([b'hello'], delay_ms=200))
+    assert data == b'hello'
+    assert 0.19 <= elapsed < 0.5
+
+
+def test_shaped_body_bandwidth():
+    payload = b'x' * 20480
+    data, elapsed = consume(ShapedBody([payload[:5000], payload[5000:]], bandwidth=40960))
+    assert data == payload
+    # 20KB按每秒40KB发送约需0.5秒
+    assert 0.4 <= elapsed < 0.9
+    assert ShapedBody.active == 0
+
+
+def shaped_app():
+    app = Flask(__name__)
+    bp = Blueprint('slow', __name__, url_prefix='/slow')
+    bp.add_url_rule('/', 'index', lambda: 'ok')
+    app.register_blueprint(bp)
+    policy = ShapingPolicy()
+    policy.load([{'path': '/slow/', 'latency': 100}])
+    return app, policy
+
+
+def test_sync_worker_refuses_shaping(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'gunicorn.workers.sync', types.ModuleType('gunicorn.workers.sync'))
+    app, policy = shaped_app()
+    with pytest.raises(RuntimeError):
+        policy.compile(app)
+    monkeypatch.setattr(config, 'SHAPING_ALLOW_BLOCKING', True)
+    assert 'slow.index' in policy.compile(app)
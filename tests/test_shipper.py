@@ -0,0 +1,163 @@
+"""日志发送端 → 收集端 的往返测试（收集端在测试进程内的本地HTTP服务器上运行）"""
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import pytest
+
+from conftest import serve
+
+from app import config, create_app, database
+from app.database import ROW_COLUMNS, ROW_INDEX
+from app.ids import new_request_id
+from app.shipper import LogShipper, decode_batch, encode_batch
+from app.storage.base import encode_row
+from app.storage import get_storage
+
+
+def make_row(node, row_id=None):
+    row = [None] * len(ROW_COLUMNS)
+    row[ROW_INDEX['id']] = row_id if row_id is not None else new_request_id()
+    row[ROW_INDEX['method']] = 'GET'
+    row[ROW_INDEX['url']] = '/example/data'
+    row[ROW_INDEX['status_code']] = 200
+    row[ROW_INDEX['process_time']] = 1.5
+    row[ROW_INDEX['timestamp']] = time.time()
+    row[ROW_INDEX['module']] = 'example'
+    row[ROW_INDEX['node']] = node
+    return tuple(row)
+
+
+def count_rows(node):
+    conn = sqlite3.connect(database.DB_PATH)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM request_logs WHERE node = ?', (node,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def collector_url(monkeypatch):
+    monkeypatch.setattr(config, 'COLLECTOR_ENABLED', True)
+    monkeypatch.setattr(config, 'COLLECTOR_TOKEN', 'secret')
+    with serve(create_app()) as url:
+        yield url
+
+
+@pytest.fixture
+def node():
+    return 'node-' + uuid.uuid4().hex[:8]
+
+
+def make_shipper(url, token='secret', retry_timeout=60):
+    return LogShipper(url, batch_size=50, flush_interval=0.05, max_queue=1000, timeout=5, token=token,
+                      retry_timeout=retry_timeout)
+
+
+def post_ingest(url, body, token='secret'):
+    headers = {'Content-Type': 'application/x-ndjson', 'Authorization': f'Bearer {token}'}
+    request = urllib.request.Request(url + '/.api/ingest', data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_encode_decode_round_trip(node):
+    rows = [make_row(node) for _ in range(3)]
+    assert decode_batch(encode_batch(rows), 'gzip') == rows
+    # 缺少节点名称的行使用请求头中的节点
+    unnamed = make_row(None)
+    decoded = decode_batch(encode_batch([unnamed]), 'gzip', node)
+    assert decoded[0][ROW_INDEX['node']] == node
+
+
+def test_ship_round_trip(collector_url, node):
+    shipper = make_shipper(collector_url)
+    for _ in range(120):
+        assert shipper.submit(make_row(node))
+    assert shipper.flush(timeout=10)
+    assert shipper.shipped == 120
+    assert count_rows(node) == 120
+
+
+def test_retry_after_collector_failure(collector_url, node, monkeypatch):
+    storage = get_storage()
+    original = storage.ingest_batch
+    calls = []
+
+    def failing_once(rows):
+        calls.append(len(rows))
+        # 第一次写入失败，收集端返回503和Retry-After，发送端等待后重发同一批
+        return None if len(calls) == 1 else original(rows)
+
+    monkeypatch.setattr(storage, 'ingest_batch', failing_once)
+    shipper = make_shipper(collector_url)
+    for _ in range(10):
+        shipper.submit(make_row(node))
+    assert shipper.flush(timeout=10)
+    assert shipper.retries >= 1
+    assert len(calls) >= 2
+    assert count_rows(node) == 10
+
+
+def test_resent_batch_is_not_duplicated(collector_url, node):
+    shipper = make_shipper(collector_url)
+    batch = [make_row(node) for _ in range(20)]
+    shipper._ship(batch)
+    # 模拟发送端超时后重发同一批
+    shipper._ship(batch)
+    assert shipper.shipped == 40
+    assert count_rows(node) == 20
+
+
+def test_same_ids_from_different_nodes_are_kept(collector_url, node):
+    other = node + '-b'
+    ids = [new_request_id() for _ in range(5)]
+    shipper = make_shipper(collector_url)
+    shipper._ship([make_row(node, row_id) for row_id in ids])
+    shipper._ship([make_row(other, row_id) for row_id in ids])
+    assert count_rows(node) == 5
+    assert count_rows(other) == 5
+
+
+def test_rejected_token_is_not_retried(collector_url, node):
+    shipper = make_shipper(collector_url, token='wrong')
+    shipper._ship([make_row(node)])
+    assert shipper.rejected == 1
+    assert shipper.retries == 0
+    assert count_rows(node) == 0
+
+
+@pytest.mark.parametrize('line', ['["abc","x"]', '[1,2,3]', '[true]', '"row"', '{"id": 1}'])
+def test_malformed_rows_are_rejected(collector_url, line):
+    assert post_ingest(collector_url, line.encode('utf-8') + b'\n') == 400
+
+
+def test_malformed_batch_is_not_retried(collector_url, node):
+    bad = list(make_row(node))
+    bad[ROW_INDEX['status_code']] = 'ok'
+    shipper = make_shipper(collector_url)
+    shipper._ship([make_row(node), tuple(bad)])
+    assert shipper.rejected == 2
+    assert shipper.retries == 0
+    assert count_rows(node) == 0
+
+
+def test_failing_batch_is_given_up_after_retry_timeout(collector_url, node, monkeypatch):
+    monkeypatch.setattr(get_storage(), 'ingest_batch', lambda rows: None)
+    shipper = make_shipper(collector_url, retry_timeout=2)
+    start = time.monotonic()
+    shipper._ship([make_row(node)])
+    assert time.monotonic() - start < 5
+    assert shipper.retries >= 1
+    assert shipper.rejected == 1
+
+
+def test_collector_without_token_refuses_logs(collector_url, node, monkeypatch):
+    monkeypatch.setattr(config, 'COLLECTOR_TOKEN', '')
+    assert post_ingest(collector_url, encode_row(make_row(node)).encode('utf-8'), token='') == 403
+    assert count_rows(node) == 0
@@ -0,0 +1,65 @@
+"""共享状态存储测试: 同一数据库上的多个存储实例（相当于多个worker）读到一致的数据"""
+import multiprocessing
+
+import pytest
+
+from app.state import Collection, StateStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state.db')
+
+
+def orders(store):
+    return Collection(store, 'example', 'orders', indexes=['customer'])
+
+
+def test_writes_are_visible_to_other_instances(path):
+    writer, reader = orders(StateStore(path)), orders(StateStore(path))
+    # 先读一次，让读取方缓存集合
+    assert reader.find(customer='c1') == []
+    assert reader.count() == 0
+
+    key = writer.insert({'customer': 'c1', 'amount': 10}, key_field='id')
+    assert reader.get(key) == {'customer': 'c1', 'amount': 10, 'id': key}
+    assert reader.find(customer='c1') == [reader.get(key)]
+    assert reader.count() == 1
+
+    writer.put(key, {'customer': 'c2', 'amount': 20})
+    assert reader.get(key)['amount'] == 20
+    assert reader.find(customer='c1') == []
+    assert [value['amount'] for value in reader.find(customer='c2')] == [20]
+
+    writer.delete(key)
+    assert reader.get(key) is None
+    assert key not in reader
+    assert reader.find(customer='c2') == []
+    assert reader.count() == 0
+
+
+def _insert_in_child(path, queue):
+    queue.put(orders(StateStore(path)).insert({'customer': 'child'}))
+
+
+def test_writes_from_another_process(path):
+    reader = orders(StateStore(path))
+    assert reader.find(customer='child') == []
+    queue = multiprocessing.get_context('fork').Queue()
+    process = multiprocessing.get_context('fork').Process(target=_insert_in_child, args=(path, queue))
+    process.start()
+    key = queue.get(timeout=10)
+    process.join(timeout=10)
+    assert reader.get(key) == {'customer': 'child'}
+    assert reader.find(customer='child') == [{'customer': 'child'}]
+
+
+def test_misses_are_not_cached(path):
+    store = StateStore(path)
+    collection = orders(store)
+    collection.put('1', {'customer': 'c1'})
+    for index in range(100):
+        assert collection.get(f'missing-{index}') is None
+        assert collection.find(customer=f'nobody-{index}') == []
+    assert collection.get('1') == {'customer': 'c1'}
+    assert len(store.cache_for(collection)) <= 2
@@ -0,0 +1,54 @@
+"""请求日志存储后端测试"""
+import os
+
+from app.database import ROW_COLUMNS, ROW_INDEX
+from app.storage.memory import MemoryStorage
+from app.storage.segment import SegmentStorage
+from app.storage.shm import SharedRingStorage
+
+
+def make_row(row_id, status_code=200, url='/example/data'):
+    row = [None] * len(ROW_COLUMNS)
+    row[ROW_INDEX['id']] = row_id
+    row[ROW_INDEX['method']] = 'GET'
+    row[ROW_INDEX['url']] = url
+    row[ROW_INDEX['status_code']] = status_code
+    row[ROW_INDEX['timestamp']] = 1700000000.0 + row_id
+    row[ROW_INDEX['module']] = 'example'
+    return tuple(row)
+
+
+def test_segment_scan_with_duplicate_ids(tmp_path):
+    storage = SegmentStorage(str(tmp_path), index_interval=2)
+    storage.init()
+    # 同一个id出现两次（如溢出回放），两行中有None和不同类型的值
+    assert storage.write_batch([make_row(1), make_row(2), make_row(3)])
+    assert storage.write_batch([make_row(2, status_code=None, url=None), make_row(4)])
+    ids = [row[ROW_INDEX['id']] for row in storage.scan_rows()]
+    assert ids == [1, 2, 2, 3, 4]
+    ids = [row[ROW_INDEX['id']] for row in storage.scan_rows_desc()]
+    assert ids == [4, 3, 2, 2, 1]
+
+
+def test_shm_resize_replaces_file_instead_of_truncating(tmp_path):
+    path = str(tmp_path / 'ring.shm')
+    old = SharedRingStorage(path, capacity=16, slot_bytes=1024)
+    old.init()
+    assert old.write_batch([make_row(1), make_row(2)])
+    # 槽位配置变化（如HUP重载后的新worker）时换成新文件，仍映射原文件的旧实例可以继续读写
+    new = SharedRingStorage(path, capacity=32, slot_bytes=2048)
+    new.init()
+    assert list(new.scan_rows()) == []
+    assert old.write_batch([make_row(3)])
+    assert [row[ROW_INDEX['id']] for row in old.scan_rows()] == [1, 2, 3]
+    assert os.listdir(str(tmp_path)) == ['ring.shm']
+
+
+def test_memory_rows_stay_ordered_by_id():
+    storage = MemoryStorage(capacity=5)
+    # 晚到的行按id插入到正确的位置，超出容量时丢弃id最小的行
+    assert storage.write_batch([make_row(1), make_row(3), make_row(2), make_row(5), make_row(4), make_row(6)])
+    assert [row[ROW_INDEX['id']] for row in storage.scan_rows()] == [2, 3, 4, 5, 6]
+    assert [row[ROW_INDEX['id']] for row in storage.scan_rows_desc()] == [6, 5, 4, 3, 2]
+    assert [record['id'] for record in storage.list_before(5, 2)] == [4, 3]
+    assert [record['id'] for record in storage.list(pagesize=2, current=2)] == [4, 3]